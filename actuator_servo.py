@@ -1,31 +1,173 @@
 # coding:utf-8
-from hardware_pca9685 import PCA9685
+from hardware_pca9685 import PCA9685, MAX_BLOCK_CHANNELS
 import time
 import logging
+import threading
+import numpy as np
 from config import robot_config
 
 logger = logging.getLogger("actuator.servo")
 
-def map_value(value, from_low, from_high, to_low, to_high):
-    """Map a value from one range to another."""
-    try:
-        result = (to_high - to_low) * (value - from_low) / (from_high - from_low) + to_low
-        logger.debug("map_value: %.3f [%.3f,%.3f] -> %.3f [%.3f,%.3f]", 
-                    value, from_low, from_high, result, to_low, to_high)
-        return result
-    except ZeroDivisionError:
-        logger.warning("map_value: division by zero, returning to_low value %.3f", to_low)
-        return to_low
-    except Exception as e:
-        logger.error("Error in map_value: %s", e)
-        return to_low
+# Servo pulse range and PCA9685 timing at 50 Hz
+SERVO_MIN_PULSE_US = 500
+SERVO_MAX_PULSE_US = 2500
+PWM_PERIOD_US = 20000
+PWM_MAX_COUNT = 4095
+COUNTS_PER_DEGREE = (SERVO_MAX_PULSE_US - SERVO_MIN_PULSE_US) / 180 * PWM_MAX_COUNT / PWM_PERIOD_US  # ~2.28
+
+
+def angle_to_count(angle):
+    """Convert a servo angle in degrees (float or array) to an unrounded 12-bit PWM count."""
+    return SERVO_MIN_PULSE_US * PWM_MAX_COUNT / PWM_PERIOD_US + angle * COUNTS_PER_DEGREE
+
+
+def count_to_angle(count):
+    """Convert a 12-bit PWM count (float or array) back to a servo angle in degrees."""
+    return (count - SERVO_MIN_PULSE_US * PWM_MAX_COUNT / PWM_PERIOD_US) / COUNTS_PER_DEGREE
+
+
+# Servo channel of each (leg, joint); channels 0-15 are on board 0x41, 16-31 on 0x40
+LEG_SERVO_CHANNELS = np.array([
+    [15, 14, 13],  # L1
+    [12, 11, 10],  # L2
+    [9, 8, 31],    # L3
+    [22, 23, 27],  # L4
+    [19, 20, 21],  # L5
+    [16, 17, 18],  # L6
+])
+
+# Count limits for the 0-180 degree servo travel
+SERVO_MIN_COUNT = angle_to_count(0)
+SERVO_MAX_COUNT = angle_to_count(180)
+
+
+def channel_board(channel):
+    """Return (board address, board-local channel) for a servo channel 0-31."""
+    return (0x41, channel) if channel < 16 else (0x40, channel - 16)
+
+
+def board_channel(board, local):
+    """Inverse of channel_board: servo channel 0-31 for a board address and local channel."""
+    return local if board == 0x41 else local + 16
+
+
+def channel_runs(channels):
+    """
+    Group servo channels into contiguous runs per board for block writes.
+
+    Returns a list of (board address, start, positions) tuples: start is the
+    first board-local channel of the run and positions index into channels in
+    run order, so counts can be gathered with counts[positions].
+    """
+    order = sorted(range(len(channels)), key=lambda i: channel_board(channels[i]))
+    runs = []
+    for i in order:
+        board, local = channel_board(channels[i])
+        if runs and runs[-1][0] == board and runs[-1][1] + len(runs[-1][2]) == local:
+            runs[-1][2].append(i)
+        else:
+            runs.append((board, local, [i]))
+    return runs
+
+
+def plan_spans(dirty, merge_gap):
+    """
+    Split sorted run positions of changed channels into block-write spans.
+
+    A span is closed when it would exceed MAX_BLOCK_CHANNELS or when the next
+    changed channel is more than merge_gap unchanged channels away; unchanged
+    channels inside a span are rewritten with their current value.
+    Returns (first, last) position pairs, inclusive.
+    """
+    spans = []
+    for position in dirty:
+        if spans and position - spans[-1][0] < MAX_BLOCK_CHANNELS and position - spans[-1][1] <= merge_gap + 1:
+            spans[-1][1] = position
+        else:
+            spans.append([position, position])
+    return spans
+
+
+def leg_skew(latch_times):
+    """
+    Worst-case skew between legs for one commit.
+
+    latch_times holds the time each channel was latched in the commit (NaN if
+    not written). A leg has moved once its last channel latched; returns the
+    spread of those times across the legs that moved, in seconds.
+    """
+    leg_times = latch_times[LEG_SERVO_CHANNELS]
+    moved = ~np.isnan(leg_times).all(axis=1)
+    if np.count_nonzero(moved) < 2:
+        return 0.0
+    leg_times = np.nanmax(leg_times[moved], axis=1)
+    return float(leg_times.max() - leg_times.min())
+
+
+class ServoFrame:
+    """
+    PWM count targets for the 32 servo channels, committed to the boards together.
+
+    Only channels that have been given a target are written. Their per-board
+    contiguous runs are compiled when that set changes, not on every commit.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(32)
+        self.mask = np.zeros(32, dtype=bool)
+        self.runs = []
+
+    def set_counts(self, channels, counts):
+        """Set PWM off counts for channels (any matching shapes, e.g. LEG_SERVO_CHANNELS)."""
+        channels = np.asarray(channels)
+        if channels.size and (channels.min() < 0 or channels.max() > 31):
+            raise ValueError(f"servo channels must be 0-31, got {channels.tolist()}")
+        self.counts[channels] = counts
+        if not self.mask[channels].all():
+            self.mask[channels] = True
+            # channel_runs indexes into the targeted channel list; map back to channel numbers
+            targeted = np.flatnonzero(self.mask)
+            self.runs = [(board, start, targeted[positions])
+                         for board, start, positions in channel_runs(targeted.tolist())]
+
+    def set_angles(self, channels, angles):
+        """Set servo angles in degrees for channels, clamped to 0-180."""
+        self.set_counts(channels, angle_to_count(np.clip(angles, 0, 180)))
+
+    def copy(self):
+        """Return an independent copy of the targets (the compiled runs are shared, read-only)."""
+        frame = ServoFrame.__new__(ServoFrame)
+        frame.counts = self.counts.copy()
+        frame.mask = self.mask.copy()
+        frame.runs = self.runs
+        return frame
+
+    def angles(self, channels):
+        """Return the target angles of channels in degrees."""
+        return count_to_angle(self.counts[np.asarray(channels)])
+
 
 class Servo:
     def __init__(self):
         try:
             logger.info("Initializing servo controller with PCA9685 boards")
-            self.pwm_40 = PCA9685(0x40, debug=True)
-            self.pwm_41 = PCA9685(0x41, debug=True)
+            self.pwm_40 = PCA9685(0x40)
+            self.pwm_41 = PCA9685(0x41)
+            self.boards = {0x40: self.pwm_40, 0x41: self.pwm_41}
+            # Both boards share one bus client; frames hold it for all their transactions
+            self.bus = self.pwm_40.bus
+            # Serialises the count cache between the control, server and writer threads
+            self.lock = threading.RLock()
+            # Last count written to each channel (-1 = unknown), so commits only send changes
+            self.last_counts = np.full(32, -1)
+            self.held_counts = np.full(32, -1)
+            self.channels_written = 0
+            self.channels_skipped = 0
+            self.transactions = 0
+            # Skew measurement: latch time of each channel in the last commit, worst leg skew seen
+            self.measure_skew = robot_config.SERVO_MEASURE_SKEW
+            self.latch_times = np.full(32, np.nan)
+            self.worst_leg_skew = 0.0
             # Set the cycle frequency of PWM to 50 Hz
             self.pwm_40.set_pwm_freq(50)
             time.sleep(0.01)
@@ -41,48 +183,150 @@ class Servo:
         Convert the input angle to the value of PCA9685 and set the servo angle.
         
         :param channel: Servo channel (0-31)
-        :param angle: Angle in degrees (0-180)
+        :param angle: Angle in degrees (0-180), fractional degrees allowed
         """
         try:
-            if not (0 <= channel <= 31):
-                logger.error("Invalid servo channel: %d (must be 0-31)", channel)
-                return
-            
             if not (0 <= angle <= 180):
-                logger.warning("Servo angle out of range: %d (clamping to 0-180)", angle)
+                logger.warning("Servo angle out of range: %.2f (clamping to 0-180)", angle)
                 angle = max(0, min(180, angle))
-            
-            if channel < 16:
-                duty_cycle = map_value(angle, 0, 180, 500, 2500)
-                duty_cycle = map_value(duty_cycle, 0, 20000, 0, 4095)
+            self.set_servo_count(channel, angle_to_count(angle))
+        except Exception as e:
+            logger.error("Failed to set servo %d to angle %.2f°: %s", channel, angle, e)
+
+    def set_servo_count(self, channel, count):
+        """
+        Set a servo channel to a PWM off count (rounded to the nearest of 4096 steps).
+
+        :param channel: Servo channel (0-31)
+        :param count: PWM off count, about 0.44 degrees per count
+        """
+        with self.lock:
+            try:
+                if not (0 <= channel <= 31):
+                    logger.error("Invalid servo channel: %d (must be 0-31)", channel)
+                    return
+
+                count = int(round(count))
+                board, local = channel_board(channel)
                 if robot_config.DEBUG_LEGS:
-                    logger.debug("Setting servo %d (pwm_41) to angle %d°, duty_cycle %d", 
-                                channel, angle, int(duty_cycle))
-                self.pwm_41.set_pwm(channel, 0, int(duty_cycle))
-            elif 16 <= channel < 32:
-                channel -= 16
-                duty_cycle = map_value(angle, 0, 180, 500, 2500)
-                duty_cycle = map_value(duty_cycle, 0, 20000, 0, 4095)
+                    logger.debug("Setting servo %d (board 0x%02X) to count %d (%.2f°)",
+                                channel, board, count, count_to_angle(count))
+                self.boards[board].set_pwm(local, 0, count)
+                self.last_counts[channel] = count
+                self.channels_written += 1
+                self.transactions += 1
+            except Exception as e:
+                logger.error("Failed to set servo %d to count %s: %s", channel, count, e)
+
+    def set_channels(self, board, start, counts):
+        """
+        Set consecutive channels of one board in as few I2C transactions as possible.
+
+        :param board: PCA9685 address (0x40 or 0x41)
+        :param start: First board-local channel (0-15)
+        :param counts: PWM off counts for channels start, start + 1, ... (rounded to nearest)
+        :return: Number of I2C transactions issued
+        """
+        with self.lock:
+            try:
+                counts = [int(round(count)) for count in counts]
                 if robot_config.DEBUG_LEGS:
-                    logger.debug("Setting servo %d (pwm_40) to angle %d°, duty_cycle %d", 
-                                channel + 16, angle, int(duty_cycle))
-                self.pwm_40.set_pwm(channel, 0, int(duty_cycle))
-        except Exception as e:
-            logger.error("Failed to set servo %d to angle %d°: %s", channel, angle, e)
+                    logger.debug("Setting board 0x%02X channels %d-%d to counts %s",
+                                board, start, start + len(counts) - 1, counts)
+                transactions = self.boards[board].set_channels(start, counts)
+                first = board_channel(board, start)
+                self.last_counts[first:first + len(counts)] = counts
+                self.channels_written += len(counts)
+                self.transactions += transactions
+                return transactions
+            except Exception as e:
+                logger.error("Failed to set board 0x%02X channels from %d: %s", board, start, e)
+                return 0
+
+    def commit(self, frame):
+        """
+        Write the changed channels of a ServoFrame, one block transfer per contiguous span.
+
+        A channel is skipped when its count is within SERVO_DEADBAND_COUNTS of the
+        last count written to it. Changed channels separated by a single unchanged
+        one are sent as one span, since a channel costs about as much as a new
+        transaction. With SERVO_SYNC_UPDATES, each run's changes are merged into as
+        few block writes as fit; the boards latch outputs on STOP, so each write's
+        channels move together and fewer writes means less skew between legs.
+
+        :param frame: ServoFrame to send
+        :return: Time spent on the bus in seconds
+        """
+        with self.lock, self.bus.batch():
+            start_time = time.perf_counter()
+            counts = np.rint(frame.counts).astype(int)
+            merge_gap = MAX_BLOCK_CHANNELS if robot_config.SERVO_SYNC_UPDATES else 1
+            if self.measure_skew:
+                self.latch_times[:] = np.nan
+            for board, start, channels in frame.runs:
+                last = self.last_counts[channels]
+                dirty = np.flatnonzero((last < 0) | (np.abs(counts[channels] - last) > robot_config.SERVO_DEADBAND_COUNTS))
+                sent = 0
+                for first, final in plan_spans(dirty, merge_gap):
+                    self.set_channels(board, start + first, counts[channels[first:final + 1]])
+                    sent += final + 1 - first
+                    if self.measure_skew:
+                        self.latch_times[channels[first:final + 1]] = time.perf_counter()
+                self.channels_skipped += int(len(channels) - sent)
+            bus_time = time.perf_counter() - start_time
+            if self.measure_skew:
+                skew = leg_skew(self.latch_times)
+                if skew > self.worst_leg_skew:
+                    self.worst_leg_skew = skew
+                    logger.info("New worst-case leg skew: %.2f ms", skew * 1000)
+            return bus_time
+
+    def invalidate_cache(self):
+        """Forget the last written counts, so the next commit rewrites every channel."""
+        self.last_counts[:] = -1
+
+    def get_write_stats(self):
+        """Return channels written and skipped, I2C transactions and worst leg skew (if measured) since start."""
+        return {
+            'written': self.channels_written,
+            'skipped': self.channels_skipped,
+            'transactions': self.transactions,
+            'worst_leg_skew_ms': self.worst_leg_skew * 1000,
+        }
 
     def relax(self):
-        """Relax all servos by setting their PWM values to 4096."""
-        try:
-            logger.info("Relaxing all servos")
-            # Relax all channels on both PCA9685 boards
-            for channel in range(32):
-                if channel < 16:
-                    self.pwm_41.set_pwm(channel, 4096, 4096)
-                else:
-                    self.pwm_40.set_pwm(channel - 16, 4096, 4096)
-            logger.info("All servos relaxed")
-        except Exception as e:
-            logger.error("Failed to relax servos: %s", e)
+        """Relax all servos with one ALL_LED full-off write per board (two I2C transactions)."""
+        with self.lock, self.bus.batch():
+            try:
+                logger.info("Relaxing all servos")
+                # Keep the last counts so hold() can restore the pose
+                self.held_counts = np.where(self.last_counts >= 0, self.last_counts, self.held_counts)
+                for board in self.boards.values():
+                    board.set_all_pwm(0, 4096)  # OFF_H bit 4: full off
+                self.transactions += len(self.boards)
+                # Relaxed channels no longer hold their last count
+                self.invalidate_cache()
+                logger.info("All servos relaxed")
+            except Exception as e:
+                logger.error("Failed to relax servos: %s", e)
+
+    def hold(self):
+        """
+        Re-energise every servo at the count it held before the last relax.
+
+        Each board's known channels go out as contiguous block writes, so a full
+        pose is restored in a few transactions without recomputing IK.
+        """
+        with self.lock, self.bus.batch():
+            try:
+                channels = np.flatnonzero(self.held_counts >= 0).tolist()
+                for board, start, positions in channel_runs(channels):
+                    run = np.asarray(channels)[positions]
+                    for first, final in plan_spans(range(len(run)), 0):
+                        self.set_channels(board, start + first, self.held_counts[run[first:final + 1]])
+                logger.info("Holding %d servos at their last position", len(channels))
+            except Exception as e:
+                logger.error("Failed to hold servos: %s", e)
 
     def close(self):
         """Close the servo controller."""
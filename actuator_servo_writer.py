@@ -0,0 +1,92 @@
+# actuator_servo_writer.py
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger("actuator.servo_writer")
+
+
+class ServoWriter:
+    """
+    Dedicated I2C output thread that flushes the latest published ServoFrame at a fixed rate.
+
+    Kinematics publishes into a single latest-value slot and returns immediately,
+    so the next frame is computed while the current one is on the wire. The slot
+    is a (sequence, frame copy) tuple replaced by plain assignment, which is atomic,
+    so publishing takes no lock. The writer reads the slot and commits under
+    servo.lock, as does discard(), so a discarded frame is never written after a
+    relax that follows it. A frame overwritten before the writer reached it is
+    counted as stale.
+    """
+
+    def __init__(self, servo, rate_hz=50):
+        self.servo = servo
+        self.period = 1.0 / rate_hz
+        self._slot = (0, None)
+        self._flushed_seq = 0
+        self.frames_written = 0
+        self.stale_frames = 0
+        self.overruns = 0
+        self.bus_time = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="servo-writer", daemon=True)
+
+    def start(self):
+        """Start the writer thread."""
+        self.thread.start()
+        logger.info("Servo writer started at %.0f Hz", 1.0 / self.period)
+
+    def stop(self):
+        """Stop the writer thread after flushing any pending frame."""
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self._flush()
+        logger.info("Servo writer stopped: %s", self.get_stats())
+
+    def publish(self, frame):
+        """Publish a copy of frame as the latest target; never blocks on the bus."""
+        self._slot = (self._slot[0] + 1, frame.copy())
+
+    def discard(self):
+        """Drop the pending frame, if any, without writing it; waits for a commit already under way."""
+        with self.servo.lock:
+            self._flushed_seq = self._slot[0]
+
+    def _flush(self):
+        """Commit the latest frame if it has not been written yet."""
+        with self.servo.lock:
+            seq, frame = self._slot
+            if seq <= self._flushed_seq:
+                return
+            self.stale_frames += seq - self._flushed_seq - 1
+            self._flushed_seq = seq
+            self.bus_time += self.servo.commit(frame)
+            self.frames_written += 1
+
+    def _run(self):
+        next_deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error("Servo writer flush failed: %s", e)
+
+            next_deadline += self.period
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                # Fell behind; restart the schedule rather than bursting to catch up
+                self.overruns += 1
+                next_deadline = time.monotonic()
+
+    def get_stats(self):
+        """Return frames written, stale (overwritten) frames, overruns and mean bus time per frame."""
+        return {
+            'written': self.frames_written,
+            'stale': self.stale_frames,
+            'overruns': self.overruns,
+            'bus_ms_per_frame': 1000 * self.bus_time / max(self.frames_written, 1),
+        }
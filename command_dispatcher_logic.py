@@ -15,6 +15,7 @@ logger = logging.getLogger("dispatcher.logic")
 
 known_simple_commands = [
     cmd.CMD_MOVE,
+    cmd.CMD_VELOCITY,
     cmd.CMD_HEAD,
     cmd.CMD_SERVOPOWER,
     cmd.CMD_ATTITUDE,
@@ -345,9 +346,14 @@ def _handle_diag_set_servo(args, source="unknown"):
         channel = int(args[0])
         angle = int(args[1])
         
-        from actuator_servo import Servo
-        servo = Servo()
-        servo.set_servo_angle(channel, angle)
+        if not (0 <= channel <= 31):
+            logger.error("[%s] diag_set_servo channel out of range: %d", source, channel)
+            return False
+
+        # Use the running servo controller rather than re-initialising the boards
+        server = CommandDispatcher.get_server()
+        server.diag_frame.set_angles([channel], [angle])
+        server.servo_controller.commit(server.diag_frame)
         
         logger.info("[%s] Diagnostic servo set: channel %d → angle %d", source, channel, angle)
         return True
@@ -384,6 +390,9 @@ def _handle_cmd_style_commands(source, command):
 
             if cmd_name == cmd.CMD_MOVE:
                 return _handle_cmd_move(source, command, cmd_name, params)
+
+            elif cmd_name == cmd.CMD_VELOCITY:
+                return _handle_cmd_velocity(source, command, cmd_name, params)
             
             elif cmd_name in {cmd.CMD_POSITION, cmd.CMD_ATTITUDE, cmd.CMD_BALANCE, cmd.CMD_CALIBRATION}:
                 return _handle_cmd_queue_commands(source, command, cmd_name, params)
@@ -417,8 +426,7 @@ def _handle_cmd_move(source, command, cmd_name, params):
         _get_server().robot_state.set_flag("motion_state", False)
     
     if len(params) == 5:
-        _get_server().control_system.command_queue = [cmd_name] + params
-        _get_server().control_system.timeout = time.time()
+        _get_server().control_system.submit_command([cmd_name] + params)
         logger.info("[%s] Queued CMD_MOVE into control_system.command_queue: %s", source, [cmd_name] + params)
         return True
     else:
@@ -426,10 +434,23 @@ def _handle_cmd_move(source, command, cmd_name, params):
         return True  # Still handled, just invalid
 
 
+def _handle_cmd_velocity(source, command, cmd_name, params):
+    """Handle CMD_VELOCITY commands (vx, vy in mm/s, yaw rate in deg/s)."""
+    if _get_server().robot_state.get_flag("motion_state"):
+        logger.debug("[%s] Detected CMD_VELOCITY during routine. Resetting motion_state.", source)
+        _get_server().robot_state.set_flag("motion_state", False)
+
+    if len(params) == 3:
+        _get_server().control_system.submit_command([cmd_name] + params)
+        logger.info("[%s] Queued CMD_VELOCITY into control_system.command_queue: %s", source, [cmd_name] + params)
+    else:
+        logger.warning("[%s] Invalid CMD_VELOCITY format: %s", source, command)
+    return True
+
+
 def _handle_cmd_queue_commands(source, command, cmd_name, params):
     """Handle commands that get queued in the control system."""
-    _get_server().control_system.command_queue = [cmd_name] + params
-    _get_server().control_system.timeout = time.time()
+    _get_server().control_system.submit_command([cmd_name] + params)
     logger.info("[%s] Queued %s into control_system.command_queue", source, command)
     return True
 
@@ -43,12 +43,19 @@ LOGGER_COLORS = {
     'robot.pid':      '\033[92m',    # Bright green
     'robot.patrol':   '\033[92m',    # Bright green
     'robot.gait':     '\033[92m',    # Bright green
+    'robot.ik_table': '\033[92m',    # Bright green
+    'robot.scheduler': '\033[92m',   # Bright green
+    'robot.velocity_gait': '\033[92m', # Bright green
+    'robot.gait_cache': '\033[92m', # Bright green
+    'robot.workspace': '\033[92m',  # Bright green
     
     # Hardware/Actuators - Red shades
     'hardware':       '\033[91m',    # Bright red
     'hardware.pca9685': '\033[91m',  # Bright red
+    'hardware.i2c_bus': '\033[91m',  # Bright red
     'actuator':       '\033[91m',    # Bright red
     'actuator.servo': '\033[91m',    # Bright red
+    'actuator.servo_writer': '\033[91m', # Bright red
     'actuator.led':   '\033[91m',    # Bright red
     'led':            '\033[91m',    # Bright red (legacy)
     'led.commands':   '\033[91m',    # Bright red
@@ -59,6 +66,8 @@ LOGGER_COLORS = {
     'sensor':         '\033[93m',    # Bright yellow
     'sensor.adc':     '\033[93m',    # Bright yellow
     'sensor.imu':     '\033[93m',    # Bright yellow
+    'sensor.imu_sampler': '\033[93m', # Bright yellow
+    'sensor.imu_bias': '\033[93m',    # Bright yellow
     'sensor.ultrasonic': '\033[93m', # Bright yellow
     
     # Camera - Cyan shades
@@ -73,4 +82,30 @@ VOICE_INPUT_DEVICE = 1
 DRY_RUN = False
 DEBUG_LEGS = False
 AUTO_RELAX = False
-CLEAR_MOVE_QUEUE_AFTER_EXEC = False
\ No newline at end of file
+CLEAR_MOVE_QUEUE_AFTER_EXEC = False
+IK_TABLE = False  # Interpolate leg angles from the memory-mapped table in robot_ik_table.py
+IK_TABLE_STEP_MM = 4.0  # Grid spacing of the IK table; each spacing/geometry gets its own .npy file
+SERVO_DEADBAND_COUNTS = 0  # Skip servo writes that change a channel by this many PWM counts or fewer (~0.44 deg each)
+SERVO_WRITER = False  # Flush leg frames from a dedicated I2C thread instead of inline in set_leg_angles
+SERVO_WRITER_RATE_HZ = 50  # Servo writer flush rate; 50 Hz matches the PWM period
+SERVO_SYNC_UPDATES = True  # Merge each board's changed channels into as few latched block writes as possible
+SERVO_MEASURE_SKEW = False  # Time every block write and report the worst-case skew between legs
+GAIT_FRAME_RATE_HZ = 100  # Gait frames per second, paced by robot_frame_scheduler.py; use 50 with SERVO_WRITER
+GAIT_CACHE_MAX_KB = 2048  # Memory cap of the LRU cache of compiled CMD_MOVE cycles (robot_gait_cache.py)
+GAIT_CACHE_DIR = "gait_cache"  # Compiled cycles persist here across restarts; None keeps them in memory only
+GAIT_CACHE_PRECOMPILE = True  # Compile the fixed-parameter motion routines' gait cycles at boot
+VELOCITY_GAIT_CYCLE_MS = 500  # Step cycle of the CMD_VELOCITY tripod oscillator in robot_velocity_gait.py
+VELOCITY_ROUTINES = True  # Tripod "run" routines walk with one CMD_VELOCITY instead of repeated CMD_MOVE cycles
+VELOCITY_MAX_STRIDE_MM = 60  # Longest stance stroke; caps walking speed at stride / half a cycle (240 mm/s at 500 ms)
+WORKSPACE_CLAMP = True  # Pull feet outside the reachable workspace back onto it instead of skipping the frame (robot_workspace.py)
+WORKSPACE_MAX_CLAMP_MM = 40  # Frames that need a larger correction on any leg are still skipped
+WORKSPACE_ENVELOPE = False  # Clamp to the tabulated reach of the leg links instead of the 90-248 mm shell
+IMU_SAMPLER = True  # Burst-read the MPU6050 from a background thread; False reads one sample inline per request
+IMU_SAMPLE_RATE_HZ = 200  # Sampler rate; each sample is one 14-byte accel/temp/gyro block read
+IMU_BUFFER_SECONDS = 2.0  # Length of the timestamped sample ring readers take latest or windowed data from
+IMU_FIFO = False  # Let the MPU6050 queue samples in its FIFO and drain it in block reads (survives thread stalls)
+IMU_FIFO_DRAIN_HZ = 50  # FIFO drain rate; the 1 KB FIFO holds 73 samples, about 365 ms at 200 Hz
+IMU_BIAS_FILE = "imu_bias.json"  # Saved accel/gyro offsets, loaded at start-up instead of calibrating
+IMU_BIAS_WINDOW_S = 1.0  # Length of the still windows the gyro bias is refined from in the background
+IMU_BIAS_MAX_TEMP_DELTA_C = 8.0  # A saved gyro bias measured further than this from the current temperature is re-measured
+IMU_BIAS_SAVE_INTERVAL_S = 60.0  # Minimum time between saves of the refined bias (it is also saved on shutdown)
@@ -1,5 +1,6 @@
 class COMMAND:
     CMD_MOVE = "CMD_MOVE"
+    CMD_VELOCITY = "CMD_VELOCITY"
     CMD_LED_MOD = "CMD_LED_MOD"
     CMD_LED = "CMD_LED"
     CMD_SONIC = "CMD_SONIC"
@@ -0,0 +1,218 @@
+# hardware_i2c_bus.py
+
+import time
+import heapq
+import bisect
+import itertools
+import threading
+import logging
+from contextlib import contextmanager
+import smbus
+
+logger = logging.getLogger("hardware.i2c_bus")
+
+# Transaction priorities: lower runs first when several threads wait for the bus
+PRIORITY_SERVO = 0
+PRIORITY_IMU = 1
+PRIORITY_ADC = 2
+
+# Upper edges (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50)
+
+
+class _PriorityLock:
+    """
+    Re-entrant lock granted to waiting threads in (priority, arrival) order.
+
+    The owning thread may re-acquire it, which is how a batch keeps the bus
+    across several transactions.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._owner = None
+        self._depth = 0
+
+    def acquire(self, priority):
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner == me:
+                self._depth += 1
+                return
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            while self._owner is not None or self._waiting[0] != ticket:
+                self._condition.wait()
+            heapq.heappop(self._waiting)
+            self._owner = me
+            self._depth = 1
+
+    def release(self):
+        with self._condition:
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+
+class _DeviceStats:
+    """Transaction count, errors and latency histograms for one device."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.max_wait_ms = 0.0
+        self.wait_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, wait_ms, latency_ms, failed):
+        self.count += 1
+        self.errors += failed
+        self.record_wait(wait_ms)
+        self.latency_histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def record_wait(self, wait_ms):
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.wait_histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, wait_ms)] += 1
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'max_wait_ms': round(self.max_wait_ms, 3),
+            'wait_histogram': list(self.wait_histogram),
+            'latency_histogram': list(self.latency_histogram),
+        }
+
+
+class I2CBus:
+    """
+    Single owner of the I2C bus shared by the servo boards, the IMU and the ADC.
+
+    Every transaction takes the bus through a priority lock, so when several
+    threads are waiting, servo frames go first, then IMU reads, then ADC reads.
+    Transactions run in the caller's thread; a batch holds the bus across several
+    of them (e.g. a whole servo frame). A transaction already on the wire is not
+    preempted, so lower-priority devices keep theirs to a few bytes.
+    """
+
+    def __init__(self, bus_number=1):
+        self.smbus = smbus.SMBus(bus_number)
+        self.lock = _PriorityLock()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        logger.info("Shared I2C bus %d opened", bus_number)
+
+    def client(self, name, priority):
+        """Return an SMBus-compatible proxy whose transactions run at priority and are recorded under name."""
+        with self.stats_lock:
+            self.stats.setdefault(name, _DeviceStats())
+        return I2CClient(self, name, priority)
+
+    @contextmanager
+    def batch(self, priority, name=None):
+        """Hold the bus for several transactions from this thread; the wait for it is recorded under name."""
+        requested = time.perf_counter()
+        self.lock.acquire(priority)
+        if name is not None:
+            with self.stats_lock:
+                self.stats[name].record_wait((time.perf_counter() - requested) * 1000)
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def execute(self, name, priority, method, *args):
+        """Run one smbus call under the bus lock and record its wait and total latency."""
+        requested = time.perf_counter()
+        self.lock.acquire(priority)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return getattr(self.smbus, method)(*args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.lock.release()
+            finished = time.perf_counter()
+            with self.stats_lock:
+                self.stats[name].record((started - requested) * 1000, (finished - requested) * 1000, failed)
+
+    def get_stats(self):
+        """Return per-device transaction counts and latency histograms (bucket edges in LATENCY_BUCKETS_MS)."""
+        with self.stats_lock:
+            return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def log_stats(self):
+        """Log a one-line summary per device."""
+        for name, stats in self.get_stats().items():
+            logger.info("I2C %s: %d transactions, %d errors, max wait %.2f ms, latency histogram %s",
+                        name, stats['count'], stats['errors'], stats['max_wait_ms'], stats['latency_histogram'])
+
+    def close(self):
+        """Close the underlying bus."""
+        try:
+            self.log_stats()
+            self.smbus.close()
+            logger.info("Shared I2C bus closed")
+        except Exception as e:
+            logger.error("Error closing shared I2C bus: %s", e)
+
+
+class I2CClient:
+    """SMBus-compatible view of the shared bus for one device, usable as a drop-in `bus` attribute."""
+
+    def __init__(self, bus, name, priority):
+        self.shared_bus = bus
+        self.name = name
+        self.priority = priority
+
+    def batch(self):
+        """Hold the bus at this client's priority for several transactions."""
+        return self.shared_bus.batch(self.priority, self.name)
+
+    def _execute(self, method, *args):
+        return self.shared_bus.execute(self.name, self.priority, method, *args)
+
+    def read_byte(self, address):
+        return self._execute('read_byte', address)
+
+    def write_byte(self, address, value):
+        return self._execute('write_byte', address, value)
+
+    def read_byte_data(self, address, register):
+        return self._execute('read_byte_data', address, register)
+
+    def write_byte_data(self, address, register, value):
+        return self._execute('write_byte_data', address, register, value)
+
+    def read_word_data(self, address, register):
+        return self._execute('read_word_data', address, register)
+
+    def write_word_data(self, address, register, value):
+        return self._execute('write_word_data', address, register, value)
+
+    def read_i2c_block_data(self, address, register, length):
+        return self._execute('read_i2c_block_data', address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        return self._execute('write_i2c_block_data', address, register, data)
+
+    def close(self):
+        """The shared bus outlives its clients; closing a client is a no-op."""
+
+
+_shared_bus = None
+_shared_bus_lock = threading.Lock()
+
+
+def get_i2c_bus():
+    """Return the process-wide shared I2C bus, opening it on first use."""
+    global _shared_bus
+    with _shared_bus_lock:
+        if _shared_bus is None:
+            _shared_bus = I2CBus()
+        return _shared_bus
@@ -2,11 +2,14 @@
 
 import time
 import math
-import smbus
 import logging
+from hardware_i2c_bus import get_i2c_bus, PRIORITY_SERVO
 
 logger = logging.getLogger("hardware.pca9685")
 
+# SMBus block writes carry at most 32 data bytes, i.e. 8 channels of 4 registers
+MAX_BLOCK_CHANNELS = 8
+
 # ============================================================================
 # Raspi PCA9685 16-Channel PWM Servo Driver
 # 
@@ -21,6 +24,10 @@ class PCA9685:
     __SUBADR2            = 0x03  # Required for hardware compatibility  
     __SUBADR3            = 0x04  # Required for hardware compatibility
     __MODE1              = 0x00
+    __MODE1_AI           = 0x20  # Register auto-increment, needed for block writes
+    __MODE2              = 0x01
+    __MODE2_OCH          = 0x08  # Outputs change on ACK instead of on STOP
+    __MODE2_OUTDRV       = 0x04  # Totem-pole outputs
     __PRESCALE           = 0xFE
     __LED0_ON_L          = 0x06
     __LED0_ON_H          = 0x07
@@ -31,12 +38,14 @@ class PCA9685:
     __ALLLED_OFF_L       = 0xFC  # Required for LED functionality
     __ALLLED_OFF_H       = 0xFD  # Required for LED functionality
 
-    def __init__(self, address: int = 0x40, debug: bool = False):
+    def __init__(self, address: int = 0x40, debug: bool = False, update_on_ack: bool = False):
         try:
-            self.bus = smbus.SMBus(1)
+            self.bus = get_i2c_bus().client("pca9685@0x%02X" % address, PRIORITY_SERVO)
             self.address = address
             self.debug = debug
-            self.write(self.__MODE1, 0x00)
+            self.write(self.__MODE1, self.__MODE1_AI)
+            # Latch outputs on STOP (default) so every channel of one block write changes together
+            self.write(self.__MODE2, self.__MODE2_OUTDRV | (self.__MODE2_OCH if update_on_ack else 0))
             logger.info("PCA9685 initialized at address 0x%02X", address)
         except Exception as e:
             logger.error("Failed to initialize PCA9685 at address 0x%02X: %s", address, e)
@@ -52,6 +61,16 @@ class PCA9685:
             logger.error("Failed to write to PCA9685 register 0x%02X: %s", reg, e)
             raise
       
+    def write_block(self, reg: int, data: list) -> None:
+        """Writes consecutive registers starting at reg in one I2C transaction (needs auto-increment)."""
+        try:
+            self.bus.write_i2c_block_data(self.address, reg, data)
+            if self.debug:
+                logger.debug("PCA9685 block write: reg=0x%02X, %d bytes", reg, len(data))
+        except Exception as e:
+            logger.error("Failed to block write PCA9685 register 0x%02X: %s", reg, e)
+            raise
+
     def read(self, reg: int) -> int:
         """Read an unsigned byte from the I2C device."""
         try:
@@ -87,16 +106,47 @@ class PCA9685:
     def set_pwm(self, channel: int, on: int, off: int) -> None:
         """Sets a single PWM channel."""
         try:
-            self.write(self.__LED0_ON_L + 4 * channel, on & 0xFF)
-            self.write(self.__LED0_ON_H + 4 * channel, on >> 8)
-            self.write(self.__LED0_OFF_L + 4 * channel, off & 0xFF)
-            self.write(self.__LED0_OFF_H + 4 * channel, off >> 8)
+            self.write_block(self.__LED0_ON_L + 4 * channel, [on & 0xFF, on >> 8, off & 0xFF, off >> 8])
             if self.debug:
                 logger.debug("PCA9685 PWM set: channel=%d, on=%d, off=%d", channel, on, off)
         except Exception as e:
             logger.error("Failed to set PCA9685 PWM channel %d: %s", channel, e)
             raise
 
+    def set_channels(self, start: int, counts: list) -> int:
+        """
+        Sets consecutive channels from start to the given off counts (on = 0).
+
+        Uses one block write per MAX_BLOCK_CHANNELS channels and returns the
+        number of I2C transactions issued.
+        """
+        try:
+            if start < 0 or start + len(counts) > 16:
+                raise ValueError(f"channels {start}-{start + len(counts) - 1} out of range 0-15")
+            transactions = 0
+            for offset in range(0, len(counts), MAX_BLOCK_CHANNELS):
+                data = []
+                for off in counts[offset:offset + MAX_BLOCK_CHANNELS]:
+                    data += [0, 0, off & 0xFF, off >> 8]
+                self.write_block(self.__LED0_ON_L + 4 * (start + offset), data)
+                transactions += 1
+            if self.debug:
+                logger.debug("PCA9685 channels set: start=%d, counts=%s", start, list(counts))
+            return transactions
+        except Exception as e:
+            logger.error("Failed to set PCA9685 channels from %d: %s", start, e)
+            raise
+
+    def set_all_pwm(self, on: int, off: int) -> None:
+        """Sets every channel at once through the ALL_LED registers (one I2C transaction)."""
+        try:
+            self.write_block(self.__ALLLED_ON_L, [on & 0xFF, on >> 8, off & 0xFF, off >> 8])
+            if self.debug:
+                logger.debug("PCA9685 all channels set: on=%d, off=%d", on, off)
+        except Exception as e:
+            logger.error("Failed to set all PCA9685 channels: %s", e)
+            raise
+
     def set_motor_pwm(self, channel: int, duty: int) -> None:
         """Sets the PWM duty cycle for a motor."""
         try:
@@ -133,6 +183,10 @@ class PCA9685:
             'ALLLED_OFF_L': self.__ALLLED_OFF_L,
             'ALLLED_OFF_H': self.__ALLLED_OFF_H,
             'MODE1': self.__MODE1,
+            'MODE1_AI': self.__MODE1_AI,
+            'MODE2': self.__MODE2,
+            'MODE2_OCH': self.__MODE2_OCH,
+            'MODE2_OUTDRV': self.__MODE2_OUTDRV,
             'PRESCALE': self.__PRESCALE,
             'LED0_ON_L': self.__LED0_ON_L,
             'LED0_ON_H': self.__LED0_ON_H,
@@ -11,6 +11,7 @@ from actuator_led import Led
 
 from actuator_buzzer import Buzzer
 from robot_control import Control
+from actuator_servo import ServoFrame
 from sensor_adc import ADC
 from sensor_ultrasonic import Ultrasonic
 from constants_commands import COMMAND as cmd
@@ -41,8 +42,11 @@ class Server:
         # Use the control system's servo instance instead of creating our own
         self.servo_controller = self.control_system.servo
         self.buzzer_controller = Buzzer()
-        self.servo_controller.set_servo_angle(0, 90)  # Pan
-        self.servo_controller.set_servo_angle(1, 90)  # Til
+        # Head pan (0) / tilt (1) and diagnostic servo targets, sent through frames
+        self.head_frame = ServoFrame()
+        self.diag_frame = ServoFrame()
+        self.head_frame.set_angles([0, 1], [90, 90])
+        self.servo_controller.commit(self.head_frame)
         self.ultrasonic_sensor = Ultrasonic()
         self.camera_device = Camera()  
 
@@ -66,6 +70,7 @@ class Server:
             cmd.CMD_RELAX: self.handle_relax,
             cmd.CMD_SERVOPOWER: self.handle_servo_power,
             cmd.CMD_MOVE: self.handle_move,
+            cmd.CMD_VELOCITY: self.handle_move,
             cmd.CMD_IMU_STATUS: self.handle_imu_status,
             cmd.CMD_CALIBRATION: self.handle_calibration,
             cmd.CMD_ATTITUDE: self.handle_attitude,
@@ -73,8 +78,7 @@ class Server:
         }
 
     def handle_calibration(self, parts):
-        self.control_system.command_queue = parts
-        self.control_system.timeout = time.time()
+        self.control_system.submit_command(parts)
 
     def handle_buzzer(self, parts):
         if len(parts) >= 2:
@@ -120,7 +124,8 @@ class Server:
             channel = int(parts[1])
             angle = int(parts[2])
             logger.info("DEBUG: handle_head called with channel=%s, angle=%s", channel, angle)
-            self.servo_controller.set_servo_angle(channel, angle)
+            self.head_frame.set_angles([channel], [angle])
+            self.servo_controller.commit(self.head_frame)
 
     def handle_camera(self, parts):
         if len(parts) == 3:
@@ -128,8 +133,8 @@ class Server:
             from robot_kinematics import restrict_value
             x = restrict_value(int(parts[1]), 50, 180)
             y = restrict_value(int(parts[2]), 0, 180)
-            self.servo_controller.set_servo_angle(0, x)
-            self.servo_controller.set_servo_angle(1, y)
+            self.head_frame.set_angles([0, 1], [x, y])
+            self.servo_controller.commit(self.head_frame)
 
     def handle_relax(self, parts):
         new_state = not self.robot_state.get_flag("servo_off")
@@ -145,19 +150,16 @@ class Server:
                 self.control_system.servo_power_disable.off()
 
     def handle_move(self, parts):
-        self.control_system.command_queue = parts
-        self.control_system.timeout = time.time()
+        self.control_system.submit_command(parts)
         logger.debug("[server] handle_move: command_queue set to %s", parts)
 
     def handle_attitude(self, parts):
         logger.info("Handling attitude command")
-        self.control_system.command_queue = parts.copy()
-        self.control_system.timeout = time.time()
+        self.control_system.submit_command(parts)
 
     def handle_position(self, parts):
         logger.info("Handling position command")
-        self.control_system.command_queue = parts.copy()
-        self.control_system.timeout = time.time()
+        self.control_system.submit_command(parts)
 
 
     @staticmethod
@@ -216,8 +218,7 @@ class Server:
             handler(parts)
         else:
             logger.warning("[hardware_server] No handler found for command: %s", command)
-            self.control_system.command_queue = parts
-            self.control_system.timeout = time.time()
+            self.control_system.submit_command(parts)
 
 
     @staticmethod
@@ -2,7 +2,7 @@
 
 import logging
 import os
-from robot_kinematics import coordinate_to_angle
+from robot_kinematics import coordinate_to_angle_batch, leg_to_ik_coordinates
 
 logger = logging.getLogger("robot.calibration")
 
@@ -83,23 +83,16 @@ def calibrate(leg_positions, calibration_leg_positions, calibration_angles, curr
             leg_positions[i][2] = 0
         logger.debug("Set default leg positions: %s", leg_positions)
         
-        # Calculate calibration angles
-        for i in range(6):
-            calibration_angles[i][0], calibration_angles[i][1], calibration_angles[i][2] = coordinate_to_angle(
-                -calibration_leg_positions[i][2], calibration_leg_positions[i][0], calibration_leg_positions[i][1])
-        logger.debug("Calculated calibration angles: %s", calibration_angles)
-        
-        # Calculate current angles
-        for i in range(6):
-            current_angles[i][0], current_angles[i][1], current_angles[i][2] = coordinate_to_angle(
-                -leg_positions[i][2], leg_positions[i][0], leg_positions[i][1])
-        logger.debug("Calculated current angles: %s", current_angles)
-        
+        # Calculate calibration and current angles (float, so offsets keep sub-degree precision)
+        calibration_ik = coordinate_to_angle_batch(leg_to_ik_coordinates(calibration_leg_positions), quantize=False)
+        current_ik = coordinate_to_angle_batch(leg_to_ik_coordinates(leg_positions), quantize=False)
+        logger.debug("Calculated calibration angles: %s", calibration_ik.tolist())
+        logger.debug("Calculated current angles: %s", current_ik.tolist())
+
         # Calculate angle offsets
         for i in range(6):
-            calibration_angles[i][0] = calibration_angles[i][0] - current_angles[i][0]
-            calibration_angles[i][1] = calibration_angles[i][1] - current_angles[i][1]
-            calibration_angles[i][2] = calibration_angles[i][2] - current_angles[i][2]
+            current_angles[i][:] = current_ik[i].tolist()
+            calibration_angles[i][:] = (calibration_ik[i] - current_ik[i]).tolist()
         
         logger.info("Robot leg calibration completed successfully")
         logger.debug("Final calibration angles: %s", calibration_angles)
@@ -1,28 +1,50 @@
 # -*- coding: utf-8 -*-
-import time
 import math
-import copy
+import time
 import threading
 import logging
+import numpy as np
 from gpiozero import OutputDevice
 from robot_pid import Incremental_PID
 from constants_commands import COMMAND as cmd
 from sensor_imu import IMU
-from actuator_servo import Servo
-from robot_kinematics import coordinate_to_angle, restrict_value
-from robot_pose import calculate_posture_balance, transform_coordinates
-from robot_gait import run_gait as gait_function
+from actuator_servo import Servo, ServoFrame, LEG_SERVO_CHANNELS, angle_to_count, count_to_angle, COUNTS_PER_DEGREE, SERVO_MIN_COUNT, SERVO_MAX_COUNT
+from actuator_servo_writer import ServoWriter
+from robot_kinematics import coordinate_to_angle, coordinate_to_angle_batch, leg_to_ik_coordinates, restrict_value
+from robot_ik_table import IKTable
+from robot_pose import BodyPoseSolver, transform_coordinates
+from robot_gait import run_gait as gait_function, compile_move, cycle_fingerprint
+from robot_gait_cache import GaitCycleCache, GaitCycleStore
+from robot_workspace import LegWorkspace, WorkspaceEnvelope
+from robot_routines import MOTION_ROUTINE_MOVES
+from robot_velocity_gait import VelocityGait, run_velocity_gait
+from robot_frame_scheduler import FrameScheduler
 from robot_calibration import read_from_txt, save_to_txt, calibrate
 from config import robot_config
 
 
 logger = logging.getLogger("robot.control")
 
+# Servo angle = JOINT_BASE + JOINT_DIRECTION * (IK angle + calibration offset); the right-hand
+# legs (4-6) mount mirrored, so their femur and tibia turn the other way
+JOINT_BASE = np.array([[0, 90, 0]] * 3 + [[0, 90, 180]] * 3, dtype=float)
+JOINT_DIRECTION = np.array([[1, -1, 1]] * 3 + [[1, 1, -1]] * 3, dtype=float)
+
 class Control:
     def __init__(self, robot_state):  # Add any other params you need
         self.robot_state = robot_state
         self.imu = IMU()
         self.servo = Servo()
+        self.leg_frame = ServoFrame()
+        self.frame_scheduler = FrameScheduler(robot_config.GAIT_FRAME_RATE_HZ)
+        gait_store = GaitCycleStore(robot_config.GAIT_CACHE_DIR) if robot_config.GAIT_CACHE_DIR else None
+        self.gait_cache = GaitCycleCache(robot_config.GAIT_CACHE_MAX_KB * 1024, gait_store)
+        envelope = WorkspaceEnvelope() if robot_config.WORKSPACE_ENVELOPE else None
+        self.workspace = LegWorkspace(robot_config.WORKSPACE_CLAMP, robot_config.WORKSPACE_MAX_CLAMP_MM, envelope)
+        self.velocity_gait = VelocityGait(robot_config.VELOCITY_GAIT_CYCLE_MS, robot_config.VELOCITY_MAX_STRIDE_MM)
+        self.servo_writer = ServoWriter(self.servo, robot_config.SERVO_WRITER_RATE_HZ) if robot_config.SERVO_WRITER else None
+        if self.servo_writer is not None:
+            self.servo_writer.start()
         self.movement_flag = 0x01
         self.pid_controller = Incremental_PID(0.500, 0.00, 0.0025)
         self.servo_power_disable = OutputDevice(4)
@@ -35,19 +57,72 @@ class Control:
             [-137.1, -189.4, self.body_height], [-225, 0, self.body_height], [-137.1, 189.4, self.body_height]
         ]
         self.calibration_leg_positions = read_from_txt('point')
-        self.leg_positions = [[140, 0, 0] for _ in range(6)]
+        self.leg_positions = np.array([[140, 0, 0]] * 6, dtype=float)
         self.calibration_angles = [[0, 0, 0] for _ in range(6)]
         self.current_angles = [[90, 0, 0] for _ in range(6)]
+        self.gait_pose = None  # (body points, leg positions) of the last gait frame played
+        # Body pose set by CMD_POSITION and CMD_ATTITUDE; the height is body_height
+        self.pose_solver = BodyPoseSolver()
+        self.body_offset = [0, 0]
+        self.body_attitude = [0, 0, 0]
         self.command_queue = ['', '', '', '', '', '']
-        calibrate(self.leg_positions, self.calibration_leg_positions, self.calibration_angles, self.current_angles)
+        # Command submission: submit_command() stores the latest command and wakes the control loop
+        self.command_condition = threading.Condition()
+        self.command_seq = 0
+        self.handled_seq = 0
+        self.command_submitted_at = None
+        self.reaction_pending_since = None
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.loop_started_at = None
+        self.loop_idle_time = 0.0
+        self.loop_cpu_time = 0.0
+        self.ik_table = IKTable(step=robot_config.IK_TABLE_STEP_MM) if robot_config.IK_TABLE else None
+        self.count_gain = np.zeros((6, 3))
+        self.count_bias = np.zeros((6, 3))
+        self.recalibrate()
         self.set_leg_angles()
         self.debug_leg_pose_report()
+        if robot_config.GAIT_CACHE_PRECOMPILE:
+            self.precompile_gaits(MOTION_ROUTINE_MOVES)
         self.condition_thread = threading.Thread(target=self.condition_monitor)
-        self.Thread_conditiona = threading.Condition()
         self.stop_event = threading.Event()
         self.condition_thread.start()
         logger.warning("Control system initialized. Thread alive = %s", self.condition_thread.is_alive())
 
+    def recalibrate(self):
+        """Recompute calibration offsets from calibration_leg_positions and rebuild the count table."""
+        calibrate(self.leg_positions, self.calibration_leg_positions, self.calibration_angles, self.current_angles)
+        self._compile_count_table()
+        # Compiled gait cycles hold calibrated counts; files from earlier calibrations are never read again
+        self.gait_cache.reset(cycle_fingerprint(self))
+        if self.gait_cache.store is not None:
+            self.gait_cache.store.prune(self.gait_cache.fingerprint)
+
+    def _compile_count_table(self):
+        """
+        Precompute the per-channel IK angle -> PWM count map.
+
+        Joint mirroring and the calibration offsets are folded into one gain and
+        bias per joint, so a frame costs a multiply-add and a clip per channel.
+        """
+        servo_offset = JOINT_BASE + JOINT_DIRECTION * np.asarray(self.calibration_angles, dtype=float)
+        self.count_gain = JOINT_DIRECTION * COUNTS_PER_DEGREE
+        self.count_bias = angle_to_count(servo_offset)
+        logger.debug("Servo count table compiled: bias=%s", np.round(self.count_bias, 2).tolist())
+
+    def precompile_gaits(self, moves):
+        """Compile the gait cycles of fixed CMD_MOVE commands ahead of use."""
+        started = time.perf_counter()
+        for data in moves:
+            try:
+                compile_move(self, data)
+            except Exception as e:
+                logger.error("[control] Failed to precompile gait %s: %s", data, e)
+        logger.info("[control] Precompiled %d gait cycles in %.0f ms: %s",
+                    len(moves), (time.perf_counter() - started) * 1000, self.gait_cache.get_stats())
+
     def debug_leg_pose_report(self):
         if not robot_config.DEBUG_LEGS or not logger.isEnabledFor(logging.DEBUG):
             return  # Skip if debugging disabled or log level too low
@@ -62,16 +137,84 @@ class Control:
                 pre = [0, 0, 0]
             cal = self.calibration_angles[i]
             post = self.current_angles[i]
-            logger.debug("Leg %d | pos: [%6.1f, %6.1f, %6.1f] | pre-angle: [%3d, %3d, %3d] | calib: [%3d, %3d, %3d] | final: [%3d, %3d, %3d]",
+            logger.debug("Leg %d | pos: [%6.1f, %6.1f, %6.1f] | pre-angle: [%3d, %3d, %3d] | calib: [%6.2f, %6.2f, %6.2f] | final: [%6.2f, %6.2f, %6.2f]",
                         i+1, raw[0], raw[1], raw[2],
                         pre[0], pre[1], pre[2],
                         cal[0], cal[1], cal[2],
                         post[0], post[1], post[2])
     
+    def submit_command(self, parts):
+        """Replace the pending command and wake the control loop."""
+        with self.command_condition:
+            self.command_queue = list(parts)
+            self.timeout = time.time()
+            self.command_seq += 1
+            self.command_submitted_at = time.perf_counter()
+            self.command_condition.notify()
+
+    def set_velocity(self, vx, vy, yaw_rate):
+        """Walk at vx, vy (mm/s) and yaw_rate (deg/s); a running walk is retargeted without stopping."""
+        self.submit_command([cmd.CMD_VELOCITY, str(vx), str(vy), str(yaw_rate)])
+
+    def command_pending(self):
+        """True if a command was submitted that the control side has not yet taken up."""
+        return self.command_seq != self.handled_seq
+
+    def acknowledge_command(self):
+        """
+        Mark the latest submitted command as taken up and return a copy of it.
+
+        The copy is taken under the same lock as the sequence number, so a
+        command submitted afterwards stays pending instead of being read by a
+        handler that has already acknowledged the previous one. A newly taken
+        up command's latency runs to the next servo frame.
+        """
+        with self.command_condition:
+            if self.handled_seq != self.command_seq:
+                self.handled_seq = self.command_seq
+                self.reaction_pending_since = self.command_submitted_at
+            return list(self.command_queue)
+
+    def _clear_command_queue(self):
+        """Clear the handled command, unless a newer one was submitted while it ran."""
+        with self.command_condition:
+            if self.command_seq == self.handled_seq:
+                self.command_queue = ['', '', '', '', '', '']
+
+    def _record_command_latency(self):
+        """Record the time from command submission to the first servo frame reacting to it."""
+        submitted = self.reaction_pending_since
+        if submitted is None:
+            return
+        self.reaction_pending_since = None
+        latency = time.perf_counter() - submitted
+        self.latency_count += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        logger.debug("[control] Command to first servo frame: %.3f ms", latency * 1000)
+
+    def get_loop_stats(self):
+        """Return control loop CPU use, idle fraction and command-to-servo latency."""
+        wall = max(time.perf_counter() - self.loop_started_at, 1e-9) if self.loop_started_at else 1e-9
+        return {
+            'loop_cpu_percent': round(100 * self.loop_cpu_time / wall, 2),
+            'idle_percent': round(100 * self.loop_idle_time / wall, 2),
+            'commands': self.latency_count,
+            'latency_mean_ms': round(1000 * self.latency_total / max(self.latency_count, 1), 3),
+            'latency_max_ms': round(1000 * self.latency_max, 3),
+        }
+
     def stop(self):
         self.stop_event.set()
+        with self.command_condition:
+            self.command_condition.notify()
+        logger.info("[control] Loop stats: %s", self.get_loop_stats())
+        logger.info("[control] Workspace stats: %s", self.workspace.get_stats())
         if self.condition_thread.is_alive():
             self.condition_thread.join()
+        if self.servo_writer is not None:
+            self.servo_writer.stop()
+        self.imu.close()
 
     def set_leg_angles(self):
         # Skip if servo power is off
@@ -79,90 +222,99 @@ class Control:
             logger.debug("Skipped set_leg_angles: servo_off is True.")
             return
 
-        if not self.check_point_validity():
+        # Feet slightly out of reach are clamped onto the workspace rather than dropping the frame
+        _, clamped, valid = self.workspace.project(self.leg_positions, out=self.leg_positions)
+        self.workspace.record(clamped, valid)
+        if not valid:
             logger.debug("This coordinate point is out of the active range.")
             return
 
-        # Show GPIO state at the start of execution
+        self.write_leg_counts(self.compute_leg_counts(self.leg_positions))
 
-        # Calculate angles based on leg_positions
-        for i in range(6):
-            self.current_angles[i][0], self.current_angles[i][1], self.current_angles[i][2] = coordinate_to_angle(
-                -self.leg_positions[i][2], self.leg_positions[i][0], self.leg_positions[i][1])
-
-        # Apply calibration offsets and clamp for legs 0 to 2
-        for i in range(3):
-            self.current_angles[i][0] = restrict_value(self.current_angles[i][0] + self.calibration_angles[i][0], 0, 180)
-            self.current_angles[i][1] = restrict_value(90 - (self.current_angles[i][1] + self.calibration_angles[i][1]), 0, 180)
-            self.current_angles[i][2] = restrict_value(self.current_angles[i][2] + self.calibration_angles[i][2], 0, 180)
-            # Legs 3 to 5 with adjustments
-            self.current_angles[i + 3][0] = restrict_value(self.current_angles[i + 3][0] + self.calibration_angles[i + 3][0], 0, 180)
-            self.current_angles[i + 3][1] = restrict_value(90 + self.current_angles[i + 3][1] + self.calibration_angles[i + 3][1], 0, 180)
-            self.current_angles[i + 3][2] = restrict_value(180 - (self.current_angles[i + 3][2] + self.calibration_angles[i + 3][2]), 0, 180)
-
-        # Send angles to servos in the correct order
-        # Leg 1
-        self.servo.set_servo_angle(15, self.current_angles[0][0])
-        self.servo.set_servo_angle(14, self.current_angles[0][1])
-        self.servo.set_servo_angle(13, self.current_angles[0][2])
-        # Leg 2
-        self.servo.set_servo_angle(12, self.current_angles[1][0])
-        self.servo.set_servo_angle(11, self.current_angles[1][1])
-        self.servo.set_servo_angle(10, self.current_angles[1][2])
-        # Leg 3
-        self.servo.set_servo_angle(9, self.current_angles[2][0])
-        self.servo.set_servo_angle(8, self.current_angles[2][1])
-        self.servo.set_servo_angle(31, self.current_angles[2][2])
-        # Leg 6
-        self.servo.set_servo_angle(16, self.current_angles[5][0])
-        self.servo.set_servo_angle(17, self.current_angles[5][1])
-        self.servo.set_servo_angle(18, self.current_angles[5][2])
-        # Leg 5
-        self.servo.set_servo_angle(19, self.current_angles[4][0])
-        self.servo.set_servo_angle(20, self.current_angles[4][1])
-        self.servo.set_servo_angle(21, self.current_angles[4][2])
-        # Leg 4
-        self.servo.set_servo_angle(22, self.current_angles[3][0])
-        self.servo.set_servo_angle(23, self.current_angles[3][1])
-        self.servo.set_servo_angle(27, self.current_angles[3][2])
-
-
-    def check_point_validity(self):
-        is_valid = True
-        leg_lengths = [0.0] * 6
+    def compute_leg_counts(self, leg_positions):
+        """Solve (..., 6, 3) leg positions to calibrated PWM counts of the same shape in one IK batch."""
+        positions = np.asarray(leg_positions, dtype=float)
+        ik_points = leg_to_ik_coordinates(positions.reshape(-1, 3))
+        if self.ik_table is not None:
+            ik_angles = self.ik_table.lookup(ik_points)
+        else:
+            ik_angles = coordinate_to_angle_batch(ik_points, quantize=False)
+
+        # Map to PWM counts through the calibrated per-channel table; clamping the
+        # counts is the same as clamping the servo angle to 0-180
+        counts = ik_angles.reshape(positions.shape) * self.count_gain + self.count_bias
+        np.clip(counts, SERVO_MIN_COUNT, SERVO_MAX_COUNT, out=counts)
+        return counts
+
+    def play_leg_frame(self, leg_positions, counts, valid, clamped=False):
+        """Output a precompiled leg frame, as set_leg_angles would after transform_coordinates."""
+        self.leg_positions[:] = leg_positions
+        if self.robot_state.get_flag("servo_off"):
+            logger.debug("Skipped play_leg_frame: servo_off is True.")
+            return
+        self.workspace.record(clamped, valid)
+        if not valid:
+            logger.debug("This coordinate point is out of the active range.")
+            return
+        self.write_leg_counts(counts)
+
+    def write_leg_counts(self, counts):
+        """Send a 6 x 3 array of leg PWM counts as one frame."""
+        angles = count_to_angle(counts)
         for i in range(6):
-            leg_lengths[i] = math.sqrt(self.leg_positions[i][0] ** 2 + self.leg_positions[i][1] ** 2 + self.leg_positions[i][2] ** 2)
-        for length in leg_lengths:
-            if length > 248 or length < 90:
-                is_valid = False
-        return is_valid
+            self.current_angles[i][:] = angles[i].tolist()
+
+        # Send all 18 channels as one frame, via the writer thread when enabled
+        self.leg_frame.set_counts(LEG_SERVO_CHANNELS, counts)
+        if self.servo_writer is not None:
+            self.servo_writer.publish(self.leg_frame)
+        else:
+            bus_time = self.servo.commit(self.leg_frame)
+            if robot_config.DEBUG_LEGS:
+                logger.debug("Leg frame committed in %.2f ms", bus_time * 1000)
+        self._record_command_latency()
 
     def _check_servo_off_condition(self):
         """Check if servos are powered off and handle accordingly."""
         if self.robot_state.get_flag("servo_off"):
-            time.sleep(0.1)
+            # servo_off is a plain flag, so poll it, but let a new command wake the loop early
+            self._wait_for_command(0.1)
             return True
         return False
 
-    def _handle_auto_relax(self):
+    def _wait_for_command(self, timeout=None):
+        """Block until a command newer than the one being handled is submitted, or timeout."""
+        started = time.perf_counter()
+        with self.command_condition:
+            self.command_condition.wait_for(
+                lambda: self.command_seq != self.handled_seq or self.stop_event.is_set(), timeout)
+        self.loop_idle_time += time.perf_counter() - started
+
+    def _idle_timeout(self):
+        """Seconds until auto-relax is due, or None to wait indefinitely."""
+        if not robot_config.AUTO_RELAX or self.timeout == 0:
+            return None
+        return max(self.timeout + 10 - time.time(), 0.0)
+
+    def _handle_auto_relax(self, command):
         """Handle automatic relaxation after timeout if enabled."""
         if (
             robot_config.AUTO_RELAX
             and (time.time() - self.timeout) > 10
             and self.timeout != 0
-            and self.command_queue[0] == ''
+            and command[0] == ''
         ):
             self.timeout = time.time()
             self.relax(True)
             self.status_flag = 0x00
             logger.info("[control] Auto-relaxed due to inactivity.")
 
-    def _handle_position_command(self):
+    def _handle_position_command(self, command):
         """Handle position movement commands."""
-        if cmd.CMD_POSITION in self.command_queue and len(self.command_queue) == 4:
-            x = restrict_value(int(self.command_queue[1]), -40, 40)
-            y = restrict_value(int(self.command_queue[2]), -40, 40)
-            z = restrict_value(int(self.command_queue[3]), -20, 20)
+        if cmd.CMD_POSITION in command and len(command) == 4:
+            x = restrict_value(int(command[1]), -40, 40)
+            y = restrict_value(int(command[2]), -40, 40)
+            z = restrict_value(int(command[3]), -20, 20)
             
             # Enhanced logging for legacy CMD_POSITION
             logger.info("[control] LEGACY CMD_POSITION received: x=%d, y=%d, z=%d", x, y, z)
@@ -178,113 +330,134 @@ class Control:
             logger.info("[control] Body points Z values: %s", 
                        [f"{point[2]:.1f}" for point in self.body_points])
             
-            self.command_queue = ['', '', '', '', '', '']
+            self._clear_command_queue()
             return True
         return False
 
-    def _handle_attitude_command(self):
+    def _handle_attitude_command(self, command):
         """Handle attitude adjustment commands."""
-        if cmd.CMD_ATTITUDE in self.command_queue and len(self.command_queue) == 4:
-            roll = restrict_value(int(self.command_queue[1]), -15, 15)
-            pitch = restrict_value(int(self.command_queue[2]), -15, 15)
-            yaw = restrict_value(int(self.command_queue[3]), -15, 15)
-            points = calculate_posture_balance(roll, pitch, yaw, self.body_height)
-            transform_coordinates(points, self.leg_positions)
-            self.set_leg_angles()
+        if cmd.CMD_ATTITUDE in command and len(command) == 4:
+            roll = restrict_value(int(command[1]), -15, 15)
+            pitch = restrict_value(int(command[2]), -15, 15)
+            yaw = restrict_value(int(command[3]), -15, 15)
+            self.body_attitude = [roll, pitch, yaw]
+            self.apply_body_pose()
             self.status_flag = 0x02
             logger.info("[control] CMD_ATTITUDE executed: roll=%d, pitch=%d, yaw=%d", roll, pitch, yaw)
-            self.command_queue = ['', '', '', '', '', '']
+            self._clear_command_queue()
             return True
         return False
 
-    def _handle_move_command(self):
+    def _handle_move_command(self, command):
         """Handle movement/gait commands."""
-        if cmd.CMD_MOVE in self.command_queue and len(self.command_queue) == 6:
+        if cmd.CMD_MOVE in command and len(command) == 6:
             logger.debug("[control] CMD_MOVE triggered. queue = %s | motion_state = %s",
-                        self.command_queue, self.robot_state.get_flag("motion_state"))
+                        command, self.robot_state.get_flag("motion_state"))
             
             # Log current Z position state before movement
             current_z = self.robot_state.get_flag("body_height_z")
             logger.info("[control] CMD_MOVE using Z position: body_height=%d, robot_state.body_height_z=%d", 
                        self.body_height, current_z)
             
-            if self.command_queue[2] == "0" and self.command_queue[3] == "0":
-                self.run_gait(self.command_queue)
+            if command[2] == "0" and command[3] == "0":
+                self.run_gait(command)
                 logger.info("[control] CMD_MOVE (neutral) executed: robot stopped.")
-                self.command_queue = ['', '', '', '', '', '']
+                self._clear_command_queue()
+            elif self.run_gait(command):
+                logger.info("[control] CMD_MOVE preempted by a new command; legs settled to neutral.")
             else:
-                self.run_gait(self.command_queue)
                 self.status_flag = 0x03
                 logger.info("[control] CMD_MOVE executed: gait=%s, x=%s, y=%s, speed=%s, angle=%s, z_position=%d",
-                            self.command_queue[1],
-                            self.command_queue[2],
-                            self.command_queue[3],
-                            self.command_queue[4],
-                            self.command_queue[5],
+                            command[1],
+                            command[2],
+                            command[3],
+                            command[4],
+                            command[5],
                             current_z)
                 if not robot_config.CLEAR_MOVE_QUEUE_AFTER_EXEC:
                     logger.debug("[control] Retaining CMD_MOVE in queue for repeated gait.")
                 else:
-                    self.command_queue = ['', '', '', '', '', '']
+                    self._clear_command_queue()
+            return True
+        return False
+
+    def _handle_velocity_command(self, command):
+        """Handle continuous velocity walking commands."""
+        if cmd.CMD_VELOCITY in command and len(command) == 4:
+            try:
+                velocity = [float(value) for value in command[1:4]]
+                if not all(math.isfinite(value) for value in velocity):
+                    raise ValueError(velocity)
+            except ValueError:
+                logger.warning("[control] Invalid CMD_VELOCITY parameters: %s", command[1:])
+                self._clear_command_queue()
+                return True
+            self.status_flag = 0x03
+            self.reset_body_pose()
+            if run_velocity_gait(self, [cmd.CMD_VELOCITY] + velocity):
+                logger.info("[control] CMD_VELOCITY walk stopped for a new command.")
+            else:
+                logger.info("[control] CMD_VELOCITY walk came to rest.")
+                self._clear_command_queue()
             return True
         return False
 
-    def _handle_balance_command(self):
+    def _handle_balance_command(self, command):
         """Handle IMU balance commands."""
-        if cmd.CMD_BALANCE in self.command_queue and len(self.command_queue) == 2:
-            if self.command_queue[1] == "1":
-                self.command_queue = ['', '', '', '', '', '']
+        if cmd.CMD_BALANCE in command and len(command) == 2:
+            # Clear it either way, or a "0" would be handled again on every pass
+            self._clear_command_queue()
+            if command[1] == "1":
                 self.status_flag = 0x04
                 logger.info("[control] CMD_BALANCE initiated.")
                 self.imu6050()
             return True
         return False
 
-    def _handle_calibration_command(self):
+    def _handle_calibration_command(self, command):
         """Handle calibration commands."""
-        if cmd.CMD_CALIBRATION not in self.command_queue:
+        if cmd.CMD_CALIBRATION not in command:
             return False
 
         if not self.robot_state.get_flag("calibration_mode"):
             logger.warning("[control] Ignoring calibration command: not in calibration mode.")
-            self.command_queue = ['', '', '', '', '', '']
+            self._clear_command_queue()
             return True
 
-        logger.debug("[control] Calibration block hit. Queue: %s", self.command_queue)
+        logger.debug("[control] Calibration block hit. Queue: %s", command)
         self.timeout = 0
-        calibrate(self.leg_positions, self.calibration_leg_positions, self.calibration_angles, self.current_angles)
+        self.recalibrate()
         logger.debug("[control] Calibration complete. Angles: %s", self.calibration_angles)
         self.set_leg_angles()
 
-        if len(self.command_queue) >= 2:
-            self._process_calibration_subcommand()
+        if len(command) >= 2:
+            self._process_calibration_subcommand(command)
 
-        self.command_queue = ['', '', '', '', '', '']
+        self._clear_command_queue()
         return True
 
-    def _process_calibration_subcommand(self):
+    def _process_calibration_subcommand(self, command):
         """Process specific calibration subcommands (leg adjustments, save)."""
-        cmd_name = self.command_queue[1]
-        logger.debug("[control] Calibration command details: %s", self.command_queue[1:])
+        cmd_name = command[1]
+        logger.debug("[control] Calibration command details: %s", command[1:])
         
         leg_map = {"one": 0, "two": 1, "three": 2, "four": 3, "five": 4, "six": 5}
         if cmd_name in leg_map:
-            self._calibrate_specific_leg(cmd_name, leg_map[cmd_name])
+            self._calibrate_specific_leg(command, cmd_name, leg_map[cmd_name])
         elif cmd_name == "save":
             save_to_txt(self.calibration_leg_positions, 'point')
             logger.info("[control] Calibration saved to disk.")
 
-    def _calibrate_specific_leg(self, leg_name, leg_idx):
+    def _calibrate_specific_leg(self, command, leg_name, leg_idx):
         """Calibrate a specific leg with new position values."""
         try:
             self.calibration_leg_positions[leg_idx] = [
-                int(self.command_queue[2]),
-                int(self.command_queue[3]),
-                int(self.command_queue[4])
+                int(command[2]),
+                int(command[3]),
+                int(command[4])
             ]
             self.leg_positions[leg_idx] = self.calibration_leg_positions[leg_idx][:]
-            calibrate(self.leg_positions, self.calibration_leg_positions,
-                     self.calibration_angles, self.current_angles)
+            self.recalibrate()
             self.set_leg_angles()
             logger.info("[control] Leg %s calibration updated: %s",
                        leg_name, self.calibration_leg_positions[leg_idx])
@@ -292,47 +465,73 @@ class Control:
             logger.error("[control] Calibration failed for leg %s: %s", leg_name, e)
 
     def condition_monitor(self):
-        """Main control loop that monitors and processes command queue."""
+        """
+        Main control loop that processes the command queue.
+
+        Blocks on command_condition while there is nothing to do; submit_command()
+        wakes it. A retained CMD_MOVE keeps the loop running the gait.
+        """
+        self.loop_started_at, cpu_start = time.perf_counter(), time.thread_time()
         while not self.stop_event.is_set():
+            self.loop_cpu_time = time.thread_time() - cpu_start
+            command = self.acknowledge_command()
+
             # Check for servo power off condition
             if self._check_servo_off_condition():
                 continue
 
             # Handle auto-relax functionality
-            self._handle_auto_relax()
+            self._handle_auto_relax(command)
 
             # Process commands in priority order
-            if self._handle_position_command():
+            if self._handle_position_command(command):
+                continue
+            elif self._handle_attitude_command(command):
                 continue
-            elif self._handle_attitude_command():
+            elif self._handle_move_command(command):
                 continue
-            elif self._handle_move_command():
+            elif self._handle_velocity_command(command):
                 continue
-            elif self._handle_balance_command():
+            elif self._handle_balance_command(command):
                 continue
-            elif self._handle_calibration_command():
+            elif self._handle_calibration_command(command):
                 continue
 
+            # Nothing to do: sleep until a new command arrives or auto-relax is due
+            self._wait_for_command(self._idle_timeout())
+
     def relax(self, flag):
         if flag:
+            # Drop any frame still waiting for the writer so it cannot re-energise the legs
+            if self.servo_writer is not None:
+                self.servo_writer.discard()
             self.servo.relax()
         else:
+            self.servo.hold()
             self.set_leg_angles()
 
+    def apply_body_pose(self):
+        """Move the legs to the current body offset, height and attitude."""
+        points = self.pose_solver.solve(*self.body_offset, self.body_height, *self.body_attitude)
+        transform_coordinates(points, self.leg_positions)
+        self.set_leg_angles()
+
+    def reset_body_pose(self):
+        """Forget the body offset and attitude, e.g. once a gait has walked the legs back to neutral."""
+        self.body_offset = [0, 0]
+        self.body_attitude = [0, 0, 0]
+
     def move_position(self, x, y, z):
-        points = copy.deepcopy(self.body_points)
+        """Shift the body by x, y and set its height from z, keeping the current attitude."""
+        self.body_offset = [x, y]
+        self.body_height = -30 - z
         for i in range(6):
-            points[i][0] = self.body_points[i][0] - x
-            points[i][1] = self.body_points[i][1] - y
-            points[i][2] = -30 - z
-            self.body_height = points[i][2]
-            self.body_points[i][2] = points[i][2]
+            self.body_points[i][2] = self.body_height
         
         # Update robot_state to keep web interface in sync
         self.robot_state.set_flag("body_height_z", z)
         
-        transform_coordinates(points, self.leg_positions)
-        self.set_leg_angles()
+        self.apply_body_pose()
 
     def set_body_height_z(self, z):
         """Set body height Z position from web interface."""
@@ -356,8 +555,7 @@ class Control:
             self.body_points[i][2] = self.body_height
             
         # CRITICAL: Actually move the robot's legs (same as move_position)
-        transform_coordinates(self.body_points, self.leg_positions)
-        self.set_leg_angles()
+        self.apply_body_pose()
             
         # Log the actual changes made
         logger.info("[control] WEB INTERFACE Z position executed: body_height=%d, robot_state.body_height_z=%d", 
@@ -370,12 +568,8 @@ class Control:
     def imu6050(self):
         _ = 0  # old_roll unused
         _ = 0  # old_pitch unused
-        points = calculate_posture_balance(0, 0, 0, self.body_height)
-        transform_coordinates(points, self.leg_positions)
-        self.set_leg_angles()
-        time.sleep(2)
-        self.imu.error_accel_data, self.imu.error_gyro_data = self.imu.calculate_average_sensor_data()
-        time.sleep(1)
+        self.body_attitude = [0, 0, 0]
+        self.apply_body_pose()
         while True:
             if self.command_queue[0] != "":
                 break
@@ -383,11 +577,12 @@ class Control:
             roll, pitch, _ = self.imu.update_imu_state()  # yaw unused
             roll = self.pid_controller.pid_calculate(roll)
             pitch = self.pid_controller.pid_calculate(pitch)
-            points = calculate_posture_balance(roll, pitch, 0, self.body_height)
+            points = self.pose_solver.solve(*self.body_offset, self.body_height, roll, pitch, 0)
             transform_coordinates(points, self.leg_positions)
             self.set_leg_angles()
 
-    def run_gait(self, data, Z=40, F=64):
-        gait_function(self, data, Z, F)
+    def run_gait(self, data, Z=40):
+        self.reset_body_pose()
+        return gait_function(self, data, Z)
 
 
@@ -0,0 +1,61 @@
+# robot_frame_scheduler.py
+
+import time
+import logging
+
+logger = logging.getLogger("robot.scheduler")
+
+
+class FrameScheduler:
+    """
+    Fixed-rate frame pacing against absolute monotonic-clock deadlines.
+
+    Each wait() sleeps until the next deadline, which is advanced by exactly one
+    period, so time spent on IK and I2C does not accumulate as drift. A frame
+    that finishes after its deadline is counted as an overrun; if it is more than
+    a whole period late the schedule is restarted instead of bursting frames to
+    catch up.
+    """
+
+    def __init__(self, rate_hz):
+        self.period = 1.0 / rate_hz
+        self.next_deadline = None
+        self.frames = 0
+        self.overruns = 0
+        self.resyncs = 0
+        self.max_lateness = 0.0
+
+    def resume(self):
+        """Start (or restart after an idle gap) the schedule from now."""
+        now = time.monotonic()
+        if self.next_deadline is None or now - self.next_deadline > self.period:
+            self.next_deadline = now
+
+    def wait(self):
+        """Sleep until the end of the current frame."""
+        self.frames += 1
+        self.next_deadline += self.period
+        delay = self.next_deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            return
+        lateness = -delay
+        self.overruns += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        if lateness > self.period:
+            self.resyncs += 1
+            self.next_deadline = time.monotonic()
+        logger.debug("Frame overran its deadline by %.2f ms", lateness * 1000)
+
+    def frames_for(self, period_ms):
+        """Number of frames that span period_ms at this rate."""
+        return round(period_ms / 1000 / self.period)
+
+    def get_stats(self):
+        """Return frames paced, overruns, schedule restarts and worst lateness."""
+        return {
+            'frames': self.frames,
+            'overruns': self.overruns,
+            'resyncs': self.resyncs,
+            'max_lateness_ms': round(self.max_lateness * 1000, 3),
+        }
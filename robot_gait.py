@@ -3,9 +3,12 @@
 import math
 import copy
 import time
+import hashlib
 import logging
-from robot_kinematics import restrict_value, map_value
+import numpy as np
+from robot_kinematics import restrict_value, map_value, LINK_LENGTHS
 from robot_pose import transform_coordinates
+from robot_gait_cache import GaitCycle
 
 logger = logging.getLogger("robot.gait")
 
@@ -18,12 +21,56 @@ def _parse_gait_parameters(data):
     return gait, x, y, angle
 
 
-def _calculate_frame_count(gait, speed_data):
-    """Calculate frame count based on gait type and speed."""
-    if gait == "1":
-        return round(map_value(int(speed_data), 2, 10, 126, 22))
-    else:
-        return round(map_value(int(speed_data), 2, 10, 171, 45))
+class GaitPattern:
+    """
+    One periodic gait, described as data.
+
+    Each leg is on the ground for the fraction duty of the cycle and swings for the
+    rest, starting its swing at swing_start[leg] (a fraction of the cycle). Foot
+    strokes are centred on the neutral point, so t = 0 is where repeated cycles join.
+    """
+
+    def __init__(self, name, duty, swing_start, period_ms, min_frames):
+        self.name = name
+        self.duty = duty
+        self.swing_start = np.array(swing_start, dtype=float)
+        self.period_ms = period_ms      # (slowest, fastest) cycle period over speed levels 2-10
+        self.min_frames = min_frames    # fewest frames per cycle that keep every swing a few frames long
+
+
+# Legs 0-2 run front to rear down one side of the body, legs 3-5 rear to front down the other
+GAITS = {
+    # Two alternating tripods; legs 1, 3, 5 start the cycle mid-swing
+    "1": GaitPattern("tripod", 1 / 2, [0.25, 0.75, 0.25, 0.75, 0.25, 0.75], (1260, 220), 8),
+    # One leg at a time, in the order 6, 3, 2, 1, 4, 5
+    "2": GaitPattern("wave", 5 / 6, [3 / 6, 2 / 6, 1 / 6, 4 / 6, 5 / 6, 0], (1710, 450), 18),
+    # A rear-to-front wave down each side, the two sides half a cycle apart
+    "3": GaitPattern("ripple", 2 / 3, [2 / 3, 1 / 3, 0, 1 / 2, 5 / 6, 1 / 6], (1500, 330), 12),
+    # Three diagonal pairs in turn, so four feet are always down
+    "4": GaitPattern("tetrapod", 2 / 3, [2 / 3, 1 / 3, 0, 2 / 3, 0, 1 / 3], (1500, 330), 12),
+}
+
+# Stance stroke of every gait, in units of the per-cycle CMD_MOVE step: feet stay within
+# one step of neutral, so the body covers (2 / duty) steps per cycle
+STROKE_STEPS = 2
+
+
+def _calculate_cycle_period_ms(gait, speed_data):
+    """Map the UI speed level (2-10) to a gait cycle period in milliseconds."""
+    slowest, fastest = GAITS[gait].period_ms
+    return map_value(int(speed_data), 2, 10, slowest, fastest)
+
+
+def move_velocity(gait, x, y, speed, angle):
+    """Body velocity (vx, vy in mm/s, yaw rate in deg/s) that a CMD_MOVE command walks at."""
+    gait = str(gait)
+    steps_per_s = STROKE_STEPS / GAITS[gait].duty / (_calculate_cycle_period_ms(gait, speed) / 1000)
+    return x * steps_per_s, y * steps_per_s, angle * steps_per_s
+
+
+def _calculate_frame_count(gait, period_ms, scheduler):
+    """Calculate the frame count that spans one cycle period at the scheduler's frame rate."""
+    return max(GAITS[gait].min_frames, scheduler.frames_for(period_ms))
 
 
 def _calculate_movement_deltas(points, x, y, angle, F):
@@ -45,134 +92,173 @@ def _calculate_movement_deltas(points, x, y, angle, F):
     return xy
 
 
-def _execute_neutral_position(control, points):
-    """Execute neutral position (no movement)."""
-    transform_coordinates(points, control.leg_positions)
-    control.set_leg_angles()
+# Duration of each tripod's step back to neutral when a gait is preempted
+SETTLE_PERIOD_MS = 150
 
+# Leg groups that may be lifted together without losing a stable tripod stance
+TRIPOD_GROUPS = ((0, 2, 4), (1, 3, 5))
 
-def _execute_tripod_gait(control, points, xy, Z, F, z, delay):
-    """Execute tripod gait pattern (gait type 1)."""
-    for j in range(F):
-        for i in range(3):
-            # Phase 1: First eighth of cycle
-            if j < (F / 8):
-                _apply_tripod_phase_1(points, xy, i, Z, control.body_height)
-            # Phase 2: Second eighth of cycle  
-            elif j < (F / 4):
-                _apply_tripod_phase_2(points, xy, i, z)
-            # Phase 3: Third eighth of cycle
-            elif j < (3 * F / 8):
-                _apply_tripod_phase_3(points, xy, i, z)
-            # Phase 4: Fourth eighth of cycle
-            elif j < (5 * F / 8):
-                _apply_tripod_phase_4(points, xy, i)
-            # Phase 5: Fifth eighth of cycle
-            elif j < (3 * F / 4):
-                _apply_tripod_phase_5(points, xy, i, z)
-            # Phase 6: Sixth eighth of cycle
-            elif j < (7 * F / 8):
-                _apply_tripod_phase_6(points, xy, i, z)
-            # Phase 7: Final eighth of cycle
-            elif j < F:
-                _apply_tripod_phase_7(points, xy, i)
-        
-        transform_coordinates(points, control.leg_positions)
-        control.set_leg_angles()
-        time.sleep(delay)
 
+def _gait_preempted(control, data):
+    """
+    True when a different command has been submitted since this gait started.
 
-def _apply_tripod_phase_1(points, xy, i, Z, body_height):
-    """Apply tripod gait phase 1 movements."""
-    points[2 * i][0] -= 4 * xy[2 * i][0]
-    points[2 * i][1] -= 4 * xy[2 * i][1]
-    points[2 * i + 1][0] += 8 * xy[2 * i + 1][0]
-    points[2 * i + 1][1] += 8 * xy[2 * i + 1][1]
-    points[2 * i + 1][2] = Z + body_height
+    Resubmitting the command that is already running (e.g. a repeated key press)
+    is absorbed without interrupting the cycle.
+    """
+    if not control.command_pending():
+        return False
+    return control.acknowledge_command() != list(data)
 
 
-def _apply_tripod_phase_2(points, xy, i, z):
-    """Apply tripod gait phase 2 movements."""
-    points[2 * i][0] -= 4 * xy[2 * i][0]
-    points[2 * i][1] -= 4 * xy[2 * i][1]
-    points[2 * i + 1][2] -= z * 8
+def _step_to(control, points, targets, Z, scheduler):
+    """
+    Step the legs from points to targets, one tripod at a time.
 
+    The tripod with the highest foot goes first, continuing from its current height,
+    so a stop or direction change takes effect on the next frame instead of at the
+    end of the cycle. Feet rise by up to Z above the ground on the way and finish
+    at the target height, which may itself be a lifted foot.
+    """
+    ground = [control.body_points[k][2] for k in range(6)]
+    lifted = [points[k][2] - ground[k] for k in range(6)]
+    groups = sorted(TRIPOD_GROUPS, key=lambda group: -max(lifted[k] for k in group))
+    frames = max(2, scheduler.frames_for(SETTLE_PERIOD_MS))
+
+    for group in groups:
+        start = [list(points[k]) for k in range(6)]
+        if all(math.dist(start[k], targets[k]) < 0.5 for k in group):
+            continue
+        for j in range(1, frames + 1):
+            t = j / frames
+            for k in group:
+                points[k][0] = start[k][0] + (targets[k][0] - start[k][0]) * t
+                points[k][1] = start[k][1] + (targets[k][1] - start[k][1]) * t
+                # Blend from the current to the target height, rising by at most Z in between
+                blended = start[k][2] + (targets[k][2] - start[k][2]) * t
+                points[k][2] = max(blended, ground[k] + Z * math.sin(math.pi * t))
+            transform_coordinates(points, control.leg_positions)
+            control.set_leg_angles()
+            scheduler.wait()
 
-def _apply_tripod_phase_3(points, xy, i, z):
-    """Apply tripod gait phase 3 movements."""
-    points[2 * i][2] += z * 8
-    points[2 * i + 1][0] -= 4 * xy[2 * i + 1][0]
-    points[2 * i + 1][1] -= 4 * xy[2 * i + 1][1]
 
+def _settle_to_neutral(control, points, Z, scheduler):
+    """Step every leg back to its neutral body point, one tripod at a time."""
+    _step_to(control, points, control.body_points, Z, scheduler)
+    control.gait_pose = None
 
-def _apply_tripod_phase_4(points, xy, i):
-    """Apply tripod gait phase 4 movements."""
-    points[2 * i][0] += 8 * xy[2 * i][0]
-    points[2 * i][1] += 8 * xy[2 * i][1]
-    points[2 * i + 1][0] -= 4 * xy[2 * i + 1][0]
-    points[2 * i + 1][1] -= 4 * xy[2 * i + 1][1]
 
+def _execute_neutral_position(control, points):
+    """Execute neutral position (no movement)."""
+    transform_coordinates(points, control.leg_positions)
+    control.set_leg_angles()
+
+
+def _foot_offsets(pattern, steps, F, Z):
+    """
+    Foot offsets from neutral for every frame of one cycle, as an (F, 6, 3) array.
 
-def _apply_tripod_phase_5(points, xy, i, z):
-    """Apply tripod gait phase 5 movements."""
-    points[2 * i][2] -= z * 8
-    points[2 * i + 1][0] -= 4 * xy[2 * i + 1][0]
-    points[2 * i + 1][1] -= 4 * xy[2 * i + 1][1]
+    steps holds each leg's (6, 2) per-cycle step. Frame j shows the cycle at time
+    (j + 1) / F, so the last frame is back at t = 0, where the next cycle starts.
+    """
+    t = np.arange(1, F + 1) / F
+    swing_fraction = 1 - pattern.duty
+    # Time since each leg's swing began, as a fraction of the cycle
+    phase = (t[:, None] - pattern.swing_start[None, :]) % 1.0
+    swinging = phase < swing_fraction
+    stroke = STROKE_STEPS * np.asarray(steps, dtype=float)
 
+    # Position along the stroke: -0.5 (rearmost) to +0.5 (foremost). Stance sweeps it back
+    # linearly; swing brings it forward with zero speed at lift-off and touchdown
+    swing_progress = np.where(swinging, phase / swing_fraction, 0.0)
+    along = np.where(swinging,
+                     -0.5 + 0.5 * (1 - np.cos(np.pi * swing_progress)),
+                     0.5 - (phase - swing_fraction) / pattern.duty)
 
-def _apply_tripod_phase_6(points, xy, i, z):
-    """Apply tripod gait phase 6 movements."""
-    points[2 * i][0] -= 4 * xy[2 * i][0]
-    points[2 * i][1] -= 4 * xy[2 * i][1]
-    points[2 * i + 1][2] += z * 8
+    offsets = np.zeros((F, 6, 3))
+    offsets[:, :, :2] = along[:, :, None] * stroke[None, :, :]
+    offsets[:, :, 2] = np.where(swinging, Z * np.sin(np.pi * swing_progress), 0.0)
+    return offsets
 
 
-def _apply_tripod_phase_7(points, xy, i):
-    """Apply tripod gait phase 7 movements."""
-    points[2 * i][0] -= 4 * xy[2 * i][0]
-    points[2 * i][1] -= 4 * xy[2 * i][1]
-    points[2 * i + 1][0] += 8 * xy[2 * i + 1][0]
-    points[2 * i + 1][1] += 8 * xy[2 * i + 1][1]
+# Bump whenever a change to the gait code alters compiled cycles, so stored ones are not reused
+GAIT_ENGINE_VERSION = 3
 
 
-def _execute_wave_gait(control, points, xy, z, F, delay):
-    """Execute wave gait pattern (gait type 2)."""
-    leg_sequence = [5, 2, 1, 0, 3, 4]  # Order in which legs move
-    
-    for i in range(6):
-        for j in range(int(F / 6)):
-            for k in range(6):
-                if leg_sequence[i] == k:
-                    _apply_wave_leg_movement(points, xy, k, j, z, F)
-                else:
-                    _apply_wave_body_movement(points, xy, k)
-            
-            transform_coordinates(points, control.leg_positions)
-            control.set_leg_angles()
-            time.sleep(delay)
+def cycle_fingerprint(control):
+    """Hash of what compiled counts depend on besides the cycle key: calibration, geometry, workspace, engine version."""
+    ik_table_step = control.ik_table.step if control.ik_table is not None else None
+    source = repr((GAIT_ENGINE_VERSION, LINK_LENGTHS, ik_table_step, control.workspace.signature(),
+                   control.calibration_leg_positions))
+    return hashlib.sha1(source.encode()).hexdigest()[:12]
 
 
-def _apply_wave_leg_movement(points, xy, k, j, z, F):
-    """Apply movement for the active leg in wave gait."""
-    if j < int(F / 18):
-        # Lift leg
-        points[k][2] += 18 * z
-    elif j < int(F / 9):
-        # Move leg forward
-        points[k][0] += 30 * xy[k][0]
-        points[k][1] += 30 * xy[k][1]
-    elif j < int(F / 6):
-        # Lower leg
-        points[k][2] -= 18 * z
+def _cycle_key(control, gait, x, y, angle, F, Z):
+    """Cache key covering everything a compiled cycle depends on, apart from calibration."""
+    return (gait, x, y, angle, F, Z, control.body_height, tuple(tuple(point) for point in control.body_points))
 
 
-def _apply_wave_body_movement(points, xy, k):
-    """Apply movement for non-active legs in wave gait (body movement)."""
-    points[k][0] -= 2 * xy[k][0]
-    points[k][1] -= 2 * xy[k][1]
+def _compile_cycle(control, gait, x, y, angle, F, Z):
+    """Evaluate one gait cycle from its phase table, clamp it to the workspace and solve the IK in one batch."""
+    neutral = np.array(control.body_points, dtype=float)
+    steps = _calculate_movement_deltas(control.body_points, x, y, angle, 1)
+    points = neutral[None, :, :] + _foot_offsets(GAITS[gait], steps, F, Z)
 
+    positions = transform_coordinates(points, np.empty_like(points))
+    positions, clamped, valid = control.workspace.project(positions, out=positions)
+    return GaitCycle(points, positions, control.compute_leg_counts(positions), valid, clamped)
 
-def run_gait(control, data, Z=40, F=64):
+
+def compile_move(control, data, Z=40):
+    """
+    Return the compiled cycle for a CMD_MOVE command, compiling and caching it on a miss.
+
+    Returns None for a neutral (stop) command, which has no cycle.
+    """
+    gait, x, y, angle = _parse_gait_parameters(data)
+    if x == 0 and y == 0 and angle == 0 or gait not in GAITS:
+        return None
+    F = _calculate_frame_count(gait, _calculate_cycle_period_ms(gait, data[4]), control.frame_scheduler)
+    key = _cycle_key(control, gait, x, y, angle, F, Z)
+    cycle = control.gait_cache.get(key)
+    if cycle is None:
+        started = time.perf_counter()
+        cycle = _compile_cycle(control, gait, x, y, angle, F, Z)
+        control.gait_cache.put(key, cycle)
+        logger.debug("Compiled gait cycle %s in %.1f ms (%d frames)", key[:6], (time.perf_counter() - started) * 1000, F)
+    return cycle
+
+
+def _current_points(control):
+    """Body-frame foot points the legs are at: the last gait frame played, or neutral after anything else."""
+    if control.gait_pose is not None:
+        points, leg_positions = control.gait_pose
+        if np.allclose(control.leg_positions, leg_positions, atol=0.01):
+            return points.tolist()
+    return copy.deepcopy(control.body_points)
+
+
+def _play_cycle(control, data, cycle, Z, scheduler):
+    """
+    Play a compiled cycle frame by frame; returns True if preempted by a new command.
+
+    A cycle ends where the next one starts, so repeated cycles run back to back.
+    Coming from anywhere else, the legs first step to the cycle's start pose.
+    """
+    points = _current_points(control)
+    _step_to(control, points, cycle.points[-1], Z, scheduler)
+    for j in range(len(cycle)):
+        if _gait_preempted(control, data):
+            _settle_to_neutral(control, points, Z, scheduler)
+            return True
+        control.play_leg_frame(cycle.leg_positions[j], cycle.counts[j], cycle.valid[j], cycle.clamped[j])
+        control.gait_pose = (cycle.points[j], cycle.leg_positions[j])
+        points = cycle.points[j].tolist()
+        scheduler.wait()
+    return False
+
+
+def run_gait(control, data, Z=40):
     """
     Execute a gait movement for the robot.
 
@@ -180,31 +266,55 @@ def run_gait(control, data, Z=40, F=64):
         control: The parent Control object (to access state/methods).
         data: Movement command data array.
         Z: Step height.
-        F: Step frames.
+
+    Returns:
+        True if a new command interrupted the cycle and the legs were settled to neutral.
     """
     try:
         # Parse and validate parameters
         gait, x, y, angle = _parse_gait_parameters(data)
-        F = _calculate_frame_count(gait, data[4])
-        
-        logger.info("run_gait called with gait=%s, x=%d, y=%d, Z=%d, F=%d, angle=%s", 
-                   gait, x, y, Z, F, data[5])
+        if gait not in GAITS:
+            logger.warning("run_gait: unknown gait %s (known: %s)", gait, ", ".join(GAITS))
+            return False
+        scheduler = control.frame_scheduler
+        period_ms = _calculate_cycle_period_ms(gait, data[4])
+        F = _calculate_frame_count(gait, period_ms, scheduler)
         
-        # Setup movement calculations
-        z = Z / F
-        delay = 0.01
-        points = copy.deepcopy(control.body_points)
-        xy = _calculate_movement_deltas(points, x, y, angle, F)
+        logger.info("run_gait called with gait=%s (%s), x=%d, y=%d, Z=%d, period=%.0f ms, F=%d, angle=%s", 
+                   gait, GAITS[gait].name, x, y, Z, period_ms, F, data[5])
         
+        # Each cycle is compiled once per parameter set and replayed without IK
+        cycle = compile_move(control, data, Z)
+
+        stats_before = control.servo.get_write_stats()
+        workspace_before = control.workspace.get_stats()
+        overruns_before = scheduler.overruns
+        scheduler.resume()
+
         # Execute appropriate gait pattern
+        preempted = False
         if x == 0 and y == 0 and angle == 0:
-            _execute_neutral_position(control, points)
-        elif gait == "1":
-            _execute_tripod_gait(control, points, xy, Z, F, z, delay)
-        elif gait == "2":
-            _execute_wave_gait(control, points, xy, z, F, delay)
+            # Step down from wherever the last cycle left the feet before holding neutral
+            _settle_to_neutral(control, _current_points(control), Z, scheduler)
+            _execute_neutral_position(control, copy.deepcopy(control.body_points))
+        elif cycle is not None:
+            preempted = _play_cycle(control, data, cycle, Z, scheduler)
         
-        logger.info("run_gait completed successfully.")
+        stats = control.servo.get_write_stats()
+        written = stats['written'] - stats_before['written']
+        skipped = stats['skipped'] - stats_before['skipped']
+        logger.info("run_gait completed successfully: %d channels written, %d skipped (%.0f%% saved), %d transactions",
+                   written, skipped, 100 * skipped / max(written + skipped, 1),
+                   stats['transactions'] - stats_before['transactions'])
+        workspace = control.workspace.get_stats()
+        if workspace['clamped'] > workspace_before['clamped'] or workspace['rejected'] > workspace_before['rejected']:
+            logger.info("run_gait: %d frames clamped to the leg workspace, %d rejected",
+                        workspace['clamped'] - workspace_before['clamped'],
+                        workspace['rejected'] - workspace_before['rejected'])
+        if scheduler.overruns > overruns_before:
+            logger.info("run_gait: %d of %d frames overran their deadline (worst %.2f ms late)",
+                        scheduler.overruns - overruns_before, F, scheduler.max_lateness * 1000)
+        return preempted
     except Exception as e:
         logger.error("Exception in run_gait: %s", e)
         raise
@@ -0,0 +1,183 @@
+# robot_gait_cache.py
+
+import os
+import glob
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger("robot.gait_cache")
+
+
+class GaitCycle:
+    """
+    One gait cycle compiled to per-frame arrays.
+
+    points holds the body-frame foot points, leg_positions the leg-frame targets
+    and counts the calibrated PWM counts, each F x 6 x 3. valid marks the frames
+    whose leg positions are within reach, after any workspace clamping; the
+    others are skipped. clamped marks the frames that were clamped.
+    """
+
+    def __init__(self, points, leg_positions, counts, valid, clamped=None):
+        self.points = points
+        self.leg_positions = leg_positions
+        self.counts = counts
+        self.valid = valid
+        self.clamped = np.zeros_like(valid) if clamped is None else clamped
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def nbytes(self):
+        return (self.points.nbytes + self.leg_positions.nbytes + self.counts.nbytes
+                + self.valid.nbytes + self.clamped.nbytes)
+
+
+class GaitCycleStore:
+    """
+    On-disk store of compiled gait cycles: one .npz file per cycle key.
+
+    File names carry a fingerprint of everything the counts depend on besides the
+    key (calibration, link geometry, gait engine version), so a change to any of
+    them simply selects different files.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.load_time = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, fingerprint):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"gait_{fingerprint}_{digest}.npz")
+
+    def load(self, key, fingerprint):
+        """Return the stored cycle for key, or None if there is no usable file."""
+        path = self._path(key, fingerprint)
+        if not os.path.exists(path):
+            return None
+        started = time.perf_counter()
+        try:
+            with np.load(path) as data:
+                if str(data['key']) != repr(key):
+                    logger.warning("Gait cache file %s holds a different key, ignoring it", path)
+                    return None
+                cycle = GaitCycle(data['points'], data['leg_positions'], data['counts'], data['valid'],
+                                  data['clamped'])
+        except Exception as e:
+            logger.warning("Failed to load gait cache file %s: %s", path, e)
+            return None
+        elapsed = time.perf_counter() - started
+        self.load_time += elapsed
+        logger.debug("Gait cycle loaded from %s in %.2f ms", path, elapsed * 1000)
+        return cycle
+
+    def save(self, key, fingerprint, cycle):
+        """Write cycle for key; the file is replaced atomically so a crash never leaves half a file."""
+        path = self._path(key, fingerprint)
+        try:
+            with open(path + ".tmp", "wb") as file:
+                np.savez(file, key=repr(key), points=cycle.points, leg_positions=cycle.leg_positions,
+                         counts=cycle.counts, valid=cycle.valid, clamped=cycle.clamped)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logger.warning("Failed to write gait cache file %s: %s", path, e)
+
+    def prune(self, fingerprint):
+        """Delete the files of other fingerprints (old calibrations or engine versions)."""
+        stale = [path for path in glob.glob(os.path.join(self.directory, "gait_*.npz"))
+                 if not os.path.basename(path).startswith(f"gait_{fingerprint}_")]
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("Failed to remove stale gait cache file %s: %s", path, e)
+        if stale:
+            logger.info("Removed %d stale gait cache files from %s", len(stale), self.directory)
+
+
+class GaitCycleCache:
+    """
+    LRU cache of compiled gait cycles, bounded by the total size of their arrays.
+
+    Entries hold calibrated counts, so the owner calls reset() with a new
+    fingerprint whenever the calibration changes. With a store, memory misses
+    fall back to disk and every compiled cycle is also written there.
+    """
+
+    def __init__(self, max_bytes, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.fingerprint = None
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def reset(self, fingerprint):
+        """Drop the cached cycles and key the store on fingerprint from now on."""
+        self.clear()
+        self.fingerprint = fingerprint
+
+    def get(self, key):
+        """Return the cycle stored under key, or None, and mark it most recently used."""
+        cycle = self.entries.get(key)
+        if cycle is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return cycle
+        if self.store is not None:
+            cycle = self.store.load(key, self.fingerprint)
+            if cycle is not None:
+                self.disk_hits += 1
+                self._insert(key, cycle)
+                logger.info("Gait cache disk hit for %s (%d frames)", key[:6], len(cycle))
+                return cycle
+        self.misses += 1
+        logger.info("Gait cache miss for %s", key[:6])
+        return None
+
+    def put(self, key, cycle):
+        """Store cycle under key, in memory and in the store if there is one."""
+        self._insert(key, cycle)
+        if self.store is not None:
+            self.store.save(key, self.fingerprint, cycle)
+
+    def _insert(self, key, cycle):
+        """Add cycle to memory, evicting the least recently used cycles to stay under max_bytes."""
+        if cycle.nbytes > self.max_bytes:
+            logger.warning("Gait cycle of %d bytes exceeds the %d byte cache; not cached", cycle.nbytes, self.max_bytes)
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        while self.entries and self.nbytes + cycle.nbytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+        self.entries[key] = cycle
+        self.nbytes += cycle.nbytes
+
+    def clear(self):
+        """Drop every cached cycle."""
+        self.entries.clear()
+        self.nbytes = 0
+
+    def get_stats(self):
+        """Return entry count, memory use, hits (memory and disk), misses, evictions and disk load time."""
+        return {
+            'entries': len(self.entries),
+            'kbytes': round(self.nbytes / 1024, 1),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'disk_load_ms': round(self.store.load_time * 1000, 2) if self.store is not None else 0.0,
+        }
+
@@ -0,0 +1,144 @@
+# robot_ik_table.py
+
+import os
+import time
+import logging
+import numpy as np
+from robot_kinematics import coordinate_to_angle_batch, LINK_LENGTHS
+
+logger = logging.getLogger("robot.ik_table")
+
+# Valid foot envelope: hip-to-foot distances (mm) that robot_workspace.LegWorkspace clamps onto
+ENVELOPE_MIN_RADIUS = 90
+ENVELOPE_MAX_RADIUS = 248
+
+# Cells whose interpolated centre is further than this from the exact solution
+# (near full leg extension, where acos is steep) are solved analytically instead
+INTERPOLATION_TOLERANCE_DEG = 0.25
+
+
+def _table_filename(l1, l2, l3, step):
+    """Table file name; it encodes the link lengths so a geometry change selects a new table."""
+    return f"ik_table_{l1:g}_{l2:g}_{l3:g}_{step:g}mm.npy"
+
+
+def _grid_axes(step, radius=ENVELOPE_MAX_RADIUS):
+    """
+    Grid axes covering the foot envelope in IK input coordinates.
+
+    y (outward from the hip) only spans the front half-space: behind the hip the
+    coxa angle wraps around, which linear interpolation cannot follow.
+    """
+    full = np.arange(-radius, radius + step, step, dtype=float)
+    front = np.arange(0, radius + step, step, dtype=float)
+    return full, front, full
+
+
+def build_table(l1=LINK_LENGTHS[0], l2=LINK_LENGTHS[1], l3=LINK_LENGTHS[2], step=4.0):
+    """
+    Tabulate float IK angles on a regular grid covering the foot envelope.
+
+    Returns an (nx, ny, nz, 4) float32 array for the grid points produced by
+    _grid_axes: channels 0-2 hold the angles, channel 3 is 1.0 when the cell
+    starting at that grid point can be interpolated within tolerance.
+    """
+    axes = _grid_axes(step)
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+    logger.info("Building IK table: %s points, step %.1f mm", "x".join(str(len(a)) for a in axes), step)
+    angles = coordinate_to_angle_batch(grid.reshape(-1, 3), l1, l2, l3, quantize=False).reshape(grid.shape)
+
+    # Trilinear interpolation at a cell centre is the mean of its 8 corners
+    interpolated = sum(angles[cx:cx + angles.shape[0] - 1, cy:cy + angles.shape[1] - 1, cz:cz + angles.shape[2] - 1]
+                       for cx in (0, 1) for cy in (0, 1) for cz in (0, 1)) / 8
+    centres = grid[:-1, :-1, :-1] + step / 2
+    exact = coordinate_to_angle_batch(centres.reshape(-1, 3), l1, l2, l3, quantize=False).reshape(centres.shape)
+    accurate = np.abs(interpolated - exact).max(axis=-1) <= INTERPOLATION_TOLERANCE_DEG
+
+    # The centre test can miss a clamp kink inside the cell, so also reject cells whose
+    # hip-to-foot distance (l23) crosses the full-extension or full-fold limit
+    a = np.pi / 2 - np.arctan2(grid[..., 2], grid[..., 1])
+    l23 = np.sqrt((grid[..., 2] - l1 * np.cos(a)) ** 2 + (grid[..., 1] - l1 * np.sin(a)) ** 2 + grid[..., 0] ** 2)
+    corners = np.stack([l23[cx:cx + l23.shape[0] - 1, cy:cy + l23.shape[1] - 1, cz:cz + l23.shape[2] - 1]
+                        for cx in (0, 1) for cy in (0, 1) for cz in (0, 1)])
+    low, high = corners.min(axis=0), corners.max(axis=0)
+    for limit in (l2 + l3, abs(l2 - l3)):
+        accurate &= (high < limit) | (low > limit)
+
+    usable = np.zeros(grid.shape[:3], dtype=np.float32)
+    usable[:-1, :-1, :-1] = accurate
+    logger.info("IK table: %.1f%% of cells interpolate within %.2f deg",
+                100 * usable.mean() * usable.size / centres[..., 0].size, INTERPOLATION_TOLERANCE_DEG)
+    return np.concatenate((angles, usable[..., None]), axis=-1).astype(np.float32)
+
+
+class IKTable:
+    """Memory-mapped IK lookup table with trilinear interpolation."""
+
+    def __init__(self, l1=LINK_LENGTHS[0], l2=LINK_LENGTHS[1], l3=LINK_LENGTHS[2], step=4.0, directory="."):
+        self.l1, self.l2, self.l3 = l1, l2, l3
+        self.step = float(step)
+        axes = _grid_axes(self.step)
+        self.origin = np.array([axis[0] for axis in axes])
+        self.shape = tuple(len(axis) for axis in axes)
+        self.path = os.path.join(directory, _table_filename(l1, l2, l3, step))
+        self.table = self._load_or_build()
+        # Flat view plus the linear offsets of a cell's 8 corners, so lookup is a single gather
+        self.flat = self.table.reshape(-1, 4)
+        strides = np.array([self.shape[1] * self.shape[2], self.shape[2], 1])
+        self.strides = strides
+        self.corners = np.array([[cx, cy, cz] for cx in (0, 1) for cy in (0, 1) for cz in (0, 1)])
+        self.corner_offsets = self.corners @ strides
+
+    def _load_or_build(self):
+        """Memory-map the table file, generating it first if it is missing or malformed."""
+        if os.path.exists(self.path):
+            try:
+                table = np.load(self.path, mmap_mode='r')
+                if table.shape == self.shape + (4,):
+                    logger.info("IK table memory-mapped from %s", self.path)
+                    return table
+                logger.warning("IK table %s has shape %s, regenerating", self.path, table.shape)
+            except Exception as e:
+                logger.warning("Failed to load IK table %s (%s), regenerating", self.path, e)
+
+        start = time.perf_counter()
+        np.save(self.path, build_table(self.l1, self.l2, self.l3, self.step))
+        logger.info("IK table written to %s in %.1f s", self.path, time.perf_counter() - start)
+        return np.load(self.path, mmap_mode='r')
+
+    def lookup(self, points):
+        """
+        Interpolate float servo angles for an (N, 3) array of leg-frame points.
+
+        Points outside the tabulated grid, or in cells flagged as unusable, are
+        solved analytically.
+        """
+        points = np.asarray(points, dtype=float)
+        cell = (points - self.origin) / self.step
+        inside = ((cell >= 0) & (cell <= np.subtract(self.shape, 1))).all(axis=1)
+        index = np.minimum(cell.astype(int), np.subtract(self.shape, 2))
+        base = index @ self.strides
+        inside[inside] = self.flat[base[inside], 3] > 0
+        angles = np.empty(points.shape)
+
+        if inside.any():
+            frac = cell[inside] - index[inside]
+            # Trilinear weight of each corner: product of frac (corner at +1) or 1 - frac (corner at 0)
+            weights = np.where(self.corners[None, :, :], frac[:, None, :], 1 - frac[:, None, :]).prod(axis=2)
+            values = self.flat[base[inside][:, None] + self.corner_offsets, :3]
+            angles[inside] = (weights[:, :, None] * values).sum(axis=1)
+
+        if not inside.all():
+            logger.debug("IK table: %d point(s) not tabulated, solving analytically",
+                         int(np.count_nonzero(~inside)))
+            angles[~inside] = coordinate_to_angle_batch(points[~inside], self.l1, self.l2, self.l3,
+                                                        quantize=False)
+        return angles
+
+
+if __name__ == '__main__':
+    # Offline generation: python robot_ik_table.py [step_mm]
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    ik_table = IKTable(step=float(sys.argv[1]) if len(sys.argv) > 1 else 4.0)
+    logger.info("IK table ready: %s (%s grid)", ik_table.path, ik_table.shape)
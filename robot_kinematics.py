@@ -2,10 +2,14 @@
 
 import math
 import logging
+import numpy as np
 
 logger = logging.getLogger("robot.kinematics")
 
-def coordinate_to_angle(x, y, z, l1=33, l2=90, l3=110):
+# Coxa, femur and tibia lengths (mm): the default l1, l2, l3 of the solvers, the IK table and the workspace
+LINK_LENGTHS = (33, 90, 110)
+
+def coordinate_to_angle(x, y, z, l1=LINK_LENGTHS[0], l2=LINK_LENGTHS[1], l3=LINK_LENGTHS[2]):
     """
     Convert Cartesian coordinates to servo angles for a single robot leg.
     """
@@ -28,7 +32,57 @@ def coordinate_to_angle(x, y, z, l1=33, l2=90, l3=110):
         logger.error("Error in coordinate_to_angle(%.1f, %.1f, %.1f): %s", x, y, z, e)
         return 90, 0, 0  # Return safe default angles
 
-def angle_to_coordinate(a, b, c, l1=33, l2=90, l3=110):
+def leg_to_ik_coordinates(leg_positions):
+    """Map (N, 3) leg-frame positions (x, y, z) to the IK input coordinates (-z, x, y)."""
+    positions = np.asarray(leg_positions, dtype=float)
+    return positions[:, (2, 0, 1)] * (-1, 1, 1)
+
+def coordinate_to_angle_batch(points, l1=LINK_LENGTHS[0], l2=LINK_LENGTHS[1], l3=LINK_LENGTHS[2], quantize=True):
+    """
+    Convert an (N, 3) array of Cartesian coordinates to an (N, 3) array of servo angles.
+
+    Vectorized form of coordinate_to_angle: the w/v/u terms are clamped and rounded the
+    same way, so every row matches the scalar result. Rows that cannot be solved fall
+    back to the same safe default angles (90, 0, 0). With quantize=False the rounding
+    is skipped and float angles are returned.
+    """
+    try:
+        points = np.asarray(points, dtype=float)
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        angles = np.empty(points.shape)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.pi / 2 - np.arctan2(z, y)
+            x_4 = l1 * np.sin(a)
+            x_5 = l1 * np.cos(a)
+            l23 = np.sqrt((z - x_5) ** 2 + (y - x_4) ** 2 + x ** 2)
+            # min/max and rint(v * 100) / 100 are the cheap equivalents of clip and round(v, 2)
+            w = np.minimum(np.maximum(x / l23, -1), 1)
+            v = np.minimum(np.maximum((l2 * l2 + l23 * l23 - l3 * l3) / (2 * l2 * l23), -1), 1)
+            u = np.minimum(np.maximum((l2 ** 2 + l3 ** 2 - l23 ** 2) / (2 * l3 * l2), -1), 1)
+            if quantize:
+                w = np.rint(w * 100) / 100
+                v = np.rint(v * 100) / 100
+                u = np.rint(u * 100) / 100
+            angles[:, 0] = a
+            angles[:, 1] = np.arcsin(w) - np.arccos(v)
+            angles[:, 2] = np.pi - np.arccos(u)
+        np.degrees(angles, out=angles)
+        if quantize:
+            np.rint(angles, out=angles)
+        if not np.isfinite(angles).all():
+            unsolved = ~np.isfinite(angles).all(axis=1)
+            logger.warning("coordinate_to_angle_batch: %d point(s) unsolvable, using safe defaults",
+                           int(np.count_nonzero(unsolved)))
+            angles[unsolved] = (90, 0, 0)
+        if quantize:
+            angles = angles.astype(int)
+        logger.debug("coordinate_to_angle_batch: solved %d points", len(angles))
+        return angles
+    except Exception as e:
+        logger.error("Error in coordinate_to_angle_batch: %s", e)
+        return np.tile(np.array((90, 0, 0)), (len(points), 1))
+
+def angle_to_coordinate(a, b, c, l1=LINK_LENGTHS[0], l2=LINK_LENGTHS[1], l3=LINK_LENGTHS[2]):
     """
     Convert servo angles to Cartesian coordinates for a single robot leg.
     """
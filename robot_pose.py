@@ -6,84 +6,127 @@ import logging
 
 logger = logging.getLogger("robot.pose")
 
+# Foot points (x, y, z) of the neutral stance relative to the body centre, before any pose
+BODY_FOOTPOINTS = ((137.1, 189.4, 0), (225, 0, 0), (137.1, -189.4, 0),
+                   (-137.1, -189.4, 0), (-225, 0, 0), (-137.1, 189.4, 0))
+
+
+def rotation_matrices(roll, pitch, yaw):
+    """
+    Body rotation Rx(pitch) @ Ry(roll) @ Rz(yaw) for angles in degrees.
+
+    Scalars give one 3x3 matrix; arrays of angles give a stack of them (..., 3, 3).
+    """
+    r, p, w = (np.radians(np.asarray(angle, dtype=float)) for angle in (roll, pitch, yaw))
+    cr, sr, cp, sp, cw, sw = np.cos(r), np.sin(r), np.cos(p), np.sin(p), np.cos(w), np.sin(w)
+    rows = ((cr * cw, -cr * sw, -sr),
+            (cp * sw - sp * sr * cw, cp * cw + sp * sr * sw, -sp * cr),
+            (sp * sw + cp * sr * cw, sp * cw - cp * sr * sw, cp * cr))
+    return np.stack([np.stack(np.broadcast_arrays(*row), axis=-1) for row in rows], axis=-2)
+
+
+class BodyPoseSolver:
+    """
+    Foot points in body coordinates for a 6-DOF body pose (x, y, z, roll, pitch, yaw).
+
+    x and y shift the body over the feet (mm), z is the body height (the foot
+    z, as body_height), and the angles tilt the body in degrees. The rotation
+    matrix is only rebuilt when the angles change, and solve() writes into a
+    preallocated array. solve_batch() evaluates a whole sequence of poses at
+    once.
+    """
+
+    def __init__(self, footpoints=BODY_FOOTPOINTS):
+        self.footpoints = np.array(footpoints, dtype=float)
+        self.angles = (0.0, 0.0, 0.0)
+        self.rotation = np.eye(3)
+        self.points = np.empty_like(self.footpoints)
+
+    def _set_rotation(self, roll, pitch, yaw):
+        """Refill the cached rotation matrix in place; scalar math beats NumPy for one 3x3."""
+        r, p, w = math.radians(roll), math.radians(pitch), math.radians(yaw)
+        cr, sr, cp, sp, cw, sw = math.cos(r), math.sin(r), math.cos(p), math.sin(p), math.cos(w), math.sin(w)
+        self.rotation[:] = ((cr * cw, -cr * sw, -sr),
+                            (cp * sw - sp * sr * cw, cp * cw + sp * sr * sw, -sp * cr),
+                            (sp * sw + cp * sr * cw, sp * cw - cp * sr * sw, cp * cr))
+
+    def solve(self, x, y, z, roll, pitch, yaw, out=None):
+        """
+        Return the six foot points (6 x 3) for one pose.
+
+        Without out, the result is the solver's own buffer and is overwritten by
+        the next call.
+        """
+        angles = (roll, pitch, yaw)
+        if angles != self.angles:
+            self._set_rotation(roll, pitch, yaw)
+            self.angles = angles
+        points = self.points if out is None else out
+        np.matmul(self.footpoints, self.rotation.T, out=points)
+        points[:, 0] -= x
+        points[:, 1] -= y
+        points[:, 2] += z
+        return points
+
+    def solve_batch(self, poses):
+        """Return the foot points (N x 6 x 3) for N poses given as rows of (x, y, z, roll, pitch, yaw)."""
+        poses = np.asarray(poses, dtype=float).reshape(-1, 6)
+        rotations = rotation_matrices(poses[:, 3], poses[:, 4], poses[:, 5])
+        points = np.matmul(self.footpoints, rotations.swapaxes(-1, -2))
+        points -= np.stack((poses[:, 0], poses[:, 1], -poses[:, 2]), axis=-1)[:, None, :]
+        return points
+
+
+_pose_solver = BodyPoseSolver()
+
+
 def calculate_posture_balance(roll, pitch, yaw, body_height):
     """
     Calculate new foot positions based on body roll, pitch, yaw and height.
     """
     try:
-        position = np.array([[0.0], [0.0], [body_height]])
-        rpy = np.array([roll, pitch, yaw]) * math.pi / 180
-        roll_angle, pitch_angle, yaw_angle = rpy[0], rpy[1], rpy[2]
-        
-        logger.debug("Posture balance calculation - roll: %.2f°, pitch: %.2f°, yaw: %.2f°, height: %.1f", 
-                    roll, pitch, yaw, body_height)
-        
-        rotation_x = np.array([[1, 0, 0],
-                              [0, math.cos(pitch_angle), -math.sin(pitch_angle)],
-                              [0, math.sin(pitch_angle), math.cos(pitch_angle)]])
-        rotation_y = np.array([[math.cos(roll_angle), 0, -math.sin(roll_angle)],
-                              [0, 1, 0],
-                              [math.sin(roll_angle), 0, math.cos(roll_angle)]])
-        rotation_z = np.array([[math.cos(yaw_angle), -math.sin(yaw_angle), 0],
-                              [math.sin(yaw_angle), math.cos(yaw_angle), 0],
-                              [0, 0, 1]])
-        rotation_matrix = rotation_x @ rotation_y @ rotation_z
-        footpoint_structure = np.array([[137.1, 189.4, 0],
-                                       [225, 0, 0],
-                                       [137.1, -189.4, 0],
-                                       [-137.1, -189.4, 0],
-                                       [-225, 0, 0],
-                                       [-137.1, 189.4, 0]]).T
-        ab = np.zeros((3, 6))
-        foot_positions = [[0, 0, 0] for _ in range(6)]
-        for i in range(6):
-            ab[:, i] = (position + rotation_matrix @ footpoint_structure[:, i:i+1]).flatten()
-            foot_positions[i][0] = ab[0, i]
-            foot_positions[i][1] = ab[1, i]
-            foot_positions[i][2] = ab[2, i]
-        
-        logger.debug("Posture balance calculated for %d legs", len(foot_positions))
-        return foot_positions
+        return _pose_solver.solve(0, 0, body_height, roll, pitch, yaw).tolist()
     except Exception as e:
         logger.error("Error in calculate_posture_balance(%.2f, %.2f, %.2f, %.1f): %s", 
                     roll, pitch, yaw, body_height, e)
         # Return safe default positions
         return [[0, 0, body_height] for _ in range(6)]
 
+# Hip mounting angle (deg) and hip distance from the body centre (mm) of each leg
+HIP_ANGLES_DEG = (54, 0, -54, -126, 180, 126)
+HIP_DISTANCES = (94, 85, 94, 94, 85, 94)
+# Foot z in the hip frame is the body-frame z less the hip height
+HIP_HEIGHT = 14
+
+# Body frame -> hip frame: rotate x, y by the mounting angle, then shift by the hip distance
+_cos = np.cos(np.array(HIP_ANGLES_DEG) / 180 * np.pi)
+_sin = np.sin(np.array(HIP_ANGLES_DEG) / 180 * np.pi)
+HIP_ROTATIONS = np.stack((np.stack((_cos, _sin), axis=-1), np.stack((-_sin, _cos), axis=-1)), axis=-2)
+HIP_OFFSETS = np.column_stack((-np.array(HIP_DISTANCES, dtype=float), np.zeros(6)))
+# The same constants as plain floats for nested-list callers
+_HIP_TABLE = tuple(zip(_cos.tolist(), _sin.tolist(), HIP_DISTANCES))
+
+
 def transform_coordinates(points, leg_positions):
     """
-    Transform 'points' and update the passed-in leg_positions.
-    Operates in-place, returns the updated list for convenience.
+    Transform body-frame foot 'points' into each leg's hip frame, writing into leg_positions.
+
+    A NumPy leg_positions array, (6, 3) or a stack of frames (..., 6, 3), is
+    filled in place by one product with the 6x2x2 rotation table. Nested lists
+    are filled row by row from the same constants. Returns leg_positions for
+    convenience.
     """
     try:
-        logger.debug("Transforming coordinates for %d legs", len(points))
-        
-        # Leg 1
-        leg_positions[0][0] = points[0][0] * math.cos(54 / 180 * math.pi) + points[0][1] * math.sin(54 / 180 * math.pi) - 94
-        leg_positions[0][1] = -points[0][0] * math.sin(54 / 180 * math.pi) + points[0][1] * math.cos(54 / 180 * math.pi)
-        leg_positions[0][2] = points[0][2] - 14
-        # Leg 2
-        leg_positions[1][0] = points[1][0] * math.cos(0 / 180 * math.pi) + points[1][1] * math.sin(0 / 180 * math.pi) - 85
-        leg_positions[1][1] = -points[1][0] * math.sin(0 / 180 * math.pi) + points[1][1] * math.cos(0 / 180 * math.pi)
-        leg_positions[1][2] = points[1][2] - 14
-        # Leg 3
-        leg_positions[2][0] = points[2][0] * math.cos(-54 / 180 * math.pi) + points[2][1] * math.sin(-54 / 180 * math.pi) - 94
-        leg_positions[2][1] = -points[2][0] * math.sin(-54 / 180 * math.pi) + points[2][1] * math.cos(-54 / 180 * math.pi)
-        leg_positions[2][2] = points[2][2] - 14
-        # Leg 4
-        leg_positions[3][0] = points[3][0] * math.cos(-126 / 180 * math.pi) + points[3][1] * math.sin(-126 / 180 * math.pi) - 94
-        leg_positions[3][1] = -points[3][0] * math.sin(-126 / 180 * math.pi) + points[3][1] * math.cos(-126 / 180 * math.pi)
-        leg_positions[3][2] = points[3][2] - 14
-        # Leg 5
-        leg_positions[4][0] = points[4][0] * math.cos(180 / 180 * math.pi) + points[4][1] * math.sin(180 / 180 * math.pi) - 85
-        leg_positions[4][1] = -points[4][0] * math.sin(180 / 180 * math.pi) + points[4][1] * math.cos(180 / 180 * math.pi)
-        leg_positions[4][2] = points[4][2] - 14
-        # Leg 6
-        leg_positions[5][0] = points[5][0] * math.cos(126 / 180 * math.pi) + points[5][1] * math.sin(126 / 180 * math.pi) - 94
-        leg_positions[5][1] = -points[5][0] * math.sin(126 / 180 * math.pi) + points[5][1] * math.cos(126 / 180 * math.pi)
-        leg_positions[5][2] = points[5][2] - 14
-        
-        logger.debug("Coordinate transformation completed")
+        if isinstance(leg_positions, np.ndarray):
+            points = np.asarray(points, dtype=float)
+            np.matmul(HIP_ROTATIONS, points[..., :2, None], out=leg_positions[..., :2, None])
+            leg_positions[..., :2] += HIP_OFFSETS
+            np.subtract(points[..., 2], HIP_HEIGHT, out=leg_positions[..., 2])
+        else:
+            for (cos_a, sin_a, distance), (x, y, z), row in zip(_HIP_TABLE, points, leg_positions):
+                row[0] = x * cos_a + y * sin_a - distance
+                row[1] = -x * sin_a + y * cos_a
+                row[2] = z - HIP_HEIGHT
         return leg_positions
     except Exception as e:
         logger.error("Error in transform_coordinates: %s", e)
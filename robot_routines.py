@@ -2,6 +2,8 @@ import time
 import logging
 from constants_commands import COMMAND as cmd
 from robot_kinematics import map_value
+from robot_gait import move_velocity
+from config import robot_config
 
 logger = logging.getLogger("robot.routines")
 
@@ -57,14 +59,19 @@ def motion_loop(
                         command_sender([cmd.CMD_MOVE, "1", "0", "0", "8", "0"])
                         break
                 # If not using sensor, just walk, no printout
-                command_sender([
-                    cmd.CMD_MOVE,
-                    str(gait),
-                    str(x),
-                    str(y),
-                    str(speed),
-                    "0"
-                ])
+                if robot_config.VELOCITY_ROUTINES and gait == 1:
+                    # Resending the same velocity only retargets the running walk
+                    vx, vy, yaw_rate = move_velocity(gait, x, y, speed, 0)
+                    command_sender([cmd.CMD_VELOCITY, "%.1f" % vx, "%.1f" % vy, "%.1f" % yaw_rate])
+                else:
+                    command_sender([
+                        cmd.CMD_MOVE,
+                        str(gait),
+                        str(x),
+                        str(y),
+                        str(speed),
+                        "0"
+                    ])
 
                 # Check flag more frequently for responsiveness
                 for _ in range(6):  # ~0.6 seconds total
@@ -170,7 +177,13 @@ def sys_exit_calibration(_send, control_system, robot_state):
 
 # === High-level wrappers for routines ===
 
+# CMD_MOVE commands the motion routines repeat, precompiled by the control system at boot
+MOTION_ROUTINE_MOVES = []
+
 def make_motion_routine(gait, x, y, speed, head_angle, use_sensor_default=True):
+    if not (robot_config.VELOCITY_ROUTINES and gait == 1):
+        MOTION_ROUTINE_MOVES.append([cmd.CMD_MOVE, str(gait), str(x), str(y), str(speed), "0"])
+
     def routine(command_sender, ultrasonic_sensor, motion_mode_flag, robot_state=None, use_sensor=None):
         motion_loop(
             command_sender,
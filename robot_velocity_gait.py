@@ -0,0 +1,180 @@
+# robot_velocity_gait.py
+
+import math
+import logging
+import numpy as np
+from robot_pose import transform_coordinates
+
+logger = logging.getLogger("robot.velocity_gait")
+
+# Tripod phase offsets: legs 1, 3, 5 swing while legs 2, 4, 6 stand, and vice versa
+LEG_PHASE = np.array([0.0, 0.5, 0.0, 0.5, 0.0, 0.5])
+
+# Fraction of the cycle each foot spends on the ground
+DUTY_FACTOR = 0.5
+
+# Acceleration limits applied to velocity changes, so a new target never jerks the feet
+LINEAR_ACCEL_MM_S2 = 600.0
+YAW_ACCEL_DEG_S2 = 360.0
+
+# Foot offsets below this (mm) count as back at neutral
+SETTLED_MM = 0.5
+
+
+class VelocityGait:
+    """
+    Tripod walking driven by a body velocity (twist) instead of discrete move cycles.
+
+    A phase oscillator runs continuously while the robot walks. Each frame, stance
+    feet are pushed back by the body's motion over that frame and swing feet are
+    steered towards their touchdown point for the current velocity, so a change of
+    velocity bends the trajectories already in flight rather than waiting for a
+    cycle boundary. With zero velocity the swing feet walk back to neutral and the
+    oscillator stops once every foot is down.
+    """
+
+    def __init__(self, cycle_ms=500, max_stride_mm=60, step_height=40):
+        self.cycle = cycle_ms / 1000
+        self.max_stride = max_stride_mm
+        self.step_height = step_height
+        self.phase = 0.0
+        self.target = np.zeros(3)    # vx, vy (mm/s), yaw rate (rad/s)
+        self.velocity = np.zeros(3)
+        self.offsets = np.zeros((6, 2))
+        self.lift = np.zeros(6)
+
+    def set_target(self, vx, vy, yaw_rate):
+        """
+        Set the body velocity to walk at: vx, vy in mm/s and yaw_rate in deg/s.
+
+        Raises ValueError for values that are not finite numbers; the current
+        target is kept.
+        """
+        target = np.array([vx, vy, math.radians(float(yaw_rate))], dtype=float)
+        if not np.isfinite(target).all():
+            raise ValueError("velocity target must be finite: %s, %s, %s" % (vx, vy, yaw_rate))
+        self.target = target
+
+    def _at_rest(self):
+        """True when the body is not moving and every foot is down at its neutral point."""
+        return not self.velocity.any() and not self.lift.any() and np.abs(self.offsets).max() < SETTLED_MM
+
+    def is_settled(self):
+        """True when the target is zero and the robot has come to rest."""
+        return not self.target.any() and self._at_rest()
+
+    @staticmethod
+    def _foot_velocities(twist, neutral):
+        """Per-leg ground velocity (mm/s) of the body over each foot for a twist."""
+        vx, vy, yaw = twist
+        return np.column_stack((vx + yaw * neutral[:, 1], vy - yaw * neutral[:, 0]))
+
+    def _limit(self, twist, neutral):
+        """Scale a twist down so no foot needs a stance stroke longer than max_stride."""
+        u = self._foot_velocities(twist, neutral)
+        reach = np.hypot(u[:, 0], u[:, 1]).max() * self.cycle * DUTY_FACTOR
+        if reach > self.max_stride:
+            # Scale the whole twist so the walking curve keeps its shape
+            return twist * (self.max_stride / reach)
+        return twist
+
+    def _accelerate(self, dt):
+        """Move the current velocity towards the target within the acceleration limits."""
+        limit = np.array([LINEAR_ACCEL_MM_S2, LINEAR_ACCEL_MM_S2, math.radians(YAW_ACCEL_DEG_S2)]) * dt
+        self.velocity += np.clip(self.target - self.velocity, -limit, limit)
+
+    def step(self, body_points, dt):
+        """Advance the oscillator by dt seconds and return the six foot points in body coordinates."""
+        neutral = np.asarray(body_points, dtype=float)
+        if self._at_rest():
+            if not self.target.any():
+                self.offsets[:] = 0
+                return neutral
+            # Starting off: begin a fresh cycle so one tripod lifts straight from the ground
+            self.phase = 0.0
+
+        # Only walk as fast as the stride allows, so a stop never has to ramp down more than that
+        self.target = self._limit(self.target, neutral)
+        self._accelerate(dt)
+        self.velocity = self._limit(self.velocity, neutral)
+        u = self._foot_velocities(self.velocity, neutral)
+        self.phase = (self.phase + dt / self.cycle) % 1.0
+        leg_phase = (self.phase + LEG_PHASE) % 1.0
+        stance = leg_phase < DUTY_FACTOR
+        swing = ~stance
+
+        # Stance feet stay put on the ground, so they move backwards under the body
+        self.offsets[stance] -= u[stance] * dt
+
+        # Swing feet head for the touchdown point that centres the next stance on neutral
+        swing_progress = (leg_phase[swing] - DUTY_FACTOR) / (1 - DUTY_FACTOR)
+        time_left = (1 - leg_phase[swing]) * self.cycle
+        touchdown = u[swing] * self.cycle * DUTY_FACTOR / 2
+        blend = np.minimum(1.0, dt / np.maximum(time_left, 1e-6))[:, None]
+        self.offsets[swing] += (touchdown - self.offsets[swing]) * blend
+
+        lift = self.step_height * np.sin(math.pi * swing_progress)
+        if not self.target.any() and not self.velocity.any() and np.abs(self.offsets).max() < SETTLED_MM:
+            # Stopping with every foot home: only let the swinging feet come down
+            lift = np.minimum(lift, self.lift[swing])
+        self.lift[:] = 0
+        self.lift[swing] = np.where(lift < SETTLED_MM, 0.0, lift)
+
+        points = neutral.copy()
+        points[:, :2] += self.offsets
+        points[:, 2] += self.lift
+        return points
+
+
+def run_velocity_gait(control, data):
+    """
+    Walk at the velocity in a CMD_VELOCITY command until stopped or preempted.
+
+    A newer CMD_VELOCITY only retargets the oscillator, so the walk carries on
+    without a boundary. Any other command brings the robot to a stop on its
+    own steps and is then left in the queue for the control loop.
+
+    Returns:
+        True if a different command was pending when the robot came to rest.
+    """
+    try:
+        walker = control.velocity_gait
+        scheduler = control.frame_scheduler
+        walker.set_target(*(float(value) for value in data[1:4]))
+        logger.info("run_velocity_gait: vx=%s, vy=%s, yaw_rate=%s", data[1], data[2], data[3])
+
+        stats_before = control.servo.get_write_stats()
+        frames_before = scheduler.frames
+        handing_over = False
+        scheduler.resume()
+        while not control.stop_event.is_set():
+            if not handing_over and control.command_pending():
+                # The next frame reacts either way, by retargeting or by starting to stop
+                queue = control.acknowledge_command()
+                if queue[0] == data[0] and len(queue) == 4:
+                    try:
+                        walker.set_target(*(float(value) for value in queue[1:4]))
+                        logger.debug("run_velocity_gait: retargeted to %s", queue[1:4])
+                    except ValueError:
+                        logger.warning("run_velocity_gait: invalid retarget %s, keeping %s",
+                                       queue[1:4], walker.target.round(3).tolist())
+                else:
+                    handing_over = True
+                    walker.set_target(0, 0, 0)
+                    logger.debug("run_velocity_gait: %s pending, stopping", queue[0])
+
+            points = walker.step(control.body_points, scheduler.period)
+            transform_coordinates(points, control.leg_positions)
+            control.set_leg_angles()
+            if walker.is_settled():
+                break
+            scheduler.wait()
+
+        stats = control.servo.get_write_stats()
+        logger.info("run_velocity_gait stopped after %d frames: %d channels written, %d transactions",
+                    scheduler.frames - frames_before, stats['written'] - stats_before['written'],
+                    stats['transactions'] - stats_before['transactions'])
+        return handing_over
+    except Exception as e:
+        logger.error("Exception in run_velocity_gait: %s", e)
+        raise
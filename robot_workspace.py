@@ -0,0 +1,113 @@
+# robot_workspace.py
+
+import logging
+import numpy as np
+from robot_kinematics import LINK_LENGTHS
+from robot_ik_table import ENVELOPE_MIN_RADIUS, ENVELOPE_MAX_RADIUS
+
+logger = logging.getLogger("robot.workspace")
+
+
+class WorkspaceEnvelope:
+    """
+    Reach limits of a leg as a function of the foot's elevation, tabulated once.
+
+    The coxa turns towards the foot, so the reachable distance from the hip only
+    depends on how far the foot is above or below the hip plane: the femur and
+    tibia span at most l2 + l3 and at least |l2 - l3| from the coxa tip. The
+    limits are intersected with the 90-248 mm shell and kept margin_mm inside.
+    """
+
+    def __init__(self, l1=LINK_LENGTHS[0], l2=LINK_LENGTHS[1], l3=LINK_LENGTHS[2], samples=181, margin_mm=1.0):
+        # Table index: |sin(elevation)| = |z| / distance, from 0 (level) to 1 (straight down or up)
+        self.elevation = np.linspace(0.0, 1.0, samples)
+        horizontal = l1 * np.sqrt(1 - self.elevation ** 2)
+        vertical = l1 * self.elevation
+        reach = horizontal + np.sqrt((l2 + l3) ** 2 - vertical ** 2) - margin_mm
+        fold = (l2 - l3) ** 2 - vertical ** 2
+        inner = np.where(fold >= 0, horizontal + np.sqrt(np.maximum(fold, 0)), 0.0) + margin_mm
+        self.max_radius = np.minimum(reach, ENVELOPE_MAX_RADIUS)
+        self.min_radius = np.maximum(inner, ENVELOPE_MIN_RADIUS)
+        logger.debug("Workspace envelope: %.1f-%.1f mm level, %.1f-%.1f mm vertical",
+                     self.min_radius[0], self.max_radius[0], self.min_radius[-1], self.max_radius[-1])
+
+    def limits(self, sin_elevation):
+        """Return the (min, max) hip-to-foot distance for feet at the given |sin(elevation)|."""
+        return (np.interp(sin_elevation, self.elevation, self.min_radius),
+                np.interp(sin_elevation, self.elevation, self.max_radius))
+
+
+class LegWorkspace:
+    """
+    Projection of leg-frame foot positions onto the reachable workspace.
+
+    A foot outside the workspace is moved along its line from the hip to the
+    nearest reachable distance, so the leg keeps pointing the same way. Frames
+    whose correction would exceed max_clamp_mm on any leg are rejected instead,
+    as are all out-of-range frames when clamping is off. The played frames are
+    counted so clamping under aggressive gaits stays visible.
+    """
+
+    def __init__(self, clamp=True, max_clamp_mm=40, envelope=None):
+        self.clamp = clamp
+        self.max_clamp = max_clamp_mm
+        self.envelope = envelope
+        self.frames = 0
+        self.clamped = 0
+        self.rejected = 0
+
+    def signature(self):
+        """Settings that change projected frames, for gait cycle fingerprints."""
+        return (self.clamp, self.max_clamp, self.envelope is not None)
+
+    def _limits(self, positions, radius):
+        if self.envelope is None:
+            return ENVELOPE_MIN_RADIUS, ENVELOPE_MAX_RADIUS
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sin_elevation = np.nan_to_num(np.abs(positions[..., 2]) / radius)
+        return self.envelope.limits(sin_elevation)
+
+    def project(self, leg_positions, out=None):
+        """
+        Project (..., 6, 3) leg positions onto the workspace.
+
+        Returns (positions, clamped, valid) where clamped and valid hold one flag
+        per frame. Rejected frames are returned unchanged. out may be the input
+        array to project it in place.
+        """
+        positions = np.asarray(leg_positions, dtype=float)
+        radius = np.linalg.norm(positions, axis=-1)
+        low, high = self._limits(positions, radius)
+        target = np.clip(radius, low, high)
+        outside = (target != radius).any(axis=-1)
+        if out is None:
+            out = positions.copy()
+        elif out is not positions:
+            out[...] = positions
+        if not self.clamp:
+            return out, np.zeros_like(outside), ~outside
+
+        valid = ((np.abs(target - radius) <= self.max_clamp) & (radius > 0)).all(axis=-1)
+        clamped = outside & valid
+        if clamped.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scale = np.where(clamped[..., None], target / radius, 1.0)
+            out *= scale[..., None]
+        return out, clamped, valid
+
+    def record(self, clamped, valid):
+        """Count one played frame."""
+        self.frames += 1
+        if not valid:
+            self.rejected += 1
+        elif clamped:
+            self.clamped += 1
+
+    def get_stats(self):
+        """Return played, clamped and rejected frame counts."""
+        return {
+            'frames': self.frames,
+            'clamped': self.clamped,
+            'rejected': self.rejected,
+            'clamped_percent': round(100 * self.clamped / max(self.frames, 1), 2),
+        }
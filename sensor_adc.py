@@ -1,4 +1,4 @@
-import smbus  # Import the smbus module for I2C communication
+from hardware_i2c_bus import get_i2c_bus, PRIORITY_ADC  # Shared, prioritised I2C bus
 import time  # Import the time module for sleep functionality
 import logging
 
@@ -9,8 +9,8 @@ class ADC:
         """Initialize the ADC class."""
         self.ADS7830_COMMAND = 0x84                                           # Set the command byte for ADS7830
         self.adc_voltage_coefficient = 3                                      # Set the ADC voltage coefficient based on the PCB version
-        self.i2c_bus = smbus.SMBus(1)                                         # Initialize the I2C bus
         self.I2C_ADDRESS = 0x48                                               # Set the I2C address for the ADC
+        self.i2c_bus = get_i2c_bus().client("ads7830@0x%02X" % self.I2C_ADDRESS, PRIORITY_ADC)  # Lowest priority on the shared bus
         logger.info("ADC initialized with I2C address 0x%02X", self.I2C_ADDRESS)
 
     def scan_i2c_bus(self) -> list:
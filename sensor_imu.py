@@ -1,61 +1,45 @@
 #coding:utf-8
-import math
+import time
+import threading
 import logging
+import numpy as np
 from mpu6050 import mpu6050
+from config import robot_config
+from hardware_i2c_bus import get_i2c_bus, PRIORITY_IMU
+from sensor_imu_bias import ImuBias, BiasEstimator
+from sensor_imu_filter import MahonyFilter, KalmanFilterBank
+from sensor_imu_sampler import ImuSampler, TIME, AX, GZ, TEMP
 
 logger = logging.getLogger("sensor.imu")
 
-class Kalman_filter:
-    def __init__(self, process_noise_covariance, measurement_noise_covariance):
-        self.process_noise_covariance = process_noise_covariance  # Process noise covariance (Q)
-        self.measurement_noise_covariance = measurement_noise_covariance  # Measurement noise covariance (R)
-        self.estimated_error_covariance = 1  # Initial estimate error covariance (P_k_k1)
-        self.kalman_gain = 0  # Kalman gain (Kg)
-        self.posterior_error_covariance = 1  # Posterior estimate error covariance (P_k1_k1)
-        self.posterior_estimate = 0  # Posterior estimate of state (x_k_k1)
-        self.previous_adc_value = 0  # Previous ADC value
-        self.current_measurement = 0  # Current measurement (Z_k)
-        self.previous_kalman_output = 0  # Previous Kalman filter output
-
-    def kalman(self, adc_value):
-        self.current_measurement = adc_value
-        # Handle large changes in ADC value
-        if abs(self.previous_kalman_output - adc_value) >= 60:
-            self.posterior_estimate = adc_value * 0.400 + self.previous_kalman_output * 0.600
-        else:
-            self.posterior_estimate = self.previous_kalman_output
-        # Update estimate error covariance (P_k_k1 = P_k1_k1 + Q)
-        self.estimated_error_covariance = self.posterior_error_covariance + self.process_noise_covariance
-        # Calculate Kalman gain (Kg = P_k_k1 / (P_k_k1 + R))
-        self.kalman_gain = self.estimated_error_covariance / (self.estimated_error_covariance + self.measurement_noise_covariance)
-        # Calculate Kalman filter output (x_k_k1 = x_k1_k1 + Kg * (Z_k - x_k1_k1))
-        kalman_output = self.posterior_estimate + self.kalman_gain * (self.current_measurement - self.previous_kalman_output)
-        # Update posterior estimate error covariance (P_k1_k1 = (1 - Kg) * P_k_k1)
-        self.posterior_error_covariance = (1 - self.kalman_gain) * self.estimated_error_covariance
-        # Update previous Kalman filter output
-        self.previous_kalman_output = kalman_output
-        return kalman_output
-
 class IMU:
+    """
+    MPU6050 attitude estimate fed from the background sampler's ring buffer.
+
+    Every sample goes through the Kalman filters and the Mahony filter as it
+    arrives, on the sampler thread, so roll, pitch and yaw are published at the
+    sensor rate. Readers (balance loop, web, TCP) never touch the bus; without
+    a sampler thread, each call filters one inline sample.
+
+    Offsets are loaded from IMU_BIAS_FILE and refined in the background
+    whenever the robot is still, so start-up does not wait for a calibration.
+    """
+
     def __init__(self):
-        self.proportional_gain = 100 
-        self.integral_gain = 0.002 
-        self.half_time_step = 0.001 
-
-        self.quaternion_w = 1
-        self.quaternion_x = 0
-        self.quaternion_y = 0
-        self.quaternion_z = 0
-
-        self.integral_error_x = 0
-        self.integral_error_y = 0
-        self.integral_error_z = 0
+        self.attitude = MahonyFilter()
+        self.attitude_time = None  # timestamp of the newest sample in the estimate
         self.pitch_angle = 0
         self.roll_angle = 0
         self.yaw_angle = 0
+        self.accel = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+        self.gyro = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+        self.temperature = 0.0
     
         try:
             self.sensor = mpu6050(address=0x68, bus=1) 
+            # Route the library's reads through the shared bus instead of its own SMBus handle
+            self.sensor.bus.close()
+            self.sensor.bus = get_i2c_bus().client("mpu6050@0x68", PRIORITY_IMU)
             self.sensor.set_accel_range(mpu6050.ACCEL_RANGE_2G)   
             self.sensor.set_gyro_range(mpu6050.GYRO_RANGE_250DEG)  
             logger.info("MPU6050 IMU initialized successfully")
@@ -63,99 +47,125 @@ class IMU:
             logger.error("Failed to initialize MPU6050 IMU: %s", e)
             raise
     
-        self.kalman_filter_AX = Kalman_filter(0.001, 0.1)
-        self.kalman_filter_AY = Kalman_filter(0.001, 0.1)
-        self.kalman_filter_AZ = Kalman_filter(0.001, 0.1)
+        # Accel x/y/z and gyro x/y/z, filtered together
+        self.kalman_filters = KalmanFilterBank(0.001, 0.1, axes=6)
 
-        self.kalman_filter_GX = Kalman_filter(0.001, 0.1)
-        self.kalman_filter_GY = Kalman_filter(0.001, 0.1)
-        self.kalman_filter_GZ = Kalman_filter(0.001, 0.1)
-    
-        logger.info("Starting IMU calibration (100 samples)...")
-        self.error_accel_data, self.error_gyro_data = self.calculate_average_sensor_data()
-        logger.info("IMU calibration completed")
-    
-    def calculate_average_sensor_data(self):
-        accel_x_sum = 0
-        accel_y_sum = 0
-        accel_z_sum = 0
-        
-        gyro_x_sum = 0
-        gyro_y_sum = 0
-        gyro_z_sum = 0
-        
-        for i in range(100):
-            try:
-                accel_data = self.sensor.get_accel_data()   
-                gyro_data = self.sensor.get_gyro_data()      
-                
-                accel_x_sum += accel_data['x']
-                accel_y_sum += accel_data['y']
-                accel_z_sum += accel_data['z']
-                
-                gyro_x_sum += gyro_data['x']
-                gyro_y_sum += gyro_data['y']
-                gyro_z_sum += gyro_data['z']
-                
-                if i % 20 == 0:  # Log progress every 20 samples
-                    logger.debug("IMU calibration progress: %d%%", i)
-            except Exception as e:
-                logger.error("Error during IMU calibration sample %d: %s", i, e)
-                continue
-            
-        accel_x_avg = accel_x_sum / 100
-        accel_y_avg = accel_y_sum / 100
-        accel_z_avg = accel_z_sum / 100
-        
-        gyro_x_avg = gyro_x_sum / 100
-        gyro_y_avg = gyro_y_sum / 100
-        gyro_z_avg = gyro_z_sum / 100
-        
-        accel_data = {'x': accel_x_avg, 'y': accel_y_avg, 'z': accel_z_avg}
-        gyro_data = {'x': gyro_x_avg, 'y': gyro_y_avg, 'z': gyro_z_avg}
-        
-        logger.debug("IMU calibration averages - Accel: x=%.3f, y=%.3f, z=%.3f", 
-                    accel_x_avg, accel_y_avg, accel_z_avg)
-        logger.debug("IMU calibration averages - Gyro: x=%.3f, y=%.3f, z=%.3f", 
-                    gyro_x_avg, gyro_y_avg, gyro_z_avg)
-        
-        return accel_data, gyro_data
+        # Samples come from the sampler's ring buffer; cursor marks the last one filtered
+        self.sampler = ImuSampler(self.sensor.bus, 0x68, robot_config.IMU_SAMPLE_RATE_HZ,
+                                  robot_config.IMU_BUFFER_SECONDS, robot_config.IMU_FIFO,
+                                  robot_config.IMU_FIFO_DRAIN_HZ)
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+        bias = ImuBias.load(robot_config.IMU_BIAS_FILE)
+        if bias is None:
+            logger.info("No saved IMU bias, measuring it the first time the robot is still")
+            bias = ImuBias()
+        else:
+            logger.info("IMU bias loaded from %s (measured at %.1f C)", robot_config.IMU_BIAS_FILE, bias.temperature)
+        self.bias_estimator = BiasEstimator(bias, robot_config.IMU_BIAS_WINDOW_S,
+                                            robot_config.IMU_BIAS_MAX_TEMP_DELTA_C)
+        self.bias_checked = False  # gyro bias compared with the die temperature yet
+        self.bias_saved_at = time.monotonic()
+        self.bias_save_lock = threading.Lock()  # one bias file write at a time
+        self.bias_save_thread = None
+        self._apply_bias()
+
+        # Filter on the sampler thread from the first sample
+        self.sampler.on_samples = self._on_samples
+        if robot_config.IMU_SAMPLER:
+            self.sampler.start()
+
+    def _apply_bias(self):
+        """Copy the estimator's bias into the offsets subtracted from each sample."""
+        bias = self.bias_estimator.bias
+        self.error_accel_data = dict(zip('xyz', bias.accel.tolist()))
+        self.error_gyro_data = dict(zip('xyz', bias.gyro.tolist()))
+
+    def _refine_bias(self, samples):
+        """Feed the last bias window to the estimator once per window; save the bias when it changed."""
+        estimator = self.bias_estimator
+        if not self.bias_checked:
+            estimator.check_temperature(samples[-1, TEMP])
+            self.bias_checked = True
+        if not estimator.due(samples[-1, TIME]):
+            return
+        first = not estimator.gyro_trusted
+        if not estimator.update(self.sampler.buffer.window(estimator.window)):
+            return
+        self._apply_bias()
+        now = time.monotonic()
+        if first or now - self.bias_saved_at >= robot_config.IMU_BIAS_SAVE_INTERVAL_S:
+            # Write a snapshot from its own thread: this runs on the sampler thread under self.lock,
+            # and a slow SD card write must not stall sampling or the readers
+            self.bias_save_thread = threading.Thread(target=self._save_bias, args=(estimator.bias.copy(),),
+                                                     name="imu-bias-save", daemon=True)
+            self.bias_save_thread.start()
+            self.bias_saved_at = now
+
+    def _save_bias(self, bias):
+        """Write a bias snapshot to IMU_BIAS_FILE."""
+        with self.bias_save_lock:
+            bias.save(robot_config.IMU_BIAS_FILE)
+
+    def _filter_new_samples(self):
+        """Run the samples that arrived since the last call through the filters; returns how many."""
+        if not self.sampler.running:
+            # No sampler thread: take one sample inline
+            self.sampler.sample_once()
+        samples, self.cursor = self.sampler.buffer.since(self.cursor)
+        if len(samples) == 0:
+            return 0
+        offsets = [self.error_accel_data[axis] for axis in 'xyz'] + [self.error_gyro_data[axis] for axis in 'xyz']
+        filtered = self.kalman_filters.filter(samples[:, AX:GZ + 1], offsets)
+        angles = self.attitude.update(samples[:, TIME], filtered[:, 0:3], np.radians(filtered[:, 3:6]),
+                                      self.sampler.period)
+        self.roll_angle, self.pitch_angle, self.yaw_angle = angles[-1].tolist()
+        self.attitude_time = samples[-1, TIME]
+        last = filtered[-1].tolist()
+        self.accel = dict(zip('xyz', last[0:3]))
+        self.gyro = dict(zip('xyz', last[3:6]))
+        self.temperature = samples[-1, TEMP]
+        self._refine_bias(samples)
+        return len(samples)
+
+    def _on_samples(self):
+        """Sampler thread hook: keep the estimate current at the sensor rate."""
+        with self.lock:
+            self._filter_new_samples()
+
+    def update_imu_state(self):
+        """Bring the attitude estimate up to date with the buffered samples; returns (pitch, roll, yaw) in degrees."""
+        try:
+            with self.lock:
+                self._filter_new_samples()
+                return self.pitch_angle, self.roll_angle, self.yaw_angle
+        except Exception as e:
+            logger.error("Failed to update IMU state: %s", e)
+            return self.pitch_angle, self.roll_angle, self.yaw_angle
 
     def get_sensor_data(self):
+        """Return the attitude estimate with the latest filtered accel (m/s^2), gyro (deg/s) and temperature."""
         try:
-            accel_data = self.sensor.get_accel_data()   
-            gyro_data = self.sensor.get_gyro_data()      
-            
-            # Apply Kalman filtering
-            filtered_accel_x = self.kalman_filter_AX.kalman(accel_data['x'])
-            filtered_accel_y = self.kalman_filter_AY.kalman(accel_data['y'])
-            filtered_accel_z = self.kalman_filter_AZ.kalman(accel_data['z'])
-            
-            filtered_gyro_x = self.kalman_filter_GX.kalman(gyro_data['x'])
-            filtered_gyro_y = self.kalman_filter_GY.kalman(gyro_data['y'])
-            filtered_gyro_z = self.kalman_filter_GZ.kalman(gyro_data['z'])
-            
-            # Calculate angles
-            self.roll_angle = math.atan2(filtered_accel_y, filtered_accel_z) * 180 / math.pi
-            self.pitch_angle = math.atan2(-filtered_accel_x, math.hypot(filtered_accel_y, filtered_accel_z)) * 180 / math.pi
-            
-            # Integrate gyro for yaw (simplified)
-            self.yaw_angle += filtered_gyro_z * self.half_time_step
-            
-            logger.debug("IMU data - Roll: %.2f°, Pitch: %.2f°, Yaw: %.2f°", 
-                        self.roll_angle, self.pitch_angle, self.yaw_angle)
-            
-            return {
-                'roll': self.roll_angle,
-                'pitch': self.pitch_angle,
-                'yaw': self.yaw_angle,
-                'accel': {'x': filtered_accel_x, 'y': filtered_accel_y, 'z': filtered_accel_z},
-                'gyro': {'x': filtered_gyro_x, 'y': filtered_gyro_y, 'z': filtered_gyro_z}
-            }
+            with self.lock:
+                self._filter_new_samples()
+                return {
+                    'roll': self.roll_angle,
+                    'pitch': self.pitch_angle,
+                    'yaw': self.yaw_angle,
+                    'accel': dict(self.accel),
+                    'gyro': dict(self.gyro),
+                    'temperature': self.temperature,
+                    'time': self.attitude_time,
+                }
         except Exception as e:
             logger.error("Failed to get IMU sensor data: %s", e)
             return None
 
+    def get_window(self, seconds):
+        """Return the raw samples of the last seconds (rows of sensor_imu_sampler.COLUMNS)."""
+        return self.sampler.buffer.window(seconds)
+
     def get_angles(self):
         """Get current roll, pitch, and yaw angles."""
         try:
@@ -168,10 +178,12 @@ class IMU:
             logger.error("Failed to get IMU angles: %s", e)
             return 0.0, 0.0, 0.0
 
-    def close(self):  # skipcq: PYL-R0201
-        """Close the IMU sensor."""
+    def close(self):
+        """Stop the sampler thread and save the refined bias."""
         try:
-            # MPU6050 doesn't have a close method, but we can log the cleanup
+            self.sampler.stop()
+            if self.bias_estimator.still_windows:
+                self._save_bias(self.bias_estimator.bias.copy())
             logger.info("IMU sensor cleanup completed")
         except Exception as e:
             logger.error("Error during IMU cleanup: %s", e)
@@ -0,0 +1,157 @@
+# sensor_imu_bias.py
+
+import os
+import json
+import time
+import logging
+import numpy as np
+from sensor_imu_sampler import TIME, AX, AZ, GX, GZ, TEMP, GRAVITY
+
+logger = logging.getLogger("sensor.imu_bias")
+
+# A window counts as still when every gyro axis and accel axis varies less than this...
+GYRO_STILL_STD_DEG_S = 0.5
+ACCEL_STILL_STD_MS2 = 0.15
+# ...and the accel magnitude is this close to 1 g
+ACCEL_STILL_NORM_MS2 = 0.5
+
+# A still window whose gyro mean is further than this from a trusted bias is a slow steady
+# turn rather than bias, and is ignored...
+GYRO_MAX_BIAS_STEP_DEG_S = 1.0
+# ...unless this many in a row disagree, in which case the bias itself is stale
+MAX_IGNORED_WINDOWS = 10
+
+# Weight of each new still window in the running gyro bias
+BIAS_BLEND = 0.2
+
+
+class ImuBias:
+    """
+    Accel (m/s^2) and gyro (deg/s) offsets with the die temperature they were measured at.
+
+    The accel offset excludes gravity, as measured with the robot level.
+    temperature is None until the offsets have been measured.
+    """
+
+    def __init__(self, accel=(0.0, 0.0, 0.0), gyro=(0.0, 0.0, 0.0), temperature=None):
+        self.accel = np.array(accel, dtype=float)
+        self.gyro = np.array(gyro, dtype=float)
+        self.temperature = temperature
+
+    def copy(self):
+        """Return an independent copy, e.g. to save while the estimator keeps refining this one."""
+        return ImuBias(self.accel, self.gyro, self.temperature)
+
+    @classmethod
+    def load(cls, path):
+        """Return the bias saved at path, or None if there is no usable file."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as file:
+                data = json.load(file)
+            return cls(data['accel'], data['gyro'], data['temperature'])
+        except Exception as e:
+            logger.warning("Failed to load IMU bias from %s: %s", path, e)
+            return None
+
+    def save(self, path):
+        """Write the bias to path; the file is replaced atomically."""
+        try:
+            with open(path + ".tmp", "w") as file:
+                json.dump({'accel': self.accel.tolist(), 'gyro': self.gyro.tolist(),
+                           'temperature': self.temperature, 'saved_at': time.time()}, file, indent=2)
+            os.replace(path + ".tmp", path)
+            logger.debug("IMU bias saved to %s", path)
+        except Exception as e:
+            logger.warning("Failed to save IMU bias to %s: %s", path, e)
+
+
+class BiasEstimator:
+    """
+    Refines an ImuBias from windows of samples in which the robot is still.
+
+    The gyro bias is observable whenever the robot is still, so every still
+    window is blended into it. The accel bias needs the robot level as well,
+    so it is only taken from the first still window when there is no measured
+    bias yet, as the old start-up calibration did. A saved gyro bias measured
+    at a temperature more than max_temp_delta away is replaced outright by the
+    first still window instead of blended.
+    """
+
+    def __init__(self, bias, window_s=1.0, max_temp_delta=8.0):
+        self.bias = bias
+        self.window = window_s
+        self.max_temp_delta = max_temp_delta
+        self.accel_measured = bias.temperature is not None
+        self.gyro_trusted = bias.temperature is not None
+        self.next_check = None
+        self.still_windows = 0
+        self.ignored_windows = 0
+        self.ignored_in_row = 0
+
+    def check_temperature(self, temperature):
+        """Distrust the gyro bias if it was measured too far from the current temperature."""
+        if self.bias.temperature is not None and abs(temperature - self.bias.temperature) > self.max_temp_delta:
+            logger.info("IMU bias measured at %.1f C, now %.1f C: re-estimating the gyro bias",
+                        self.bias.temperature, temperature)
+            self.gyro_trusted = False
+
+    def due(self, now):
+        """True once per window length."""
+        if self.next_check is None:
+            self.next_check = now + self.window
+        if now < self.next_check:
+            return False
+        self.next_check = now + self.window
+        return True
+
+    def update(self, samples):
+        """
+        Refine the bias from a window of samples (rows of sensor_imu_sampler.COLUMNS).
+
+        Returns True if the bias changed.
+        """
+        if len(samples) < 2 or samples[-1, TIME] - samples[0, TIME] < 0.8 * self.window:
+            return False
+        accel = samples[:, AX:AZ + 1]
+        gyro = samples[:, GX:GZ + 1]
+        still = (gyro.std(axis=0).max() < GYRO_STILL_STD_DEG_S
+                 and accel.std(axis=0).max() < ACCEL_STILL_STD_MS2
+                 and abs(np.linalg.norm(accel.mean(axis=0)) - GRAVITY) < ACCEL_STILL_NORM_MS2)
+        if not still:
+            return False
+
+        gyro_mean = gyro.mean(axis=0)
+        if self.gyro_trusted and np.abs(gyro_mean - self.bias.gyro).max() > GYRO_MAX_BIAS_STEP_DEG_S:
+            self.ignored_windows += 1
+            self.ignored_in_row += 1
+            if self.ignored_in_row < MAX_IGNORED_WINDOWS:
+                return False
+            logger.info("IMU gyro bias disagrees with %d still windows in a row, replacing it", self.ignored_in_row)
+            self.gyro_trusted = False
+        self.ignored_in_row = 0
+        if self.gyro_trusted:
+            self.bias.gyro += BIAS_BLEND * (gyro_mean - self.bias.gyro)
+        else:
+            self.bias.gyro = gyro_mean
+            self.gyro_trusted = True
+        if not self.accel_measured:
+            self.bias.accel = accel.mean(axis=0) - (0.0, 0.0, GRAVITY)
+            self.accel_measured = True
+            logger.info("IMU accel bias measured: %s", np.round(self.bias.accel, 3).tolist())
+        self.bias.temperature = float(samples[:, TEMP].mean())
+        self.still_windows += 1
+        logger.debug("IMU gyro bias refined to %s at %.1f C", np.round(self.bias.gyro, 3).tolist(),
+                     self.bias.temperature)
+        return True
+
+    def get_stats(self):
+        """Return the current bias and how many still windows were used or ignored."""
+        return {
+            'gyro_bias': np.round(self.bias.gyro, 4).tolist(),
+            'accel_bias': np.round(self.bias.accel, 4).tolist(),
+            'temperature': self.bias.temperature,
+            'still_windows': self.still_windows,
+            'ignored_windows': self.ignored_windows,
+        }
@@ -0,0 +1,249 @@
+# sensor_imu_filter.py
+
+import math
+import numpy as np
+
+# KalmanFilterBank: a measurement this far from the previous output is blended in with this weight
+KALMAN_JUMP = 60
+KALMAN_JUMP_WEIGHT = 0.4
+# Longest run solved in closed form at once, so the cumulative products stay well inside float range
+KALMAN_SEGMENT = 64
+# Blocks shorter than this are cheaper to step sample by sample than to solve
+KALMAN_STEP_ROWS = 8
+
+
+class MahonyFilter:
+    """
+    Mahony complementary filter on a unit quaternion.
+
+    Gyro rates are integrated over each sample's measured time step. The error
+    between the measured gravity direction and the one the quaternion predicts
+    feeds back through a PI term, so roll and pitch follow the accelerometer
+    over the long run and the gyro over the short run. Yaw has no gravity
+    reference and integrates the gyro alone.
+    """
+
+    def __init__(self, proportional_gain=2.0, integral_gain=0.005, max_dt=0.1):
+        self.proportional_gain = proportional_gain
+        self.integral_gain = integral_gain
+        self.max_dt = max_dt
+        self.quaternion = [1.0, 0.0, 0.0, 0.0]
+        self.integral_error = [0.0, 0.0, 0.0]
+        self.last_time = None
+
+    def _align(self, ax, ay, az):
+        """Start from the tilt the accelerometer measures, with zero yaw, instead of converging from level."""
+        roll = math.atan2(ay, az) / 2
+        pitch = math.atan2(-ax, math.hypot(ay, az)) / 2
+        cr, sr, cp, sp = math.cos(roll), math.sin(roll), math.cos(pitch), math.sin(pitch)
+        self.quaternion = [cr * cp, sr * cp, cr * sp, -sr * sp]
+
+    def update(self, timestamps, accel, gyro, nominal_dt):
+        """
+        Run a batch of samples through the filter, oldest first.
+
+        timestamps are in seconds, accel is N x 3 in any unit and gyro N x 3 in
+        rad/s. Time steps come from the timestamps (nominal_dt before the first
+        sample) and are capped at max_dt across stalls. Returns the N x 3 roll,
+        pitch and yaw in degrees after each sample.
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        accel = np.asarray(accel, dtype=float)
+        previous = self.last_time if self.last_time is not None else timestamps[0] - nominal_dt
+        dt = np.clip(np.diff(timestamps, prepend=previous), 0.0, self.max_dt)
+        norm = np.linalg.norm(accel, axis=1, keepdims=True)
+        unit = np.divide(accel, norm, out=np.zeros_like(accel), where=norm > 0)
+        if self.last_time is None and norm[0, 0] > 0:
+            self._align(*unit[0])
+        self.last_time = timestamps[-1]
+
+        # Each step depends on the previous quaternion, so the recursion itself stays scalar
+        kp, ki = self.proportional_gain, self.integral_gain
+        q0, q1, q2, q3 = self.quaternion
+        ix, iy, iz = self.integral_error
+        quaternions = np.empty((len(dt), 4))
+        for j, ((ax, ay, az), (gx, gy, gz), step) in enumerate(zip(unit.tolist(), gyro.tolist(), dt.tolist())):
+            if ax or ay or az:
+                # Gravity direction predicted by the quaternion, and its error against the measured one
+                vx = 2 * (q1 * q3 - q0 * q2)
+                vy = 2 * (q0 * q1 + q2 * q3)
+                vz = q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3
+                ex = ay * vz - az * vy
+                ey = az * vx - ax * vz
+                ez = ax * vy - ay * vx
+                ix += ki * ex * step
+                iy += ki * ey * step
+                iz += ki * ez * step
+                gx += kp * ex + ix
+                gy += kp * ey + iy
+                gz += kp * ez + iz
+
+            half = 0.5 * step
+            q0, q1, q2, q3 = (q0 + (-q1 * gx - q2 * gy - q3 * gz) * half,
+                              q1 + (q0 * gx + q2 * gz - q3 * gy) * half,
+                              q2 + (q0 * gy - q1 * gz + q3 * gx) * half,
+                              q3 + (q0 * gz + q1 * gy - q2 * gx) * half)
+            norm_q = math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+            q0, q1, q2, q3 = q0 / norm_q, q1 / norm_q, q2 / norm_q, q3 / norm_q
+            quaternions[j] = (q0, q1, q2, q3)
+        self.quaternion = [q0, q1, q2, q3]
+        self.integral_error = [ix, iy, iz]
+        return quaternion_to_euler(quaternions)
+
+    def angles(self):
+        """Return the current roll, pitch and yaw in degrees."""
+        return tuple(quaternion_to_euler(np.array([self.quaternion]))[0].tolist())
+
+
+def quaternion_to_euler(quaternions):
+    """Convert N x 4 (w, x, y, z) quaternions to N x 3 roll, pitch, yaw in degrees."""
+    q0, q1, q2, q3 = quaternions.T
+    roll = np.arctan2(2 * (q2 * q3 + q0 * q1), 1 - 2 * (q1 * q1 + q2 * q2))
+    pitch = np.arcsin(np.clip(2 * (q0 * q2 - q1 * q3), -1.0, 1.0))
+    yaw = np.arctan2(2 * (q1 * q2 + q0 * q3), q0 * q0 + q1 * q1 - q2 * q2 - q3 * q3)
+    return np.degrees(np.column_stack((roll, pitch, yaw)))
+
+
+class Kalman_filter:
+    def __init__(self, process_noise_covariance, measurement_noise_covariance):
+        self.process_noise_covariance = process_noise_covariance  # Process noise covariance (Q)
+        self.measurement_noise_covariance = measurement_noise_covariance  # Measurement noise covariance (R)
+        self.estimated_error_covariance = 1  # Initial estimate error covariance (P_k_k1)
+        self.kalman_gain = 0  # Kalman gain (Kg)
+        self.posterior_error_covariance = 1  # Posterior estimate error covariance (P_k1_k1)
+        self.posterior_estimate = 0  # Posterior estimate of state (x_k_k1)
+        self.previous_adc_value = 0  # Previous ADC value
+        self.current_measurement = 0  # Current measurement (Z_k)
+        self.previous_kalman_output = 0  # Previous Kalman filter output
+
+    def kalman(self, adc_value):
+        self.current_measurement = adc_value
+        # Handle large changes in ADC value
+        if abs(self.previous_kalman_output - adc_value) >= 60:
+            self.posterior_estimate = adc_value * 0.400 + self.previous_kalman_output * 0.600
+        else:
+            self.posterior_estimate = self.previous_kalman_output
+        # Update estimate error covariance (P_k_k1 = P_k1_k1 + Q)
+        self.estimated_error_covariance = self.posterior_error_covariance + self.process_noise_covariance
+        # Calculate Kalman gain (Kg = P_k_k1 / (P_k_k1 + R))
+        self.kalman_gain = self.estimated_error_covariance / (self.estimated_error_covariance + self.measurement_noise_covariance)
+        # Calculate Kalman filter output (x_k_k1 = x_k1_k1 + Kg * (Z_k - x_k1_k1))
+        kalman_output = self.posterior_estimate + self.kalman_gain * (self.current_measurement - self.previous_kalman_output)
+        # Update posterior estimate error covariance (P_k1_k1 = (1 - Kg) * P_k_k1)
+        self.posterior_error_covariance = (1 - self.kalman_gain) * self.estimated_error_covariance
+        # Update previous Kalman filter output
+        self.previous_kalman_output = kalman_output
+        return kalman_output
+
+
+class KalmanFilterBank:
+    """
+    Kalman_filter for several axes at once, over blocks of samples.
+
+    The covariance and gain sequence does not depend on the measurements, so
+    the gains for a block are computed up front; once the covariance settles
+    they are constant. Between large-step blends the output recursion is
+    linear, out_t = (1 - K_t) * out_t-1 + K_t * z_t, and a whole run of it is
+    solved with cumulative products. A block is split at each sample that is
+    KALMAN_JUMP or more away from the previous output, and that one sample is
+    stepped exactly like the scalar filter.
+    """
+
+    def __init__(self, process_noise_covariance, measurement_noise_covariance, axes=6):
+        self.axes = axes
+        self.process_noise_covariance = np.full(axes, process_noise_covariance, dtype=float)
+        self.measurement_noise_covariance = np.full(axes, measurement_noise_covariance, dtype=float)
+        self.posterior_error_covariance = np.ones(axes)
+        self.output = [0.0] * axes  # previous output per axis
+        self.steady_gain = None  # set once the covariance stops changing
+        self.steady_gains = None  # steady_gain as a list, for stepping
+        self.steady_decay = None  # cumulative products of (1 - steady_gain) over a segment
+
+    def _gains(self, count):
+        """Return the count x axes gains of the next count steps and advance the covariance."""
+        if self.steady_gain is not None:
+            return np.broadcast_to(self.steady_gain, (count, self.axes))
+        gains = np.empty((count, self.axes))
+        covariance = self.posterior_error_covariance
+        for j in range(count):
+            predicted = covariance + self.process_noise_covariance
+            gains[j] = predicted / (predicted + self.measurement_noise_covariance)
+            updated = (1 - gains[j]) * predicted
+            if np.array_equal(updated, covariance):
+                self.steady_gain = gains[j].copy()
+                self.steady_gains = self.steady_gain.tolist()
+                self.steady_decay = np.cumprod(np.tile(1 - self.steady_gain, (KALMAN_SEGMENT, 1)), axis=0)
+                gains[j:] = self.steady_gain
+                break
+            covariance = updated
+        self.posterior_error_covariance = covariance
+        return gains
+
+    @staticmethod
+    def _linear(previous, measurements, gains, decay=None):
+        """Solve the blend-free recursion over one segment from the previous output."""
+        if decay is None:
+            decay = np.cumprod(1 - gains, axis=0)
+        return decay * (previous + np.cumsum(gains * measurements / decay, axis=0))
+
+    @staticmethod
+    def _step(values, previous, gains):
+        """One step of the scalar filter on lists of per-axis floats; returns the new outputs."""
+        return [(z * KALMAN_JUMP_WEIGHT + p * (1 - KALMAN_JUMP_WEIGHT) if abs(p - z) >= KALMAN_JUMP else p) + k * (z - p)
+                for z, p, k in zip(values, previous, gains)]
+
+    def filter(self, measurements, offsets=None):
+        """
+        Filter a block of samples, oldest first.
+
+        measurements is N x axes (or one row of axes values); offsets, if
+        given, are subtracted from every sample first. Returns the filtered
+        values in the same shape as measurements.
+        """
+        measurements = np.asarray(measurements, dtype=float)
+        block = measurements if measurements.ndim == 2 else measurements.reshape(1, self.axes)
+        if len(block) < KALMAN_STEP_ROWS:
+            # Short blocks (one sample per sampler poll, a few per FIFO drain) are cheaper to step
+            # in Python floats than to pay the NumPy call overhead of the block solve
+            rows = block.tolist()
+            if offsets is not None:
+                rows = [[value - offset for value, offset in zip(row, offsets)] for row in rows]
+            if self.steady_gain is not None:
+                gains = [self.steady_gains] * len(rows)
+            else:
+                gains = self._gains(len(rows)).tolist()
+            filtered = []
+            for values, gain in zip(rows, gains):
+                self.output = self._step(values, self.output, gain)
+                filtered.append(self.output)
+            return np.array(filtered) if measurements.ndim == 2 else np.array(filtered[0])
+
+        if offsets is not None:
+            block = block - offsets
+        # With settled gains every segment decays by the same precomputed products
+        decay = self.steady_decay
+        gains = self._gains(len(block))
+        filtered = np.empty_like(block)
+        previous = np.array(self.output)
+        start = 0
+        while start < len(block):
+            end = min(len(block), start + KALMAN_SEGMENT)
+            run = self._linear(previous, block[start:end], gains[start:end],
+                               None if decay is None else decay[:end - start])
+            # Outputs each sample was compared against; the run holds until the first jump
+            jumps = np.abs(np.vstack((previous, run[:-1])) - block[start:end]) >= KALMAN_JUMP
+            rows = np.flatnonzero(jumps.any(axis=1))
+            if len(rows) == 0:
+                filtered[start:end] = run
+                previous = run[-1]
+                start = end
+                continue
+            j = rows[0]
+            filtered[start:start + j] = run[:j]
+            if j:
+                previous = run[j - 1]
+            filtered[start + j] = self._step(block[start + j].tolist(), previous.tolist(), gains[start + j].tolist())
+            previous = filtered[start + j]
+            start += j + 1
+        self.output = previous.tolist()
+        return filtered.reshape(measurements.shape)
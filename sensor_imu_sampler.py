@@ -0,0 +1,289 @@
+# sensor_imu_sampler.py
+
+import time
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger("sensor.imu_sampler")
+
+# MPU6050 registers: ACCEL_XOUT_H starts 14 bytes of big-endian accel x/y/z, temperature, gyro x/y/z
+ACCEL_XOUT_H = 0x3B
+BURST_LENGTH = 14
+
+# FIFO mode registers and bits
+SMPLRT_DIV = 0x19
+CONFIG = 0x1A
+FIFO_EN = 0x23
+INT_ENABLE = 0x38
+INT_STATUS = 0x3A
+USER_CTRL = 0x6A
+FIFO_COUNTH = 0x72
+FIFO_R_W = 0x74
+FIFO_EN_ACCEL_TEMP_GYRO = 0xF8  # TEMP, XG, YG, ZG, ACCEL: frames in the same order as a burst read
+USER_CTRL_FIFO_EN = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+INT_FIFO_OFLOW = 0x10
+FIFO_SIZE = 1024
+# SMBus block reads carry at most 32 bytes; read whole frames per transfer
+FIFO_CHUNK = 2 * BURST_LENGTH
+
+# Digital low-pass settings (CONFIG DLPF_CFG: accel bandwidth in Hz); any of them runs the gyro at 1 kHz
+DLPF_BANDWIDTH_HZ = ((1, 184), (2, 94), (3, 44), (4, 21), (5, 10), (6, 5))
+
+# Scale factors for the ranges IMU configures (+-2 g, +-250 deg/s), as used by the mpu6050 library
+ACCEL_LSB_PER_G = 16384.0
+GYRO_LSB_PER_DEG_S = 131.0
+GRAVITY = 9.80665
+
+# Ring buffer columns
+COLUMNS = ('time', 'ax', 'ay', 'az', 'gx', 'gy', 'gz', 'temp')
+TIME, AX, AY, AZ, GX, GY, GZ, TEMP = range(len(COLUMNS))
+
+
+def decode_frames(data):
+    """
+    Decode consecutive 14-byte frames (burst reads or FIFO contents) into sample rows without timestamps.
+
+    Returns an N x 7 array of (ax, ay, az) in m/s^2, (gx, gy, gz) in deg/s and
+    the die temperature in deg C, in ring buffer column order.
+    """
+    raw = np.frombuffer(bytes(data), dtype='>i2').reshape(-1, 7).astype(float)
+    values = np.empty_like(raw)
+    values[:, 0:3] = raw[:, 0:3] * (GRAVITY / ACCEL_LSB_PER_G)
+    values[:, 3:6] = raw[:, 4:7] / GYRO_LSB_PER_DEG_S
+    values[:, 6] = raw[:, 3] / 340 + 36.53
+    return values
+
+
+def decode_burst(block):
+    """Decode one 14-byte burst into a sample row without the timestamp."""
+    return decode_frames(block)[0]
+
+
+class ImuRingBuffer:
+    """
+    Preallocated ring of timestamped IMU samples, one row per sample (see COLUMNS).
+
+    count is the number of samples ever appended; readers keep their own cursor
+    into that sequence, so any number of consumers can read without taking
+    samples from each other. Timestamps are time.monotonic().
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.samples = np.zeros((capacity, len(COLUMNS)))
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, values):
+        """Store one sample."""
+        with self.lock:
+            row = self.samples[self.count % self.capacity]
+            row[TIME] = timestamp
+            row[AX:] = values
+            self.count += 1
+
+    def extend(self, timestamps, values):
+        """Store several samples, oldest first."""
+        with self.lock:
+            n = len(timestamps)
+            keep = min(n, self.capacity)
+            indices = (self.count + np.arange(n - keep, n)) % self.capacity
+            self.samples[indices, TIME] = timestamps[n - keep:]
+            self.samples[indices, AX:] = values[n - keep:]
+            self.count += n
+
+    def latest(self):
+        """Return a copy of the newest sample, or None before the first one."""
+        with self.lock:
+            if self.count == 0:
+                return None
+            return self.samples[(self.count - 1) % self.capacity].copy()
+
+    def since(self, cursor):
+        """
+        Return (samples, cursor) for the samples appended after cursor, oldest first.
+
+        If the reader fell more than a full ring behind, the oldest samples are
+        gone and only the last capacity samples are returned.
+        """
+        with self.lock:
+            count = self.count
+            start = max(cursor, count - self.capacity)
+            indices = np.arange(start, count) % self.capacity
+            return self.samples[indices], count
+
+    def window(self, seconds):
+        """Return the samples from the last seconds, oldest first."""
+        samples, _ = self.since(0)
+        if len(samples) == 0:
+            return samples
+        return samples[samples[:, TIME] >= samples[-1, TIME] - seconds]
+
+
+class ImuSampler:
+    """
+    Background thread that reads the MPU6050 into an ImuRingBuffer.
+
+    By default each sample is a single 14-byte block read at the sample rate, so
+    the bus is held for one short transaction per sample, and consumers (balance
+    loop, web, TCP) read the buffer instead of the bus.
+
+    In FIFO mode the sensor clocks its own samples into its 1 KB FIFO and the
+    thread drains it at drain_hz in 28-byte block transfers. A stalled thread
+    then delays samples instead of losing them, up to the FIFO's 73 frames;
+    past that the FIFO overflows, is reset, and the lost frames are counted.
+    """
+
+    def __init__(self, bus, address=0x68, rate_hz=200, buffer_seconds=2.0, fifo=False, drain_hz=50):
+        self.bus = bus
+        self.address = address
+        self.fifo = fifo
+        self.rate_divider = max(int(round(1000 / rate_hz)) - 1, 0)
+        # The FIFO runs at 1 kHz / (1 + SMPLRT_DIV), which may differ slightly from rate_hz
+        self.period = (1 + self.rate_divider) / 1000 if fifo else 1.0 / rate_hz
+        self.loop_period = 1.0 / drain_hz if fifo else self.period
+        self.buffer = ImuRingBuffer(max(int(buffer_seconds / self.period), 1))
+        self.read_errors = 0
+        self.overruns = 0
+        self.fifo_overflows = 0
+        self.dropped_frames = 0
+        self.fifo_peak_frames = 0
+        self.last_drain = None
+        self.last_stamp = 0.0
+        self.on_samples = None  # called on the sampler thread after each read or drain
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="imu-sampler", daemon=True)
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+    def start(self):
+        """Start the sampler thread, setting up the FIFO first in FIFO mode."""
+        if self.fifo:
+            self._enable_fifo()
+        self.thread.start()
+        logger.info("IMU sampler started at %.0f Hz%s, %d sample ring", 1.0 / self.period,
+                    " (FIFO, drained at %.0f Hz)" % (1.0 / self.loop_period) if self.fifo else "",
+                    self.buffer.capacity)
+
+    def stop(self):
+        """Stop the sampler thread."""
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.fifo:
+            try:
+                self.bus.write_byte_data(self.address, FIFO_EN, 0)
+                self.bus.write_byte_data(self.address, USER_CTRL, 0)
+            except Exception as e:
+                logger.error("Failed to disable the IMU FIFO: %s", e)
+        logger.info("IMU sampler stopped: %s", self.get_stats())
+
+    def _enable_fifo(self):
+        """Set the sample rate and low-pass filter, then reset and enable the FIFO for accel, temp and gyro."""
+        # Widest low-pass bandwidth still below the Nyquist frequency of the sample rate
+        nyquist = 0.5 / self.period
+        dlpf = next((cfg for cfg, bandwidth in DLPF_BANDWIDTH_HZ if bandwidth < nyquist), DLPF_BANDWIDTH_HZ[-1][0])
+        self.bus.write_byte_data(self.address, CONFIG, dlpf)
+        self.bus.write_byte_data(self.address, SMPLRT_DIV, self.rate_divider)
+        self.bus.write_byte_data(self.address, INT_ENABLE, INT_FIFO_OFLOW)
+        self.bus.write_byte_data(self.address, FIFO_EN, FIFO_EN_ACCEL_TEMP_GYRO)
+        self._reset_fifo()
+        logger.info("IMU FIFO enabled: %.0f Hz samples, DLPF_CFG %d", 1.0 / self.period, dlpf)
+
+    def _reset_fifo(self):
+        """Empty the FIFO and clear its overflow flag; sampling restarts from the next frame."""
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_CTRL_FIFO_RESET)
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_CTRL_FIFO_EN)
+        self.bus.read_byte_data(self.address, INT_STATUS)
+        self.last_drain = time.monotonic()
+
+    def drain_fifo(self):
+        """
+        Move every complete frame in the FIFO into the buffer; returns the number of frames.
+
+        Frames carry no timestamp, so they are stamped back from the drain time
+        at the sample period. After an overflow the FIFO contents are no longer
+        frame-aligned, so they are discarded and counted as dropped.
+        """
+        try:
+            status = self.bus.read_byte_data(self.address, INT_STATUS)
+            high, low = self.bus.read_i2c_block_data(self.address, FIFO_COUNTH, 2)
+            now = time.monotonic()
+            count = high << 8 | low
+            if status & INT_FIFO_OFLOW or count >= FIFO_SIZE:
+                dropped = max(int(round((now - self.last_drain) / self.period)), count // BURST_LENGTH)
+                self.fifo_overflows += 1
+                self.dropped_frames += dropped
+                logger.warning("IMU FIFO overflowed (%d bytes queued), about %d frames dropped", count, dropped)
+                self._reset_fifo()
+                return 0
+
+            frames = count // BURST_LENGTH
+            if frames == 0:
+                return 0
+            self.fifo_peak_frames = max(self.fifo_peak_frames, frames)
+            data = bytearray()
+            remaining = frames * BURST_LENGTH
+            while remaining:
+                size = min(remaining, FIFO_CHUNK)
+                data += bytes(self.bus.read_i2c_block_data(self.address, FIFO_R_W, size))
+                remaining -= size
+            timestamps = now - self.period * np.arange(frames - 1, -1, -1)
+            if timestamps[0] <= self.last_stamp:
+                # Sensor and host clocks drift apart; spread the frames up to now to keep time monotonic
+                timestamps = np.linspace(self.last_stamp, now, frames + 1)[1:]
+            self.last_stamp = timestamps[-1]
+            self.buffer.extend(timestamps, decode_frames(data))
+            self.last_drain = now
+            return frames
+        except Exception as e:
+            self.read_errors += 1
+            logger.error("IMU FIFO read failed: %s", e)
+            return 0
+
+    def sample_once(self):
+        """Burst-read one sample into the buffer; returns False if the read failed."""
+        try:
+            block = self.bus.read_i2c_block_data(self.address, ACCEL_XOUT_H, BURST_LENGTH)
+            timestamp = time.monotonic()
+            self.buffer.append(timestamp, decode_burst(block))
+            return True
+        except Exception as e:
+            self.read_errors += 1
+            logger.error("IMU burst read failed: %s", e)
+            return False
+
+    def _run(self):
+        poll = self.drain_fifo if self.fifo else self.sample_once
+        next_deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            if poll() and self.on_samples is not None:
+                try:
+                    self.on_samples()
+                except Exception as e:
+                    logger.error("IMU sample hook failed: %s", e)
+
+            next_deadline += self.loop_period
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                # Fell behind; restart the schedule rather than bursting to catch up
+                self.overruns += 1
+                next_deadline = time.monotonic()
+
+    def get_stats(self):
+        """Return samples taken, read errors, overruns and, in FIFO mode, overflows, dropped frames and peak backlog."""
+        stats = {
+            'samples': self.buffer.count,
+            'read_errors': self.read_errors,
+            'overruns': self.overruns,
+        }
+        if self.fifo:
+            stats.update(fifo_overflows=self.fifo_overflows, dropped_frames=self.dropped_frames,
+                         fifo_peak_frames=self.fifo_peak_frames)
+        return stats
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script for the fixed-rate frame scheduler
+"""
+
+import logging
+import robot_frame_scheduler
+from robot_frame_scheduler import FrameScheduler
+
+logger = logging.getLogger("test.frame_scheduler")
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() advances monotonic() instead of blocking."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+def test_late_frames_count_as_overruns():
+    """A late wait() is an overrun; more than a period late also restarts the schedule."""
+    clock = FakeClock()
+    real_time, robot_frame_scheduler.time = robot_frame_scheduler.time, clock
+    try:
+        scheduler = FrameScheduler(50)
+        scheduler.resume()
+
+        clock.now += scheduler.period * 1.5
+        scheduler.wait()
+        assert scheduler.overruns == 1 and scheduler.resyncs == 0
+        assert clock.slept == 0.0
+
+        clock.now += scheduler.period * 3
+        scheduler.wait()
+        assert scheduler.overruns == 2 and scheduler.resyncs == 1
+        assert abs(scheduler.max_lateness - scheduler.period * 2.5) < 1e-9
+
+        # After the restart an on-time frame sleeps out its whole period instead of bursting
+        clock.now += scheduler.period * 0.25
+        scheduler.wait()
+        assert abs(clock.slept - scheduler.period * 0.75) < 1e-9
+        assert scheduler.get_stats()['frames'] == 3 and scheduler.overruns == 2
+    finally:
+        robot_frame_scheduler.time = real_time
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_late_frames_count_as_overruns()
+    logger.info("Frame scheduler tests passed")
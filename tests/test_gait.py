@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test script for the phase-table gait engine
+"""
+
+import logging
+import numpy as np
+from robot_gait import GAITS, STROKE_STEPS, _foot_offsets
+
+logger = logging.getLogger("test.gait")
+
+# Fewest feet on the ground at any frame, per gait
+MIN_FEET_DOWN = {"tripod": 3, "ripple": 4, "tetrapod": 4, "wave": 5}
+
+
+def test_every_gait_keeps_its_support_and_stroke():
+    """Each gait keeps enough feet down and sweeps each foot one step either side of neutral."""
+    steps = np.tile([0.0, 30.0], (6, 1))
+    for gait, pattern in GAITS.items():
+        F = 96
+        offsets = _foot_offsets(pattern, steps, F, Z=40)
+        feet_down = (offsets[:, :, 2] == 0).sum(axis=1)
+        assert feet_down.min() >= MIN_FEET_DOWN[pattern.name], gait
+        along = offsets[:, :, 1]
+        assert np.allclose(along.max(axis=0) - along.min(axis=0), STROKE_STEPS * 30, atol=1.0), gait
+        assert np.allclose(along.max(axis=0), -along.min(axis=0), atol=1.0), gait
+
+
+def test_cycles_join_without_a_jump():
+    """The last frame of a cycle leads smoothly into the first frame of the next."""
+    steps = np.tile([10.0, 25.0], (6, 1))
+    for gait, pattern in GAITS.items():
+        F = 60
+        offsets = _foot_offsets(pattern, steps, F, Z=40)
+        wrapped = np.concatenate((offsets[-1:], offsets))
+        assert np.abs(np.diff(wrapped, axis=0)).max() < 15, gait
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_every_gait_keeps_its_support_and_stroke()
+    test_cycles_join_without_a_jump()
+    logger.info("Gait tests passed")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for the compiled gait cycle cache
+"""
+
+import os
+import logging
+import tempfile
+import numpy as np
+from robot_gait_cache import GaitCycle, GaitCycleCache, GaitCycleStore
+
+logger = logging.getLogger("test.gait_cache")
+
+
+def _cycle(frames=10):
+    positions = np.full((frames, 6, 3), 140.0)
+    return GaitCycle(positions.copy(), positions, np.zeros((frames, 6, 3)), np.ones(frames, dtype=bool))
+
+
+def test_lru_eviction_respects_memory_cap():
+    """The least recently used cycle goes first once the byte cap is reached."""
+    size = _cycle().nbytes
+    cache = GaitCycleCache(max_bytes=2 * size)
+    cache.put('a', _cycle())
+    cache.put('b', _cycle())
+    assert cache.get('a') is not None
+    cache.put('c', _cycle())
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    stats = cache.get_stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_store_round_trip_and_fingerprint():
+    """A stored cycle is reloaded from disk after a restart, but not under another fingerprint."""
+    with tempfile.TemporaryDirectory() as directory:
+        key = ('1', 0, 35, 0, 22, 40)
+        cycle = _cycle()
+        cycle.counts[:] = np.arange(cycle.counts.size).reshape(cycle.counts.shape)
+        cache = GaitCycleCache(1 << 20, GaitCycleStore(directory))
+        cache.reset('aaaa')
+        cache.put(key, cycle)
+
+        restarted = GaitCycleCache(1 << 20, GaitCycleStore(directory))
+        restarted.reset('aaaa')
+        loaded = restarted.get(key)
+        assert loaded is not None and np.array_equal(loaded.counts, cycle.counts)
+        assert restarted.get_stats()['disk_hits'] == 1
+
+        restarted.reset('bbbb')
+        assert restarted.get(key) is None
+        restarted.store.prune('bbbb')
+        assert os.listdir(directory) == []
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_lru_eviction_respects_memory_cap()
+    test_store_round_trip_and_fingerprint()
+    logger.info("Gait cache tests passed")
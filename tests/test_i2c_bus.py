@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared I2C bus priority lock
+"""
+
+import logging
+import time
+import threading
+from hardware_i2c_bus import _PriorityLock, PRIORITY_SERVO, PRIORITY_ADC
+
+logger = logging.getLogger("test.i2c_bus")
+
+
+def _wait_for_waiters(lock, count, timeout=2.0):
+    """Block until count threads are queued on the lock."""
+    deadline = time.monotonic() + timeout
+    while len(lock._waiting) < count:
+        assert time.monotonic() < deadline, "waiters never queued"
+        time.sleep(0.001)
+
+
+def test_higher_priority_waiter_acquires_first():
+    """A servo waiter queued after an ADC waiter still gets the bus before it."""
+    lock = _PriorityLock()
+    order = []
+
+    def take(name, priority):
+        lock.acquire(priority)
+        order.append(name)
+        lock.release()
+
+    lock.acquire(PRIORITY_ADC)
+    adc = threading.Thread(target=take, args=("adc", PRIORITY_ADC))
+    adc.start()
+    _wait_for_waiters(lock, 1)
+    servo = threading.Thread(target=take, args=("servo", PRIORITY_SERVO))
+    servo.start()
+    _wait_for_waiters(lock, 2)
+    lock.release()
+    adc.join(2.0)
+    servo.join(2.0)
+    assert order == ["servo", "adc"], order
+
+
+def test_owner_can_reacquire():
+    """The owning thread re-enters without blocking and keeps the lock until the last release."""
+    lock = _PriorityLock()
+    lock.acquire(PRIORITY_ADC)
+    lock.acquire(PRIORITY_SERVO)
+    lock.release()
+    assert lock._owner == threading.get_ident()
+    lock.release()
+    assert lock._owner is None
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_higher_priority_waiter_acquires_first()
+    test_owner_can_reacquire()
+    logger.info("I2C bus tests passed")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for the saved IMU bias and its background estimator
+"""
+
+import os
+import logging
+import tempfile
+import numpy as np
+from sensor_imu_bias import ImuBias, BiasEstimator
+from sensor_imu_sampler import GRAVITY
+
+logger = logging.getLogger("test.imu_bias")
+
+
+def _window(gyro, accel=(0.1, -0.2, GRAVITY + 0.3), temperature=30.0, seconds=1.0, noise=0.02, seed=0):
+    """Timestamped 200 Hz samples around the given means."""
+    rng = np.random.default_rng(seed)
+    count = int(seconds * 200) + 1
+    samples = np.empty((count, 8))
+    samples[:, 0] = np.arange(count) / 200
+    samples[:, 1:4] = rng.normal(accel, noise, (count, 3))
+    samples[:, 4:7] = rng.normal(gyro, noise, (count, 3))
+    samples[:, 7] = temperature
+    return samples
+
+
+def test_save_and_load_round_trip():
+    """The bias and its temperature tag survive a save and load."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "imu_bias.json")
+        assert ImuBias.load(path) is None
+        ImuBias((0.1, 0.2, 0.3), (1.0, -2.0, 0.5), 31.5).save(path)
+        bias = ImuBias.load(path)
+        assert np.allclose(bias.accel, (0.1, 0.2, 0.3)) and np.allclose(bias.gyro, (1.0, -2.0, 0.5))
+        assert bias.temperature == 31.5
+
+
+def test_first_still_window_measures_both_offsets():
+    """Without a saved bias the first still window sets the gyro bias and the gravity-free accel bias."""
+    estimator = BiasEstimator(ImuBias())
+    assert estimator.update(_window(gyro=(0.8, -1.2, 0.3)))
+    assert np.allclose(estimator.bias.gyro, (0.8, -1.2, 0.3), atol=0.01)
+    assert np.allclose(estimator.bias.accel, (0.1, -0.2, 0.3), atol=0.01)
+    assert estimator.bias.temperature == 30.0
+
+
+def test_moving_windows_are_ignored():
+    """Shaking or short windows leave the bias alone."""
+    estimator = BiasEstimator(ImuBias())
+    assert not estimator.update(_window(gyro=(0, 0, 0), noise=2.0))
+    assert not estimator.update(_window(gyro=(0, 0, 0), seconds=0.5))
+    assert estimator.bias.temperature is None
+
+
+def test_saved_bias_is_refined_or_replaced_by_temperature():
+    """A saved gyro bias is blended towards still windows, but replaced when the temperature moved too far."""
+    estimator = BiasEstimator(ImuBias((0, 0, 0), (0.5, 0.5, 0.5), 30.0), max_temp_delta=8.0)
+    estimator.check_temperature(33.0)
+    assert estimator.update(_window(gyro=(0.7, 0.5, 0.5)))
+    assert 0.5 < estimator.bias.gyro[0] < 0.6
+    assert np.allclose(estimator.bias.accel, 0)
+
+    estimator = BiasEstimator(ImuBias((0, 0, 0), (0.5, 0.5, 0.5), 30.0), max_temp_delta=8.0)
+    estimator.check_temperature(45.0)
+    assert estimator.update(_window(gyro=(2.5, 0.5, 0.5), temperature=45.0))
+    assert np.isclose(estimator.bias.gyro[0], 2.5, atol=0.01)
+    assert estimator.bias.temperature == 45.0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_save_and_load_round_trip()
+    test_first_still_window_measures_both_offsets()
+    test_moving_windows_are_ignored()
+    test_saved_bias_is_refined_or_replaced_by_temperature()
+    logger.info("IMU bias tests passed")
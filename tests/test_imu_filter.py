@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for the Mahony attitude filter and the Kalman filter bank
+"""
+
+import math
+import time
+import logging
+import numpy as np
+from sensor_imu_filter import MahonyFilter, Kalman_filter, KalmanFilterBank
+
+logger = logging.getLogger("test.imu_filter")
+
+
+def test_yaw_integrates_over_measured_time_steps():
+    """A steady turn integrates to the right heading even with jittery sample intervals."""
+    rng = np.random.default_rng(0)
+    timestamps = np.cumsum(rng.uniform(0.003, 0.007, 400))
+    accel = np.tile([0.0, 0.0, 9.8], (400, 1))
+    gyro = np.tile([0.0, 0.0, math.radians(20)], (400, 1))
+    angles = MahonyFilter().update(timestamps, accel, gyro, nominal_dt=0.005)
+    expected = 20 * (timestamps[-1] - timestamps[0] + 0.005)
+    assert abs(angles[-1, 2] - expected) < 0.5
+    assert np.abs(angles[:, :2]).max() < 0.1
+
+
+def test_starts_at_measured_tilt():
+    """The first sample aligns roll and pitch with gravity instead of converging from level."""
+    roll, pitch = math.radians(8), math.radians(-4)
+    gravity = np.array([-math.sin(pitch), math.sin(roll) * math.cos(pitch), math.cos(roll) * math.cos(pitch)])
+    angles = MahonyFilter().update([0.0], [gravity], np.zeros((1, 3)), nominal_dt=0.005)
+    assert np.allclose(angles[0], (8, -4, 0), atol=0.05)
+
+
+def test_batches_match_sample_by_sample_updates():
+    """One call over a batch gives the same estimates as feeding the samples one at a time."""
+    rng = np.random.default_rng(1)
+    timestamps = np.arange(50) * 0.005
+    accel = rng.normal([0, 0, 9.8], 0.3, (50, 3))
+    gyro = rng.normal(0, 0.2, (50, 3))
+    batch = MahonyFilter().update(timestamps, accel, gyro, 0.005)
+    single = MahonyFilter()
+    stream = np.vstack([single.update(timestamps[i:i + 1], accel[i:i + 1], gyro[i:i + 1], 0.005) for i in range(50)])
+    assert np.allclose(batch, stream)
+
+
+def _axis_samples(count, seed=0):
+    """Six drifting axes with a few steps large enough to trigger the jump blend."""
+    samples = np.cumsum(np.random.default_rng(seed).normal(0, 3, (count, 6)), axis=0)
+    samples[100:110] += 200
+    samples[300:340, 3] -= 150
+    return samples
+
+
+def _scalar_kalman(samples):
+    filters = [Kalman_filter(0.001, 0.1) for _ in range(samples.shape[1])]
+    return np.array([[f.kalman(value) for f, value in zip(filters, row)] for row in samples.tolist()])
+
+
+def test_kalman_bank_matches_scalar_filters():
+    """Any split into blocks, single rows included, reproduces six scalar Kalman_filter instances."""
+    samples = _axis_samples(600)
+    expected = _scalar_kalman(samples)
+    for size in (1, 5, 73, 600):
+        bank = KalmanFilterBank(0.001, 0.1)
+        filtered = np.vstack([bank.filter(samples[i:i + size]) for i in range(0, len(samples), size)])
+        assert np.allclose(filtered, expected, rtol=1e-12, atol=1e-9), size
+    bank = KalmanFilterBank(0.001, 0.1)
+    assert np.allclose([bank.filter(row) for row in samples[:20]], expected[:20])
+    # Offsets are subtracted before filtering on both the stepped and the block path
+    bank = KalmanFilterBank(0.001, 0.1)
+    shifted = np.vstack([bank.filter(samples[i:i + 50] + 1.5, offsets=[1.5] * 6) for i in (0, 50)] +
+                        [bank.filter(samples[100:103] + 1.5, offsets=[1.5] * 6)])
+    assert np.allclose(shifted, expected[:103])
+
+
+def benchmark_kalman_bank(count=8000):
+    """Per-sample cost of six scalar filters against the bank at sampler and FIFO block sizes."""
+    samples = _axis_samples(count, seed=1)
+
+    start = time.perf_counter()
+    _scalar_kalman(samples)
+    scalar_time = time.perf_counter() - start
+    logger.info("Scalar Kalman x6:  %.2f us/sample", scalar_time / count * 1e6)
+
+    times = {}
+    for size in (1, 4, 16, 73, count):
+        bank = KalmanFilterBank(0.001, 0.1)
+        start = time.perf_counter()
+        for i in range(0, count, size):
+            bank.filter(samples[i:i + size])
+        times[size] = time.perf_counter() - start
+        logger.info("Bank, %4d-sample blocks: %.2f us/sample (%.1fx)",
+                    size, times[size] / count * 1e6, scalar_time / times[size])
+    return scalar_time, times
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_yaw_integrates_over_measured_time_steps()
+    test_starts_at_measured_tilt()
+    test_batches_match_sample_by_sample_updates()
+    test_kalman_bank_matches_scalar_filters()
+    logger.info("IMU filter tests passed")
+    # Run on the robot to get Pi-class timings
+    benchmark_kalman_bank()
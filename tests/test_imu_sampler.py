@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script for the IMU sample ring buffer
+"""
+
+import logging
+import time
+import struct
+import numpy as np
+from sensor_imu_sampler import (ImuRingBuffer, ImuSampler, decode_burst, GRAVITY, TIME, AX, GZ, TEMP,
+                                INT_STATUS, INT_FIFO_OFLOW, FIFO_COUNTH)
+
+logger = logging.getLogger("test.imu_sampler")
+
+
+class FakeFifoBus:
+    """MPU6050 FIFO registers over a preloaded byte queue."""
+
+    def __init__(self, frames, overflow=False):
+        self.fifo = bytearray(b"".join(struct.pack('>7h', i, 0, 0, 0, 0, 0, 0) for i in range(frames)))
+        self.status = INT_FIFO_OFLOW if overflow else 0
+        self.block_reads = 0
+
+    def write_byte_data(self, address, register, value):
+        pass
+
+    def read_byte_data(self, address, register):
+        status, self.status = (self.status, 0) if register == INT_STATUS else (0, self.status)
+        return status
+
+    def read_i2c_block_data(self, address, register, length):
+        if register == FIFO_COUNTH:
+            return [len(self.fifo) >> 8, len(self.fifo) & 0xFF]
+        self.block_reads += 1
+        data, self.fifo = self.fifo[:length], self.fifo[length:]
+        return list(data)
+
+
+def test_decode_burst_units():
+    """Raw counts become m/s^2, deg/s and deg C at the +-2 g / +-250 deg/s ranges."""
+    block = struct.pack('>7h', 16384, -8192, 0, 0, 131, 0, -262)
+    values = decode_burst(block)
+    assert np.allclose(values[:3], (GRAVITY, -GRAVITY / 2, 0))
+    assert np.allclose(values[3:6], (1, 0, -2))
+    assert np.isclose(values[6], 36.53)
+
+
+def test_ring_wraps_and_readers_keep_their_cursor():
+    """Readers get every sample after their cursor, or the newest capacity samples if they fell behind."""
+    ring = ImuRingBuffer(4)
+    assert ring.latest() is None
+    for i in range(3):
+        ring.append(i * 0.005, np.full(7, i))
+    samples, cursor = ring.since(0)
+    assert samples[:, AX].tolist() == [0, 1, 2] and cursor == 3
+    for i in range(3, 9):
+        ring.append(i * 0.005, np.full(7, i))
+    samples, cursor = ring.since(cursor)
+    assert samples[:, GZ].tolist() == [5, 6, 7, 8] and cursor == 9
+    assert ring.latest()[TEMP] == 8
+    assert ring.window(0.008)[:, TIME].tolist() == [0.035, 0.04]
+
+
+def test_fifo_drain_decodes_frames_in_order():
+    """A drain moves every queued frame into the ring in block transfers, with increasing timestamps."""
+    bus = FakeFifoBus(frames=9)
+    sampler = ImuSampler(bus, rate_hz=200, fifo=True)
+    sampler.last_drain = 0.0
+    assert sampler.drain_fifo() == 9
+    samples, _ = sampler.buffer.since(0)
+    assert np.allclose(samples[:, AX] / samples[1, AX], np.arange(9))
+    assert (np.diff(samples[:, TIME]) > 0).all()
+    assert bus.block_reads == 5
+
+
+def test_fifo_overflow_is_reported():
+    """An overflowed FIFO is discarded and its frames counted as dropped."""
+    bus = FakeFifoBus(frames=73, overflow=True)
+    sampler = ImuSampler(bus, rate_hz=200, fifo=True)
+    sampler.last_drain = time.monotonic()
+    assert sampler.drain_fifo() == 0
+    stats = sampler.get_stats()
+    assert stats['fifo_overflows'] == 1 and stats['dropped_frames'] >= 73
+    assert sampler.buffer.count == 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_decode_burst_units()
+    test_ring_wraps_and_readers_keep_their_cursor()
+    test_fifo_drain_decodes_frames_in_order()
+    test_fifo_overflow_is_reported()
+    logger.info("IMU sampler tests passed")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script for inverse kinematics (scalar and batch solvers)
+"""
+
+import time
+import logging
+import tempfile
+import numpy as np
+from robot_kinematics import coordinate_to_angle, coordinate_to_angle_batch
+from robot_ik_table import IKTable
+
+logger = logging.getLogger("test.kinematics")
+
+
+def _sample_points(count=5000, seed=0):
+    """Random leg-frame points spanning (and exceeding) the reachable shell."""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-250, 250, (count, 3))
+
+
+def test_batch_matches_scalar():
+    """Batch IK must reproduce the scalar solver row for row."""
+    points = _sample_points()
+    batch = coordinate_to_angle_batch(points)
+    scalar = np.array([coordinate_to_angle(*point) for point in points])
+    mismatches = np.count_nonzero((batch != scalar).any(axis=1))
+    logger.info("Compared %d points, %d mismatches", len(points), mismatches)
+    assert batch.shape == (len(points), 3)
+    assert mismatches == 0, f"{mismatches} rows differ from coordinate_to_angle"
+
+
+def test_batch_unsolvable_falls_back():
+    """Degenerate points get the same safe default as the scalar solver."""
+    points = np.array([[0.0, 0.0, 0.0], [0.0, 140.0, 0.0]])
+    batch = coordinate_to_angle_batch(points)
+    assert batch[0].tolist() == list(coordinate_to_angle(0, 0, 0))
+    assert batch[1].tolist() == list(coordinate_to_angle(0, 140, 0))
+
+
+def test_ik_table_interpolation():
+    """Table lookups stay within a fraction of a degree across the leg's working volume."""
+    rng = np.random.default_rng(2)
+    points = np.column_stack((rng.uniform(-60, 120, 2000), rng.uniform(60, 220, 2000), rng.uniform(-100, 100, 2000)))
+    radius = np.linalg.norm(points, axis=1)
+    points = points[(radius > 90) & (radius < 248)]
+    with tempfile.TemporaryDirectory() as directory:
+        table = IKTable(step=8.0, directory=directory)
+        error = np.abs(table.lookup(points) - coordinate_to_angle_batch(points, quantize=False)).max()
+        logger.info("IK table max error over %d points: %.3f deg", len(points), error)
+        assert error < 0.5, f"IK table error {error:.3f} deg too large"
+
+        # A second instance memory-maps the file instead of rebuilding it
+        assert isinstance(IKTable(step=8.0, directory=directory).table, np.memmap)
+
+
+def benchmark_batch_ik(frames=2000):
+    """Compare one six-leg frame solved by 6 scalar calls against one batch call."""
+    legs = _sample_points(6 * frames, seed=1).reshape(frames, 6, 3)
+
+    start = time.perf_counter()
+    for frame in legs:
+        for point in frame:
+            coordinate_to_angle(*point)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for frame in legs:
+        coordinate_to_angle_batch(frame)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    coordinate_to_angle_batch(legs.reshape(-1, 3))
+    block_time = time.perf_counter() - start
+
+    logger.info("Scalar IK: %.1f us/frame", scalar_time / frames * 1e6)
+    logger.info("Batch IK:  %.1f us/frame (%.2fx)", batch_time / frames * 1e6, scalar_time / batch_time)
+    logger.info("Block IK:  %.1f us/frame (%.2fx, all frames in one call)",
+                block_time / frames * 1e6, scalar_time / block_time)
+    return scalar_time, batch_time, block_time
+
+
+if __name__ == "__main__":
+    # Configure logging for test; run on the robot to get Pi-class timings
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s [%(name)s] %(message)s'
+    )
+
+    test_batch_matches_scalar()
+    test_batch_unsolvable_falls_back()
+    test_ik_table_interpolation()
+    benchmark_batch_ik()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Test script for the body pose solver
+"""
+
+import logging
+import numpy as np
+from robot_pose import BodyPoseSolver, BODY_FOOTPOINTS, rotation_matrices
+
+logger = logging.getLogger("test.pose")
+
+
+def test_neutral_pose_and_offset():
+    """Zero angles give the footpoints at the body height, shifted against the body offset."""
+    solver = BodyPoseSolver()
+    points = solver.solve(10, -5, -25, 0, 0, 0)
+    expected = np.array(BODY_FOOTPOINTS, dtype=float) + (-10, 5, -25)
+    assert np.allclose(points, expected)
+
+
+def test_rotation_cache_follows_angle_changes():
+    """A cached rotation is reused for the same angles and rebuilt for new ones."""
+    solver = BodyPoseSolver()
+    tilted = solver.solve(0, 0, -25, 5, -7, 3).copy()
+    assert np.allclose(solver.rotation, rotation_matrices(5, -7, 3))
+    level = solver.solve(0, 0, -25, 0, 0, 0).copy()
+    assert np.allclose(level[:, 2], -25)
+    assert np.allclose(solver.solve(0, 0, -25, 5, -7, 3), tilted)
+
+
+def test_batch_matches_single_poses():
+    """solve_batch gives the same points as solving each pose in turn."""
+    solver = BodyPoseSolver()
+    rng = np.random.default_rng(0)
+    poses = np.column_stack((rng.uniform(-40, 40, (20, 2)), rng.uniform(-50, -10, 20), rng.uniform(-15, 15, (20, 3))))
+    batch = solver.solve_batch(poses)
+    assert batch.shape == (20, 6, 3)
+    for pose, points in zip(poses, batch):
+        assert np.allclose(solver.solve(*pose), points)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_neutral_pose_and_offset()
+    test_rotation_cache_follows_angle_changes()
+    test_batch_matches_single_poses()
+    logger.info("Pose tests passed")
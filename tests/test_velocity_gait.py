@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the velocity-driven tripod gait
+"""
+
+import logging
+import threading
+import numpy as np
+from robot_velocity_gait import VelocityGait, run_velocity_gait
+
+logger = logging.getLogger("test.velocity_gait")
+
+BODY_POINTS = [[137.1, 189.4, -30], [225, 0, -30], [137.1, -189.4, -30],
+               [-137.1, -189.4, -30], [-225, 0, -30], [-137.1, 189.4, -30]]
+
+FRAME = 0.02
+
+
+def _frames_to_stop(walker, limit=500):
+    """Set a zero target and count the frames until the walker settles."""
+    walker.set_target(0, 0, 0)
+    for frame in range(limit):
+        if walker.is_settled():
+            return frame
+        walker.step(BODY_POINTS, FRAME)
+    return limit
+
+
+def test_walks_and_settles():
+    """A target gets the feet moving; a zero target brings them back down at neutral."""
+    walker = VelocityGait()
+    walker.set_target(100, 0, 0)
+    points = [walker.step(BODY_POINTS, FRAME) for _ in range(50)]
+    assert np.isclose(walker.velocity[0], 100)
+    assert max(np.abs(p[:, :2] - np.array(BODY_POINTS)[:, :2]).max() for p in points) > 5
+    assert _frames_to_stop(walker) < 50
+    assert np.allclose(walker.step(BODY_POINTS, FRAME), BODY_POINTS)
+
+
+def test_non_finite_targets_are_rejected():
+    """nan and inf leave the previous target in place."""
+    walker = VelocityGait()
+    walker.set_target(50, 0, 10)
+    for target in (("nan", 0, 0), (0, float("inf"), 0), (0, 0, "-inf"), ("a", 0, 0)):
+        try:
+            walker.set_target(*target)
+            assert False, target
+        except ValueError:
+            pass
+    assert np.allclose(walker.target, (50, 0, np.radians(10)))
+
+
+def test_huge_targets_are_clamped_to_the_stride():
+    """An unreachable target is scaled to what the stride allows, so stopping still takes under a second."""
+    for target in ((1e6, 0, 0), (0, 0, 1e6), (1e6, -1e6, 1e6)):
+        walker = VelocityGait(cycle_ms=500, max_stride_mm=60)
+        walker.set_target(*target)
+        for _ in range(500):
+            walker.step(BODY_POINTS, FRAME)
+        assert abs(walker.velocity[0]) <= 60 / (0.5 * 0.5) + 1e-9, target
+        assert _frames_to_stop(walker) < 1.0 / FRAME, target
+
+
+class FakeScheduler:
+    period = FRAME
+
+    def __init__(self):
+        self.frames = 0
+
+    def resume(self):
+        pass
+
+    def wait(self):
+        self.frames += 1
+
+
+class FakeServo:
+    def get_write_stats(self):
+        return {'written': 0, 'transactions': 0}
+
+
+class FakeControl:
+    """Just enough of Control for run_velocity_gait, replaying commands at given frames."""
+
+    def __init__(self, commands):
+        self.velocity_gait = VelocityGait()
+        self.frame_scheduler = FakeScheduler()
+        self.servo = FakeServo()
+        self.stop_event = threading.Event()
+        self.command_condition = threading.Condition()
+        self.body_points = BODY_POINTS
+        self.leg_positions = np.zeros((6, 3))
+        self.commands = dict(commands)
+        self.command_queue = []
+        self.command_seq = self.handled_seq = 0
+
+    def command_pending(self):
+        if self.frame_scheduler.frames in self.commands:
+            self.command_queue = self.commands.pop(self.frame_scheduler.frames)
+            self.command_seq += 1
+        return self.command_seq != self.handled_seq
+
+    def acknowledge_command(self):
+        self.handled_seq = self.command_seq
+        return list(self.command_queue)
+
+    def set_leg_angles(self):
+        if self.frame_scheduler.frames > 1000:
+            self.stop_event.set()
+
+
+def test_malformed_retarget_keeps_walking():
+    """A bad retarget mid-walk is ignored instead of ending the walk with an exception."""
+    control = FakeControl({10: ["CMD_VELOCITY", "a", "0", "0"],
+                           20: ["CMD_VELOCITY", "nan", "0", "0"],
+                           30: ["CMD_VELOCITY", "0", "0", "0"]})
+    assert run_velocity_gait(control, ["CMD_VELOCITY", 80.0, 0.0, 0.0]) is False
+    assert not control.stop_event.is_set()
+    assert 30 < control.frame_scheduler.frames < 30 + 1.0 / FRAME
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_walks_and_settles()
+    test_non_finite_targets_are_rejected()
+    test_huge_targets_are_clamped_to_the_stride()
+    test_malformed_retarget_keeps_walking()
+    logger.info("Velocity gait tests passed")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for the leg workspace projection
+"""
+
+import logging
+import numpy as np
+from robot_workspace import LegWorkspace, WorkspaceEnvelope
+
+logger = logging.getLogger("test.workspace")
+
+
+def _frames():
+    frames = np.tile([140.0, 0.0, -40.0], (3, 6, 1))
+    frames[1, 2] = (250.0, 20.0, 0.0)    # just past the 248 mm shell
+    frames[2, 4] = (300.0, 0.0, 0.0)     # far out of reach
+    return frames
+
+
+def test_clamps_small_overshoot_and_rejects_large():
+    """A foot just out of reach is pulled back along its own direction; a far one rejects the frame."""
+    workspace = LegWorkspace(clamp=True, max_clamp_mm=40)
+    frames = _frames()
+    projected, clamped, valid = workspace.project(frames)
+    assert clamped.tolist() == [False, True, False]
+    assert valid.tolist() == [True, True, False]
+    assert np.isclose(np.linalg.norm(projected[1, 2]), 248)
+    assert np.allclose(np.cross(projected[1, 2], frames[1, 2]), 0)
+    assert np.array_equal(projected[[0, 2]], frames[[0, 2]])
+
+
+def test_without_clamping_out_of_range_frames_are_rejected():
+    """With clamping off the projection only reports which frames are in range."""
+    projected, clamped, valid = LegWorkspace(clamp=False).project(_frames())
+    assert not clamped.any()
+    assert valid.tolist() == [True, False, False]
+    assert np.array_equal(projected, _frames())
+
+
+def test_envelope_follows_leg_reach():
+    """The envelope reaches l1 + l2 + l3 level with the hip and less below it."""
+    envelope = WorkspaceEnvelope(33, 90, 110, margin_mm=0)
+    low, high = envelope.limits(np.array([0.0, 1.0]))
+    assert np.isclose(high[0], 233)
+    assert np.isclose(high[1], np.sqrt(200 ** 2 - 33 ** 2))
+    assert np.all(low == 90)
+
+
+def test_counters():
+    """Played frames are counted as clamped or rejected."""
+    workspace = LegWorkspace()
+    for clamped, valid in ((False, True), (True, True), (False, False)):
+        workspace.record(clamped, valid)
+    stats = workspace.get_stats()
+    assert (stats['frames'], stats['clamped'], stats['rejected']) == (3, 1, 1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    test_clamps_small_overshoot_and_rejects_large()
+    test_without_clamping_out_of_range_frames_are_rejected()
+    test_envelope_follows_leg_reach()
+    test_counters()
+    logger.info("Workspace tests passed")
@@ -3,18 +3,10 @@ import logging
 from flask import Flask, request, jsonify, render_template, Response  # type: ignore
 from voice_manager import start_voice, stop_voice
 from command_dispatcher_logic import dispatch_command, init_command_dispatcher
+from actuator_servo import LEG_SERVO_CHANNELS
 
 logger = logging.getLogger("web")
 
-LEG_TO_SERVO = {
-    (0, 0): 15, (0, 1): 14, (0, 2): 13,  # L1
-    (1, 0): 12, (1, 1): 11, (1, 2): 10,  # L2
-    (2, 0): 9,  (2, 1): 8,  (2, 2): 31,  # L3
-    (3, 0): 22, (3, 1): 23, (3, 2): 27,  # L4
-    (4, 0): 19, (4, 1): 20, (4, 2): 21,  # L5
-    (5, 0): 16, (5, 1): 17, (5, 2): 18,  # L6
-}
-
 # Route handler functions
 def create_index_handler(default_angles, used_channels):
     """Create the index route handler with closure over default_angles and used_channels."""
@@ -203,11 +195,14 @@ def create_imu_handler(server_instance):
     """Create IMU status handler with closure over server instance."""
     def imu_status():
         try:
-            pitch, roll, yaw = server_instance.control_system.imu.update_imu_state()
+            imu = server_instance.control_system.imu
+            pitch, roll, yaw = imu.update_imu_state()
             return jsonify({
                 "pitch": round(pitch, 2),
                 "roll": round(roll, 2),
-                "yaw": round(yaw, 2)
+                "yaw": round(yaw, 2),
+                "sampler": imu.sampler.get_stats(),
+                "bias": imu.bias_estimator.get_stats()
             })
         except Exception as e:
             logger.error("Failed to read IMU: %s", e)
@@ -339,10 +334,10 @@ def load_point_txt():
                 if len(values) != 3:
                     continue
                 angles = list(map(int, values))
-                for joint_idx, angle in enumerate(angles):
-                    servo = LEG_TO_SERVO.get((leg_idx, joint_idx))
-                    if servo is not None:
-                        servo_map[str(servo)] = angle
+                if leg_idx >= len(LEG_SERVO_CHANNELS):
+                    continue
+                for servo, angle in zip(LEG_SERVO_CHANNELS[leg_idx], angles):
+                    servo_map[str(servo)] = angle
         return jsonify(servo_map)
     except Exception as e:
         return jsonify({"error": str(e)}), 500